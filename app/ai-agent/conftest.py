@@ -0,0 +1,62 @@
+"""
+Test configuration and fixtures for AI agent tests
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import psycopg
+import pytest
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+import main
+
+# Tests that need PostgreSQL (with pgvector for the vector store) run when TEST_DATABASE_URL
+# is set; the backend's migrations are applied to it, so use a database of its own
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+POST_TABLES = (
+    "blog_posts", "post_tombstones", "post_analysis", "score_cache",
+    "post_embeddings", "post_neighbor_lists", "vector_index_state"
+)
+
+
+@pytest.fixture(scope="session")
+def database_url():
+    """The migrated test database, or skip"""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    sqlalchemy = pytest.importorskip("sqlalchemy")
+    sys.path.insert(0, str(BACKEND_DIR))
+    try:
+        from migrate import run_migrations
+    finally:
+        sys.path.remove(str(BACKEND_DIR))
+    run_migrations(sqlalchemy.create_engine(TEST_DATABASE_URL))
+    return TEST_DATABASE_URL
+
+
+@pytest.fixture(scope="function")
+def db(database_url):
+    """Connection for setting up and checking rows; the post tables are emptied after each test"""
+    with psycopg.connect(database_url, autocommit=True, row_factory=dict_row) as conn:
+        yield conn
+        existing = [
+            table for table in POST_TABLES
+            if conn.execute("SELECT to_regclass(%s) AS oid", (table,)).fetchone()["oid"]
+        ]
+        conn.execute(f"TRUNCATE {', '.join(existing)} RESTART IDENTITY CASCADE")
+
+
+@pytest.fixture(scope="function")
+def db_pool(database_url, monkeypatch):
+    """main.db_pool on the test database - open it in the test's event loop with `async with db_pool:`"""
+    pool = AsyncConnectionPool(
+        database_url, min_size=1, max_size=4, open=False, kwargs={"row_factory": dict_row}
+    )
+    monkeypatch.setattr(main, "db_pool", pool)
+    return pool
+
@@ -3,22 +3,41 @@ AI RAG Agent for Blog Post Scoring
 Analyzes blog posts and provides quality scores using LLM
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request
+from fastapi.responses import PlainTextResponse, Response
 from pydantic import BaseModel
 from typing import List, Optional, Dict
 import os
+import sys
 import json
+import hashlib
+import sqlite3
+import unicodedata
+from array import array
+import hmac
+import time
+import asyncio
+import weakref
+import threading
+import collections
+import traceback
+import contextvars
+import contextlib
 from datetime import datetime
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import httpx
+import psycopg
+from psycopg.rows import dict_row
+from psycopg.types.json import Jsonb
+from psycopg_pool import AsyncConnectionPool
 import logging
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
 
 # LangChain imports
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_community.llms import Ollama
 from langchain_community.vectorstores import Chroma
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.prompts import ChatPromptTemplate
+from langchain_core.embeddings import Embeddings
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -37,32 +56,336 @@ OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://ollama:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
 LLM_PROVIDER = os.getenv("LLM_PROVIDER", "ollama")  # "ollama" or "openai"
 VECTOR_DB_PATH = os.getenv("VECTOR_DB_PATH", "./chroma_db")
+# Vector store for similar-post retrieval: "chroma" (a local directory per replica) or
+# "pgvector" (post_embeddings in Postgres, migration 0010 - shared by all replicas)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+PGVECTOR_EF_SEARCH = int(os.getenv("PGVECTOR_EF_SEARCH", "100"))
+# Filters applied inside the similar-post search
+SIMILAR_POSTS_EXCLUDE_SELF = os.getenv("SIMILAR_POSTS_EXCLUDE_SELF", "true").lower() == "true"
+SIMILAR_POSTS_MIN_SCORE = int(os.getenv("SIMILAR_POSTS_MIN_SCORE", "0"))
+SIMILAR_POSTS_SAME_CATEGORY = os.getenv("SIMILAR_POSTS_SAME_CATEGORY", "false").lower() == "true"
+# Similar posts kept per post (post_neighbors) - the prompt uses the nearest PROMPT_REFERENCE_POSTS
+POST_NEIGHBORS_K = int(os.getenv("POST_NEIGHBORS_K", "5"))
+PROMPT_REFERENCE_POSTS = 3
+NEIGHBOR_CHUNKS_PER_POST = 3  # chunks fetched per wanted post, so a few long posts do not crowd out the rest
+POST_EVENTS_CHANNEL = "post_events"  # LISTEN/NOTIFY channel read by the backend event stream
+CHANGE_SEQ_LOCK_ID = 7305563  # taken before change_seq is assigned, as the backend does (see its next_change_seq)
+
+# Debug endpoints (/debug/profile, /debug/tasks) - off by default, admin token required
+DEBUG_ENDPOINTS_ENABLED = os.getenv("DEBUG_ENDPOINTS_ENABLED", "false").lower() == "true"
+DEBUG_ADMIN_TOKEN = os.getenv("DEBUG_ADMIN_TOKEN", "")
+PROFILE_MAX_SECONDS = 60
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "10")) / 1000
+
+# Event loop lag monitor - logs the blocking stack when the loop stalls longer than the threshold
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "100")) / 1000
+LOOP_STALL_THRESHOLD = float(os.getenv("LOOP_STALL_THRESHOLD_MS", "250")) / 1000
+
+# Scoring scheduler - concurrent LLM calls (match the backend's parallelism, e.g. OLLAMA_NUM_PARALLEL)
+# and queue capacity per lane; interactive (/score) is always served before bulk (/score/batch)
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", "2"))
+SCORING_INTERACTIVE_QUEUE_SIZE = int(os.getenv("SCORING_INTERACTIVE_QUEUE_SIZE", "100"))
+SCORING_BULK_QUEUE_SIZE = int(os.getenv("SCORING_BULK_QUEUE_SIZE", "1000"))
+
+# Score cache - reuse the stored result when the prompt and model are unchanged (score_cache table)
+SCORE_CACHE_ENABLED = os.getenv("SCORE_CACHE_ENABLED", "true").lower() == "true"
+# Bump to invalidate every cached result, e.g. after re-pulling a model under the same tag
+SCORE_CACHE_VERSION = os.getenv("SCORE_CACHE_VERSION", "1")
+
+# Multi-post prompts for the bulk lane - up to *_BATCH_MAX_POSTS short posts share one prompt of at
+# most *_BATCH_TOKEN_BUDGET tokens (input plus expected output), so the scoring instructions are sent
+# once per prompt instead of once per post. Per provider: keep Ollama's budget inside the model's
+# context window (num_ctx); a max of 1 post turns batching off
+LLM_BATCH_SETTINGS = {
+    "ollama": (int(os.getenv("OLLAMA_BATCH_MAX_POSTS", "4")), int(os.getenv("OLLAMA_BATCH_TOKEN_BUDGET", "2000"))),
+    "openai": (int(os.getenv("OPENAI_BATCH_MAX_POSTS", "10")), int(os.getenv("OPENAI_BATCH_TOKEN_BUDGET", "12000"))),
+}
+LLM_BATCH_MAX_POSTS, LLM_BATCH_TOKEN_BUDGET = LLM_BATCH_SETTINGS.get(LLM_PROVIDER, (1, 0))
+
+# Write-behind score persistence - completed scores are written in one transaction per
+# SCORE_FLUSH_MAX_SIZE results or SCORE_FLUSH_INTERVAL_MS, whichever comes first (1 = write each score)
+SCORE_FLUSH_MAX_SIZE = int(os.getenv("SCORE_FLUSH_MAX_SIZE", "50"))
+SCORE_FLUSH_INTERVAL = float(os.getenv("SCORE_FLUSH_INTERVAL_MS", "500")) / 1000
+
+# Vector index sync - posts changed since the last sync (change_seq watermark) are re-embedded
+# every VECTOR_SYNC_INTERVAL_SECONDS (0 = only on POST /reindex), VECTOR_SYNC_PAGE_SIZE posts at a time
+VECTOR_SYNC_INTERVAL = float(os.getenv("VECTOR_SYNC_INTERVAL_SECONDS", "300"))
+VECTOR_SYNC_PAGE_SIZE = int(os.getenv("VECTOR_SYNC_PAGE_SIZE", "100"))
+# Chunks per embedding call (batched across posts) and embedding calls in flight during a sync
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+VECTOR_INDEX_STATE_PATH = os.path.join(VECTOR_DB_PATH, "index_state.json")
+
+# Embedding cache - vectors of texts already embedded, in a local SQLite file bounded to EMBEDDING_CACHE_MAX_MB
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(VECTOR_DB_PATH, "embedding_cache.sqlite3"))
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "1024")) * 1024 * 1024
+
+# Connection pools - Postgres connections shared by all requests and scoring workers,
+# keep-alive HTTP connections shared by all LLM calls (Ollama or OpenAI)
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT_SECONDS", "300"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+
+# Prometheus Metrics
+EVENT_LOOP_LAG = Histogram(
+    'event_loop_lag_seconds',
+    'Delay between when the event loop should have run a task and when it did',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+EVENT_LOOP_STALLS = Counter(
+    'event_loop_stalls_total',
+    'Event loop stalls longer than the stall threshold'
+)
+
+SCORING_QUEUE_DEPTH = Gauge(
+    'scoring_queue_depth',
+    'Posts waiting to be scored',
+    ['lane']
+)
+SCORING_QUEUE_WAIT = Histogram(
+    'scoring_queue_wait_seconds',
+    'Time a post waited in the queue before scoring started',
+    ['lane'],
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+)
+SCORING_IN_PROGRESS = Gauge(
+    'scoring_in_progress',
+    'Posts being scored right now'
+)
+SCORING_REJECTED = Counter(
+    'scoring_rejected_total',
+    'Score requests rejected because the lane was full',
+    ['lane']
+)
+SCORE_CACHE_LOOKUPS = Counter(
+    'score_cache_lookups_total',
+    'Score cache lookups by result (hit, miss, bypass for force=true)',
+    ['result']
+)
+LLM_BATCH_SIZE = Histogram(
+    'llm_batch_posts',
+    'Posts packed into one multi-post scoring prompt',
+    buckets=(2, 3, 4, 5, 6, 8, 10, 15, 20)
+)
+LLM_BATCH_FALLBACKS = Counter(
+    'llm_batch_fallbacks_total',
+    'Posts from a multi-post prompt scored again on their own (parse_error, missing)',
+    ['reason']
+)
+SCORE_FLUSH_SIZE = Histogram(
+    'score_flush_size',
+    'Scores written per write-behind flush',
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500)
+)
+SCORE_FLUSH_LATENCY = Histogram(
+    'score_flush_duration_seconds',
+    'Time to write one write-behind flush, commit included',
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+SCORE_FLUSH_FAILURES = Counter(
+    'score_flush_failures_total',
+    'Write-behind flushes that failed (their scores were not stored)'
+)
+VECTOR_INDEX_POSTS = Counter(
+    'vector_index_posts_total',
+    'Posts handled by vector index syncs (embedded, metadata, unchanged, deleted)',
+    ['action']
+)
+VECTOR_INDEX_WATERMARK = Gauge(
+    'vector_index_watermark',
+    'change_seq up to which the vector index is in sync with blog_posts'
+)
+EMBEDDING_BATCH_LATENCY = Histogram(
+    'vector_index_embedding_batch_seconds',
+    'Time of one batched embedding call during a vector index sync',
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+EMBEDDING_CACHE_LOOKUPS = Counter(
+    'embedding_cache_lookups_total',
+    'Embedding cache lookups by result (hit, miss)',
+    ['result']
+)
+EMBEDDING_CACHE_EVICTIONS = Counter(
+    'embedding_cache_evictions_total',
+    'Vectors evicted from the embedding cache to stay under its size limit'
+)
+EMBEDDING_CACHE_BYTES = Gauge(
+    'embedding_cache_bytes',
+    'Size of the live data in the embedding cache file'
+)
+POST_NEIGHBOR_LOOKUPS = Counter(
+    'post_neighbor_lookups_total',
+    'Similar-post lookups by result (hit = served from post_neighbors, miss = searched and stored)',
+    ['result']
+)
+POST_NEIGHBOR_REFRESHES = Counter(
+    'post_neighbor_refreshes_total',
+    'Neighbour lists recomputed by vector index syncs'
+)
 
-# Initialize LLM and embeddings based on provider
-if LLM_PROVIDER == "ollama":
+# (request id, "METHOD /path") of the request being served, set by the request context middleware
+current_request = contextvars.ContextVar("current_request", default=None)
+
+# One HTTP client for every LLM call, so connections to Ollama/OpenAI are reused
+llm_http_client = httpx.AsyncClient(
+    timeout=httpx.Timeout(LLM_TIMEOUT, connect=10.0),
+    limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS)
+)
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings that are computed once per text and model
+
+    Wraps an embeddings model; every vector it returns is kept in a SQLite
+    file as a float32 blob, keyed by sha256(model + text with whitespace
+    normalized), and read back through SQLite's memory map. Queries and
+    documents are keyed apart, since some models embed them differently.
+    Lookups may come from several threads (reindex pipeline, similarity
+    searches) and share one connection under a lock. When the live data
+    grows past `max_bytes`, the least recently used vectors are evicted
+    down to 90% of it.
+    """
+
+    SQL_VARIABLES = 500  # keys per statement, under SQLite's bound parameter limit
+
+    def __init__(self, base: Embeddings, model: str, path: str, max_bytes: int):
+        self.base = base
+        self.model = model
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(f"PRAGMA mmap_size={max_bytes}")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS ix_embedding_cache_last_used ON embedding_cache (last_used)")
+
+    def key(self, text: str, kind: str) -> str:
+        normalized = " ".join(unicodedata.normalize("NFC", text).split())
+        return hashlib.sha256(f"{self.model}\0{kind}\0{normalized}".encode()).hexdigest()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self.key(text, "document") for text in texts]
+        vectors = self._lookup(keys)
+        missing = {key: text for key, text in zip(keys, texts) if key not in vectors}
+        EMBEDDING_CACHE_LOOKUPS.labels(result="hit").inc(len(keys) - sum(key in missing for key in keys))
+        EMBEDDING_CACHE_LOOKUPS.labels(result="miss").inc(sum(key in missing for key in keys))
+        if missing:
+            computed = dict(zip(missing, self.base.embed_documents(list(missing.values()))))
+            self._store(computed)
+            vectors.update(computed)
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self.key(text, "query")
+        vector = self._lookup([key]).get(key)
+        EMBEDDING_CACHE_LOOKUPS.labels(result="hit" if vector else "miss").inc()
+        if vector is None:
+            vector = self.base.embed_query(text)
+            self._store({key: vector})
+        return vector
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            for start in range(0, len(unique), self.SQL_VARIABLES):
+                part = unique[start:start + self.SQL_VARIABLES]
+                placeholders = ", ".join("?" * len(part))
+                for key, blob in self._db.execute(
+                    f"SELECT key, vector FROM embedding_cache WHERE key IN ({placeholders})", part
+                ):
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+                if found:
+                    self._db.execute(
+                        f"UPDATE embedding_cache SET last_used = ? WHERE key IN ({placeholders})",
+                        [time.time(), *part]
+                    )
+        return found
+
+    def _store(self, vectors: Dict[str, List[float]]):
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (key, model, vector, last_used) VALUES (?, ?, ?, ?)",
+                [(key, self.model, array("f", vector).tobytes(), now) for key, vector in vectors.items()]
+            )
+            self._evict()
+
+    def _live_bytes(self) -> int:
+        pragma = lambda name: self._db.execute(f"PRAGMA {name}").fetchone()[0]
+        return (pragma("page_count") - pragma("freelist_count")) * pragma("page_size")
+
+    def _evict(self):
+        size = self._live_bytes()
+        if size > self.max_bytes:
+            count = self._db.execute("SELECT count(*) FROM embedding_cache").fetchone()[0]
+            excess = count - int(count * 0.9 * self.max_bytes / size)
+            self._db.execute(
+                "DELETE FROM embedding_cache WHERE key IN "
+                "(SELECT key FROM embedding_cache ORDER BY last_used LIMIT ?)",
+                (excess,)
+            )
+            EMBEDDING_CACHE_EVICTIONS.inc(excess)
+            size = self._live_bytes()
+        EMBEDDING_CACHE_BYTES.set(size)
+
+# Initialize LLM and embeddings based on provider; LLM_ENABLED is False in demo mode
+llm = None
+embeddings = None
+if LLM_PROVIDER == "ollama" and OLLAMA_BASE_URL and OLLAMA_MODEL:
     logger.info(f"Initializing Ollama LLM: {OLLAMA_BASE_URL} with model {OLLAMA_MODEL}")
-    llm = Ollama(base_url=OLLAMA_BASE_URL, model=OLLAMA_MODEL)
-    embeddings = None  # Ollama doesn't provide embeddings API yet
-elif OPENAI_API_KEY:
+    # No client object - prompts go to Ollama's HTTP API through llm_http_client (see invoke_llm),
+    # and Ollama doesn't provide embeddings API yet
+    LLM_ENABLED = True
+elif LLM_PROVIDER != "ollama" and OPENAI_API_KEY:
     logger.info("Initializing OpenAI LLM")
-    llm = ChatOpenAI(model="gpt-4-turbo-preview", temperature=0.3)
+    LLM_ENABLED = True
+    llm = ChatOpenAI(
+        model="gpt-4-turbo-preview",
+        temperature=0.3,
+        http_async_client=llm_http_client
+    )
     embeddings = OpenAIEmbeddings()
+    if EMBEDDING_CACHE_ENABLED:
+        embeddings = CachedEmbeddings(embeddings, embeddings.model, EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_BYTES)
 else:
     logger.warning("No LLM provider configured. Agent will run in demo mode.")
-    llm = None
-    embeddings = None
+    LLM_ENABLED = False
+
+# Recorded with every analysis and part of the score cache key
+MODEL_VERSION = OLLAMA_MODEL if LLM_PROVIDER == "ollama" else "gpt-4-turbo-preview"
 
-# Vector database
+# Vector database (the Chroma backend; see ChromaStore and PgVectorStore)
 vector_db = None
-if embeddings:
+if embeddings and VECTOR_BACKEND == "chroma":
     vector_db = Chroma(
         persist_directory=VECTOR_DB_PATH,
         embedding_function=embeddings
     )
 
-# Database connection
-def get_db_connection():
-    return psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
+# Database connection pool - opened on startup; a connection commits when its block exits cleanly
+db_pool = AsyncConnectionPool(
+    DATABASE_URL,
+    min_size=DB_POOL_MIN_SIZE,
+    max_size=DB_POOL_MAX_SIZE,
+    kwargs={"row_factory": dict_row},
+    open=False
+)
 
 # Models
 class PostScore(BaseModel):
@@ -79,9 +402,11 @@ class PostScore(BaseModel):
 
 class ScoreRequest(BaseModel):
     post_id: int
+    force: bool = False  # skip the score cache and call the LLM
 
 class BatchScoreRequest(BaseModel):
     post_ids: List[int]
+    force: bool = False
 
 # Scoring prompt template
 SCORING_PROMPT = ChatPromptTemplate.from_template("""
@@ -119,59 +444,248 @@ Return ONLY a JSON object in this exact format:
 }}
 """)
 
+# Multi-post scoring prompt (bulk lane) - the same criteria, one result per post
+BATCH_SCORING_PROMPT = ChatPromptTemplate.from_template("""
+You are an expert technical content reviewer for a Kubernetes blog platform.
+
+Analyze each of the blog posts below independently and provide detailed scores for each one.
+
+**Scoring Criteria (return scores only, no explanations):**
+
+1. Technical Accuracy (0-25): Correctness of information, best practices
+2. Clarity & Readability (0-20): Writing quality, organization
+3. Completeness (0-20): Topic coverage, depth
+4. Code Quality (0-15): Code examples, formatting (0 if no code)
+5. SEO Optimization (0-10): Keywords, structure
+6. Engagement Potential (0-10): Interesting, valuable content
+
+**Blog Posts:**
+{posts}
+
+Return ONLY a JSON object in this exact format, with one entry per post, using the post ids above:
+{{
+  "results": [
+    {{
+      "post_id": <post id>,
+      "technical_accuracy": <number 0-25>,
+      "clarity": <number 0-20>,
+      "completeness": <number 0-20>,
+      "code_quality": <number 0-15>,
+      "seo": <number 0-10>,
+      "engagement": <number 0-10>,
+      "suggestions": ["suggestion 1", "suggestion 2", "suggestion 3"]
+    }}
+  ]
+}}
+""")
+
+BATCH_POST_SECTION = """
+--- Post {post_id} ---
+Title: {title}
+Category: {category}
+Author: {author}
+Content: {content}
+Similar High-Quality Posts for Reference:
+{similar_posts}
+"""
+
+# Tokens a post's entry in the "results" array takes, counted against the batch budget
+BATCH_OUTPUT_TOKENS_PER_POST = 120
+
 async def get_post(post_id: int) -> Dict:
     """Retrieve post from database"""
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT id, title, category, content, author, created_at FROM blog_posts WHERE id = %s",
-                (post_id,)
-            )
-            post = cur.fetchone()
-            if not post:
-                raise HTTPException(status_code=404, detail=f"Post {post_id} not found")
-            return dict(post)
-    finally:
-        conn.close()
+    async with db_pool.connection() as conn:
+        cur = await conn.execute(
+            """
+            SELECT bp.id, bp.title, bp.category, c.content, bp.author, bp.created_at, bp.ai_score
+            FROM blog_posts bp
+            JOIN blog_post_contents c ON c.post_id = bp.id
+            WHERE bp.id = %s
+            """,
+            (post_id,)
+        )
+        post = await cur.fetchone()
+        if not post:
+            raise HTTPException(status_code=404, detail=f"Post {post_id} not found")
+        return post
+
+async def get_posts(post_ids: List[int]) -> Dict[int, Dict]:
+    """Retrieve several posts in one query, by id (posts that do not exist are left out)"""
+    async with db_pool.connection() as conn:
+        cur = await conn.execute(
+            """
+            SELECT bp.id, bp.title, bp.category, c.content, bp.author, bp.created_at, bp.ai_score
+            FROM blog_posts bp
+            JOIN blog_post_contents c ON c.post_id = bp.id
+            WHERE bp.id = ANY(%s)
+            """,
+            (post_ids,)
+        )
+        return {post['id']: post for post in await cur.fetchall()}
 
-async def find_similar_posts(content: str, k: int = 3) -> List[str]:
-    """Find similar high-quality posts using RAG"""
-    if not vector_db:
+async def find_similar_posts(post: Dict, k: int = 3) -> List[Dict]:
+    """
+    Find similar high-quality posts using RAG
+
+    Returns the k nearest posts that pass the SIMILAR_POSTS_* filters as
+    {neighbor_id, distance, snippet}, nearest first. The filters are part of
+    the vector store search, so k results come back even when most
+    neighbours do not qualify.
+    """
+    if not vector_store:
         return []
 
+    # Embedding the query is a network call (or an embedding cache read) - run off the event loop
+    query = await asyncio.to_thread(embeddings.embed_query, post['content'])
+    return await nearest_posts(
+        query,
+        k,
+        exclude_post_id=post['id'] if SIMILAR_POSTS_EXCLUDE_SELF else None,
+        min_score=SIMILAR_POSTS_MIN_SCORE,
+        category=post['category'] if SIMILAR_POSTS_SAME_CATEGORY else None
+    )
+
+async def nearest_posts(query: List[float], k: int, **filters) -> List[Dict]:
+    """The k nearest posts to a query vector, by their nearest chunk"""
+    # Several chunks of one post can be near the query - fetch extra chunks to find k posts
+    chunks = await vector_store.search(query, k * NEIGHBOR_CHUNKS_PER_POST, **filters)
+    neighbors = {}
+    for chunk in chunks:
+        if chunk['post_id'] not in neighbors:
+            neighbors[chunk['post_id']] = {
+                "neighbor_id": chunk['post_id'],
+                "distance": float(chunk['distance']),
+                "snippet": chunk['content'][:200] + "..."
+            }
+    return list(neighbors.values())[:k]
+
+async def invoke_llm(prompt: str) -> str:
+    """Run a prompt on the configured LLM over the shared HTTP client and return the text"""
+    if LLM_PROVIDER == "ollama":
+        response = await llm_http_client.post(
+            f"{OLLAMA_BASE_URL}/api/generate",
+            json={"model": OLLAMA_MODEL, "prompt": prompt, "stream": False}
+        )
+        response.raise_for_status()
+        return response.json()["response"]
+
+    # OpenAI returns a message with .content
+    response = await llm.ainvoke(prompt)
+    return response.content
+
+SCORE_FIELDS = ("technical_accuracy", "clarity", "completeness", "code_quality", "seo", "engagement")
+
+def parse_json_response(response_text: str) -> Dict:
+    """The outermost JSON object of an LLM response, cleaned of common escape issues"""
+    import re
+    # Find the first { and last }
+    first_brace = response_text.find('{')
+    last_brace = response_text.rfind('}')
+    if first_brace == -1 or last_brace <= first_brace:
+        raise ValueError("No JSON found in LLM response")
+
+    json_str = response_text[first_brace:last_brace + 1]
+    # Clean up common escape issues
+    json_str = json_str.replace('\n', ' ').replace('\r', ' ')
+    # Remove escaped underscores (technical\_accuracy -> technical_accuracy)
+    json_str = json_str.replace('\\_', '_')
+    # Remove invalid escape sequences
+    json_str = re.sub(r'\\(?!["\\/bfnrtu])', r'\\\\', json_str)
     try:
-        results = vector_db.similarity_search(content, k=k)
-        return [doc.page_content[:200] + "..." for doc in results]
-    except Exception as e:
-        logger.error(f"Error finding similar posts: {e}")
-        return []
+        return json.loads(json_str)
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON decode error: {e}. Cleaned JSON: {json_str[:200]}")
+        raise ValueError(f"Invalid JSON response from LLM: {str(e)}")
+
+def check_scores(scores: Dict) -> Dict:
+    missing = [field for field in SCORE_FIELDS if not isinstance(scores.get(field), int)]
+    if missing:
+        raise ValueError(f"LLM response is missing scores: {', '.join(missing)}")
+    return scores
+
+def parse_scores(response_text: str) -> Dict:
+    """Scores from a single-post LLM response"""
+    return check_scores(parse_json_response(response_text))
+
+def parse_batch_scores(response_text: str, post_ids: List[int]) -> Dict[int, Dict]:
+    """
+    Scores per post id from a multi-post LLM response
 
-async def analyze_with_llm(post: Dict) -> Dict:
-    """Analyze post with LLM"""
-    if not llm:
-        # Demo mode - return random scores
-        import random
-        return {
-            "technical_accuracy": random.randint(15, 25),
-            "clarity": random.randint(12, 20),
-            "completeness": random.randint(12, 20),
-            "code_quality": random.randint(8, 15),
-            "seo": random.randint(5, 10),
-            "engagement": random.randint(5, 10),
-            "suggestions": [
-                "Add more code examples",
-                "Improve the introduction",
-                "Add a conclusion section"
-            ]
-        }
+    Raises ValueError if the response has no "results" array. Entries with
+    an unknown post id or missing scores are left out, so those posts can be
+    scored again on their own.
+    """
+    results = parse_json_response(response_text).get("results")
+    if not isinstance(results, list):
+        raise ValueError("LLM response has no results array")
+
+    expected = {str(post_id): post_id for post_id in post_ids}
+    scores_by_post = {}
+    for entry in results:
+        if not isinstance(entry, dict) or str(entry.get("post_id")) not in expected:
+            continue
+        try:
+            scores = check_scores({key: value for key, value in entry.items() if key != "post_id"})
+        except ValueError as e:
+            logger.warning(f"Dropping batch result for post {entry['post_id']}: {e}")
+            continue
+        scores_by_post[expected[str(entry["post_id"])]] = scores
+    return scores_by_post
+
+def score_cache_key(prompt: str) -> str:
+    """Cache key of an LLM scoring call: the exact prompt and the model that answers it"""
+    return hashlib.sha256(f"{SCORE_CACHE_VERSION}\0{MODEL_VERSION}\0{prompt}".encode()).hexdigest()
+
+async def cached_scores(cache_key: str) -> Optional[Dict]:
+    """Stored scores for a cache key (counting the hit), or None"""
+    async with db_pool.connection() as conn:
+        cur = await conn.execute(
+            """
+            UPDATE score_cache SET hit_count = hit_count + 1, last_hit_at = CURRENT_TIMESTAMP
+            WHERE cache_key = %s
+            RETURNING scores
+            """,
+            (cache_key,)
+        )
+        row = await cur.fetchone()
+    return row['scores'] if row else None
+
+async def cache_scores(cache_key: str, scores: Dict):
+    async with db_pool.connection() as conn:
+        await conn.execute(
+            """
+            INSERT INTO score_cache (cache_key, model_version, scores) VALUES (%s, %s, %s)
+            ON CONFLICT (cache_key) DO UPDATE
+            SET scores = EXCLUDED.scores, created_at = CURRENT_TIMESTAMP
+            """,
+            (cache_key, MODEL_VERSION, Jsonb(scores))
+        )
 
-    # Find similar posts
-    similar_posts = await find_similar_posts(post['content'])
-    similar_text = "\n\n".join(similar_posts) if similar_posts else "No similar posts found."
+def demo_scores() -> Dict:
+    """Random scores for demo mode (no LLM configured)"""
+    import random
+    return {
+        "technical_accuracy": random.randint(15, 25),
+        "clarity": random.randint(12, 20),
+        "completeness": random.randint(12, 20),
+        "code_quality": random.randint(8, 15),
+        "seo": random.randint(5, 10),
+        "engagement": random.randint(5, 10),
+        "suggestions": [
+            "Add more code examples",
+            "Improve the introduction",
+            "Add a conclusion section"
+        ]
+    }
+
+async def reference_posts(post: Dict) -> str:
+    """Similar posts for the prompt's reference section, from the precomputed neighbour lists"""
+    neighbors = await post_neighbors.get(post)
+    similar_posts = [neighbor['snippet'] for neighbor in neighbors[:PROMPT_REFERENCE_POSTS]]
+    return "\n\n".join(similar_posts) if similar_posts else "No similar posts found."
 
-    # Create prompt
-    prompt = SCORING_PROMPT.format(
+def scoring_prompt(post: Dict, similar_text: str) -> str:
+    return SCORING_PROMPT.format(
         title=post['title'],
         category=post['category'],
         author=post['author'],
@@ -179,99 +693,227 @@ async def analyze_with_llm(post: Dict) -> Dict:
         similar_posts=similar_text
     )
 
+async def lookup_score_cache(cache_key: str, force: bool) -> Optional[Dict]:
+    """Cached scores for a prompt, or None on a miss or when `force` bypasses the cache"""
+    if force:
+        SCORE_CACHE_LOOKUPS.labels(result="bypass").inc()
+        return None
+    scores = await cached_scores(cache_key)
+    SCORE_CACHE_LOOKUPS.labels(result="hit" if scores else "miss").inc()
+    return scores
+
+async def score_with_llm(prompt: str, cache_key: Optional[str]) -> Dict:
+    """Run a single-post prompt on the LLM and cache the parsed scores"""
+    response_text = await invoke_llm(prompt)
+    logger.info(f"Raw LLM response (first 200 chars): {response_text[:200]}")
+    scores = parse_scores(response_text)
+
+    if cache_key:
+        await cache_scores(cache_key, scores)
+    return scores
+
+async def analyze_with_llm(post: Dict, force: bool = False) -> Dict:
+    """
+    Analyze post with LLM
+
+    Unless `force` is set, a prompt already answered by the same model gets
+    the result from the score cache instead of another LLM call.
+    """
+    if not LLM_ENABLED:
+        # Demo mode - return random scores
+        return demo_scores()
+
+    # Find similar posts and create prompt
+    prompt = scoring_prompt(post, await reference_posts(post))
+
+    cache_key = score_cache_key(prompt) if SCORE_CACHE_ENABLED else None
+    if cache_key:
+        scores = await lookup_score_cache(cache_key, force)
+        if scores:
+            logger.info(f"Score cache hit for post {post['id']}")
+            return scores
+
     # Get LLM response
-    try:
-        if LLM_PROVIDER == "ollama":
-            # Ollama returns string directly
-            response_text = llm.invoke(prompt)
-            logger.info(f"Raw Ollama response (first 500 chars): {response_text[:500]}")
-            
-            # Try to extract JSON from response - find outermost braces
-            import re
-            # Find the first { and last }
-            first_brace = response_text.find('{')
-            last_brace = response_text.rfind('}')
-            
-            if first_brace != -1 and last_brace != -1 and last_brace > first_brace:
-                json_str = response_text[first_brace:last_brace + 1]
-                # Clean up common escape issues
-                json_str = json_str.replace('\n', ' ').replace('\r', ' ')
-                # Remove escaped underscores (technical\_accuracy -> technical_accuracy)
-                json_str = json_str.replace('\\_', '_')
-                # Remove invalid escape sequences
-                json_str = re.sub(r'\\(?!["\\/bfnrtu])', r'\\\\', json_str)
-                
-                try:
-                    result = json.loads(json_str)
-                except json.JSONDecodeError as e:
-                    logger.error(f"JSON decode error: {e}. Cleaned JSON: {json_str[:200]}")
-                    raise ValueError(f"Invalid JSON response from Ollama: {str(e)}")
-            else:
-                logger.error(f"Could not find JSON braces in Ollama response: {response_text[:200]}")
-                raise ValueError("No JSON found in Ollama response")
+    return await score_with_llm(prompt, cache_key)
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for English text)"""
+    return len(text) // 4 + 1
+
+def pack_batches(sections: Dict[int, str], max_posts: int, token_budget: int) -> List[List[int]]:
+    """
+    Group post ids into multi-post prompts under the token budget
+
+    Posts are packed shortest first, so short posts end up together; a post
+    too long to share the budget with another one is a group of its own.
+    """
+    overhead = estimate_tokens(BATCH_SCORING_PROMPT.format(posts=""))
+    cost = {post_id: estimate_tokens(section) + BATCH_OUTPUT_TOKENS_PER_POST for post_id, section in sections.items()}
+
+    groups, used = [], 0
+    for post_id in sorted(sections, key=cost.get):
+        if groups and len(groups[-1]) < max_posts and used + cost[post_id] <= token_budget:
+            groups[-1].append(post_id)
+            used += cost[post_id]
         else:
-            # OpenAI returns object with .content
-            response = llm.invoke(prompt)
-            result = json.loads(response.content)
-        
-        return result
-    except Exception as e:
-        logger.error(f"LLM analysis error: {e}")
-        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+            groups.append([post_id])
+            used = overhead + cost[post_id]
+    return groups
 
-async def store_scores(post_id: int, scores: Dict):
-    """Store scores in database"""
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            # Calculate total score
-            total = (
-                scores['technical_accuracy'] +
-                scores['clarity'] +
-                scores['completeness'] +
-                scores['code_quality'] +
-                scores['seo'] +
-                scores['engagement']
-            )
+class ScoreWriter:
+    """
+    Write-behind buffer for completed scores
+
+    Scores are collected and written in one transaction: the posts locked in
+    id order, a multi-row INSERT into post_analysis, one UPDATE ... FROM
+    (VALUES ...) on blog_posts and the score notifications. Posts deleted
+    since they were scored are skipped. A flush runs when `max_size` scores
+    are waiting (the caller that fills the buffer waits for it, which
+    throttles producers to the database) or `interval` after the oldest one
+    arrived, and on shutdown.
+    A failed flush is logged with its post ids; the results are still in the
+    score cache, so rescoring those posts does not call the LLM again.
+    """
 
-            # Update blog_posts table
-            cur.execute(
-                """
-                UPDATE blog_posts
-                SET ai_score = %s, last_scored_at = CURRENT_TIMESTAMP
-                WHERE id = %s
-                """,
-                (total, post_id)
-            )
+    def __init__(self, max_size: int, interval: float):
+        self.max_size = max_size
+        self.interval = interval
+        self.buffer = []  # (post_id, scores, total)
+        self._lock = None
+        self._pending = None
+        self._task = None
+
+    def start(self):
+        self._lock = asyncio.Lock()
+        self._pending = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._flush_periodically(), name="score-writer")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def add(self, post_id: int, scores: Dict, total: int):
+        self.buffer.append((post_id, scores, total))
+        self._pending.set()
+        if len(self.buffer) >= self.max_size:
+            await self.flush()
+
+    async def _flush_periodically(self):
+        while True:
+            await self._pending.wait()
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def flush(self):
+        # Shielded: a worker or the timer being cancelled on shutdown must not abort a write half-way
+        await asyncio.shield(self._flush())
+
+    async def _flush(self):
+        async with self._lock:
+            batch, self.buffer = self.buffer, []
+            self._pending.clear()
+            if not batch:
+                return
 
-            # Insert into post_analysis table
-            cur.execute(
-                """
-                INSERT INTO post_analysis (
-                    post_id, technical_accuracy_score, clarity_score,
-                    completeness_score, code_quality_score, seo_score,
-                    engagement_score, total_score, suggestions, model_version
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """,
-                (
-                    post_id,
-                    scores['technical_accuracy'],
-                    scores['clarity'],
-                    scores['completeness'],
-                    scores['code_quality'],
-                    scores['seo'],
-                    scores['engagement'],
-                    total,
-                    json.dumps(scores.get('suggestions', [])),
-                    "gpt-4-turbo-preview"
+            started = time.monotonic()
+            try:
+                async with db_pool.connection() as conn:
+                    await self._write(conn, batch)
+            except Exception as e:
+                SCORE_FLUSH_FAILURES.inc()
+                logger.error(
+                    f"Failed to store scores for posts {[post_id for post_id, _, _ in batch]}: {e}",
+                    exc_info=True
+                )
+                return
+
+            SCORE_FLUSH_SIZE.observe(len(batch))
+            SCORE_FLUSH_LATENCY.observe(time.monotonic() - started)
+            logger.info(f"Stored scores for {len(batch)} posts in {(time.monotonic() - started) * 1000:.0f}ms")
+
+    @staticmethod
+    async def _write(conn, batch):
+        # Lock the posts in id order: replicas flushing overlapping posts queue instead of
+        # deadlocking, and a post deleted since it was scored is left out instead of failing
+        # the post_analysis foreign key (and with it the whole batch)
+        cur = await conn.execute(
+            "SELECT id FROM blog_posts WHERE id = ANY(%s) ORDER BY id FOR UPDATE",
+            (sorted({post_id for post_id, _, _ in batch}),)
+        )
+        existing = {row['id'] for row in await cur.fetchall()}
+        deleted = sorted({post_id for post_id, _, _ in batch} - existing)
+        if deleted:
+            logger.info(f"Not storing scores for deleted posts {deleted}")
+            batch = [item for item in batch if item[0] in existing]
+            if not batch:
+                return
+
+        # Insert into post_analysis table - every result is kept in the history
+        analysis_row = "(" + ", ".join(["%s"] * 10) + ")"
+        await conn.execute(
+            """
+            INSERT INTO post_analysis (
+                post_id, technical_accuracy_score, clarity_score,
+                completeness_score, code_quality_score, seo_score,
+                engagement_score, total_score, suggestions, model_version
+            ) VALUES """ + ", ".join([analysis_row] * len(batch)),
+            [
+                value
+                for post_id, scores, total in batch
+                for value in (
+                    post_id, *(scores[field] for field in SCORE_FIELDS), total,
+                    Jsonb(scores.get('suggestions', [])), MODEL_VERSION
                 )
+            ]
+        )
+
+        # Update blog_posts table - the latest result per post
+        latest = dict(sorted({post_id: total for post_id, _, total in batch}.items()))
+        await conn.execute(
+            """
+            UPDATE blog_posts bp
+            SET ai_score = v.total, last_scored_at = CURRENT_TIMESTAMP
+            FROM (VALUES """ + ", ".join(["(%s::integer, %s::integer)"] * len(latest)) + """) AS v(post_id, total)
+            WHERE bp.id = v.post_id
+            """,
+            [value for item in latest.items() for value in item]
+        )
+
+        # Tell backend event streams the scores changed (delivered on commit)
+        await conn.execute(
+            "SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload",
+            (
+                POST_EVENTS_CHANNEL,
+                [json.dumps({"type": "scored", "post_id": post_id, "ai_score": total}) for post_id, total in latest.items()]
             )
+        )
 
-            conn.commit()
-            logger.info(f"Stored scores for post {post_id}: {total}/100")
+        # change_seq last, under the lock held until commit, so the values become
+        # visible in order and delta-sync cursors never pass a score still being written
+        await conn.execute("SELECT pg_advisory_xact_lock(%s)", (CHANGE_SEQ_LOCK_ID,))
+        await conn.execute(
+            "UPDATE blog_posts SET change_seq = nextval('blog_posts_change_seq') WHERE id = ANY(%s)",
+            (list(latest),)
+        )
 
-    finally:
-        conn.close()
+score_writer = ScoreWriter(SCORE_FLUSH_MAX_SIZE, SCORE_FLUSH_INTERVAL)
+
+async def store_scores(post_id: int, scores: Dict) -> int:
+    """Queue scores for the next write-behind flush and return the total"""
+    # Calculate total score
+    total = sum(scores[field] for field in SCORE_FIELDS)
+    await score_writer.add(post_id, scores, total)
+    return total
+
+# Request context middleware - the backend passes its request id in X-Request-ID
+@app.middleware("http")
+async def request_context_middleware(request: Request, call_next):
+    request_id = request.headers.get("x-request-id") or f"{int(time.time() * 1000)}"
+    current_request.set((request_id, f"{request.method} {request.url.path}"))
+    return await call_next(request)
 
 # API Endpoints
 
@@ -281,8 +923,8 @@ async def root():
         "service": "AI RAG Agent",
         "version": "1.0.0",
         "status": "running",
-        "llm_enabled": llm is not None,
-        "llm_provider": LLM_PROVIDER if llm else "none",
+        "llm_enabled": LLM_ENABLED,
+        "llm_provider": LLM_PROVIDER if LLM_ENABLED else "none",
         "ollama_url": OLLAMA_BASE_URL if LLM_PROVIDER == "ollama" else None,
         "ollama_model": OLLAMA_MODEL if LLM_PROVIDER == "ollama" else None
     }
@@ -292,278 +934,1415 @@ async def health():
     """Health check endpoint"""
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics endpoint"""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.on_event("startup")
+async def startup():
+    if DEBUG_ENDPOINTS_ENABLED or LOOP_MONITOR_ENABLED:
+        asyncio.get_running_loop().set_task_factory(tracking_task_factory)
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    await db_pool.open()
+    if isinstance(vector_store, PgVectorStore):
+        await vector_store.check_dimensions(embeddings)
+    score_writer.start()
+    scoring_scheduler.start()
+    if vector_store:
+        vector_indexer.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await vector_indexer.stop()
+    await scoring_scheduler.stop()
+    # Last flush before the pool closes - scores still buffered would be lost
+    await score_writer.stop()
+    await llm_http_client.aclose()
+    await db_pool.close()
+    loop_monitor.stop()
+
+# Event loop lag monitoring
+# Everything from here down to debug_tasks is duplicated verbatim between app/backend/main.py and
+# app/ai-agent/main.py: each service image is built from its own directory, so there is no shared
+# module both could import. Change the two copies together - the backend's
+# TestLoopLagMonitor::test_ai_agent_copy_matches fails when they differ.
+class LoopLagMonitor:
+    """
+    Measure event loop scheduling delay and report what blocks the loop
+
+    A task sleeps for `interval` in a loop and records how late it wakes up.
+    A watchdog thread checks the task's heartbeat; when the loop has not run
+    it for `threshold` past its due time, the loop thread's current stack (the
+    blocking code) is logged once per stall, with the request being served.
+    """
+
+    def __init__(self, interval: float, threshold: float):
+        self.interval = interval
+        self.threshold = threshold
+        self.heartbeat = time.monotonic()
+        self._loop = None
+        self._loop_thread_id = None
+        self._task = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = self._loop.create_task(self._measure())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _measure(self):
+        while True:
+            due = self._loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            EVENT_LOOP_LAG.observe(max(self._loop.time() - due, 0.0))
+            self.heartbeat = time.monotonic()
+
+    def _watch(self):
+        reported = None
+        while not self._stopped.wait(self.interval):
+            heartbeat = self.heartbeat
+            stalled_for = time.monotonic() - heartbeat - self.interval
+            if stalled_for >= self.threshold and heartbeat != reported:
+                reported = heartbeat
+                self.report_stall(stalled_for)
+
+    def report_stall(self, stalled_for: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else "(stack unavailable)\n"
+        task = asyncio.current_task(self._loop)
+        request_id, request = task_requests.get(task, (None, None)) if task is not None else (None, None)
+
+        EVENT_LOOP_STALLS.inc()
+        logger.warning(
+            f"Event loop blocked for {stalled_for * 1000:.0f}ms"
+            + (f" while serving {request} (request {request_id})" if request else "")
+            + f", blocking stack:\n{stack}",
+            extra={"request_id": request_id, "duration": round(stalled_for * 1000, 2)}
+        )
+
+loop_monitor = LoopLagMonitor(LOOP_MONITOR_INTERVAL, LOOP_STALL_THRESHOLD)
+
+# Debug endpoints
+def require_debug_access(x_admin_token: Optional[str] = Header(None)):
+    """Debug endpoints do not exist unless enabled, and always need the admin token"""
+    if not DEBUG_ENDPOINTS_ENABLED or not DEBUG_ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, DEBUG_ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+class StackSampler:
+    """
+    Statistical profiler - samples the stack of every thread at a fixed interval
+
+    Runs in its own thread, so the event loop keeps serving while it samples,
+    and the cost is one sys._current_frames() walk per interval.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.lock = threading.Lock()
+
+    def sample(self, seconds: float) -> collections.Counter:
+        own_thread = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks = collections.Counter()
+        deadline = time.monotonic() + seconds
+
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                frames.append(names.get(thread_id, str(thread_id)))
+                stacks[";".join(reversed(frames))] += 1
+            time.sleep(self.interval)
+
+        return stacks
+
+stack_sampler = StackSampler(PROFILE_SAMPLE_INTERVAL)
+
+# Creation time of tasks (debug endpoints) and the request each was created for
+# (loop monitor), recorded by the task factory installed when either is enabled
+task_created_at = weakref.WeakKeyDictionary()
+task_requests = weakref.WeakKeyDictionary()
+
+def tracking_task_factory(loop, coro, **kwargs):
+    task = asyncio.Task(coro, loop=loop, **kwargs)
+    if DEBUG_ENDPOINTS_ENABLED:
+        task_created_at[task] = time.monotonic()
+    context = kwargs.get("context")
+    request = context.get(current_request) if context is not None else current_request.get()
+    if request is not None:
+        task_requests[task] = request
+    return task
+
+@app.get("/debug/profile", dependencies=[Depends(require_debug_access)], include_in_schema=False)
+async def debug_profile(seconds: float = Query(10, gt=0, le=PROFILE_MAX_SECONDS)):
+    """
+    Sample all thread stacks for a time window
+
+    Returns collapsed stacks ("frame;frame;frame count" per line), ready for
+    flamegraph.pl or speedscope. Only one profile runs at a time.
+    """
+    if not stack_sampler.lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    try:
+        stacks = await asyncio.to_thread(stack_sampler.sample, seconds)
+    finally:
+        stack_sampler.lock.release()
+
+    return PlainTextResponse(
+        "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+    )
+
+@app.get("/debug/tasks", dependencies=[Depends(require_debug_access)], include_in_schema=False)
+async def debug_tasks(limit: int = Query(200, gt=0, le=5000)):
+    """List pending asyncio tasks, oldest first, with the point each one is waiting at"""
+    now = time.monotonic()
+    tasks = []
+    for task in asyncio.all_tasks():
+        created = task_created_at.get(task)
+        tasks.append({
+            "name": task.get_name(),
+            "coroutine": getattr(task.get_coro(), "__qualname__", repr(task.get_coro())),
+            "age_seconds": round(now - created, 3) if created is not None else None,
+            "stack": [
+                f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno} in {frame.f_code.co_name}"
+                for frame in task.get_stack(limit=20)
+            ]
+        })
+
+    tasks.sort(key=lambda t: t["age_seconds"] if t["age_seconds"] is not None else -1, reverse=True)
+    return {"total": len(tasks), "tasks": tasks[:limit]}
+
+# Scoring scheduler
+class ScoringQueueFull(Exception):
+    """A lane has no room for the posts being submitted"""
+
+    def __init__(self, lane: str, retry_after: int):
+        super().__init__(f"{lane} scoring queue is full")
+        self.lane = lane
+        self.retry_after = retry_after
+
+class ScoringScheduler:
+    """
+    Bounded two-lane queue in front of the LLM
+
+    A fixed number of workers make one LLM call at a time each, so the LLM
+    backend never sees more concurrent calls than it can run. A worker takes
+    one interactive post, or up to `batch_size` bulk posts to share
+    multi-post prompts (see score_batch_task). Interactive
+    requests (a post was just created or edited) are taken before anything in
+    the bulk lane. A post already waiting is not queued twice; an interactive
+    request for a post waiting in the bulk lane moves it to the interactive
+    lane. A full lane rejects new work instead of growing without bound.
+    """
+
+    LANES = ("interactive", "bulk")
+
+    def __init__(self, workers: int, capacities: Dict[str, int], batch_size: int = 1):
+        self.workers = workers
+        self.capacities = capacities
+        self.batch_size = batch_size
+        self.lanes = {lane: collections.OrderedDict() for lane in self.LANES}  # post_id -> (enqueued at, force)
+        self.average_duration = 30.0  # seconds per post, refined as posts are scored
+        self._ready = None
+        self._tasks = []
+
+    def start(self):
+        self._ready = asyncio.Condition()
+        self._tasks = [
+            asyncio.get_running_loop().create_task(self._work(), name=f"scoring-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        waiting = sum(len(queue) for queue in self.lanes.values())
+        if waiting:
+            logger.warning(f"Scoring scheduler stopped with {waiting} posts still queued")
+
+    def depth(self, lane: str) -> int:
+        return len(self.lanes[lane])
+
+    def retry_after(self, lane: str, needed: int) -> int:
+        """Seconds until `needed` more slots are free in the lane"""
+        ahead = needed + (self.depth("interactive") if lane == "bulk" else 0)
+        return max(1, int(ahead * self.average_duration / self.workers))
+
+    async def submit(self, post_ids: List[int], lane: str, force: bool = False) -> Dict[str, List[int]]:
+        """Queue posts in a lane; all or nothing - raises ScoringQueueFull if they do not fit"""
+        queue = self.lanes[lane]
+        new, already_queued = [], []
+        for post_id in dict.fromkeys(post_ids):
+            waiting_in = next((waiting for waiting in self._lanes_covering(lane) if post_id in waiting), None)
+            if waiting_in is not None:
+                already_queued.append(post_id)
+                if force:
+                    waiting_in[post_id] = (waiting_in[post_id][0], True)
+            else:
+                new.append(post_id)
+
+        overflow = len(queue) + len(new) - self.capacities[lane]
+        if overflow > 0:
+            SCORING_REJECTED.labels(lane=lane).inc()
+            raise ScoringQueueFull(lane, self.retry_after(lane, overflow))
+
+        now = time.monotonic()
+        for post_id in new:
+            # Promoted from the bulk lane: keep its original enqueue time for the wait metric
+            enqueued_at, forced = self.lanes["bulk"].pop(post_id, (now, False)) if lane == "interactive" else (now, False)
+            queue[post_id] = (enqueued_at, force or forced)
+        self._update_depth()
+
+        async with self._ready:
+            self._ready.notify(len(new))
+        return {"queued": new, "already_queued": already_queued}
+
+    def _lanes_covering(self, lane: str):
+        """Lanes where a waiting post already satisfies a request for `lane`"""
+        return [self.lanes[lane]] + ([self.lanes["interactive"]] if lane == "bulk" else [])
+
+    def _next(self):
+        """The lane served next and its oldest posts as (post_id, enqueued at, force)"""
+        for lane in self.LANES:
+            queue = self.lanes[lane]
+            if queue:
+                count = min(len(queue), self.batch_size if lane == "bulk" else 1)
+                return lane, [
+                    (post_id, enqueued_at, force)
+                    for post_id, (enqueued_at, force) in (queue.popitem(last=False) for _ in range(count))
+                ]
+        return None
+
+    def _update_depth(self):
+        for lane, queue in self.lanes.items():
+            SCORING_QUEUE_DEPTH.labels(lane=lane).set(len(queue))
+
+    async def _work(self):
+        while True:
+            async with self._ready:
+                await self._ready.wait_for(lambda: any(self.lanes.values()))
+                lane, items = self._next()
+            self._update_depth()
+            for _, enqueued_at, _ in items:
+                SCORING_QUEUE_WAIT.labels(lane=lane).observe(time.monotonic() - enqueued_at)
+
+            started = time.monotonic()
+            SCORING_IN_PROGRESS.inc(len(items))
+            try:
+                # score_post_task and score_batch_task handle and log their own errors
+                if len(items) == 1:
+                    await score_post_task(items[0][0], items[0][2])
+                else:
+                    await score_batch_task({post_id: force for post_id, _, force in items})
+            finally:
+                SCORING_IN_PROGRESS.dec(len(items))
+            per_post = (time.monotonic() - started) / len(items)
+            self.average_duration = 0.8 * self.average_duration + 0.2 * per_post
+
+scoring_scheduler = ScoringScheduler(
+    SCORING_WORKERS,
+    {"interactive": SCORING_INTERACTIVE_QUEUE_SIZE, "bulk": SCORING_BULK_QUEUE_SIZE},
+    batch_size=LLM_BATCH_MAX_POSTS if LLM_ENABLED else 1
+)
+
+async def submit_for_scoring(post_ids: List[int], lane: str, force: bool = False) -> Dict[str, List[int]]:
+    try:
+        return await scoring_scheduler.submit(post_ids, lane, force)
+    except ScoringQueueFull as e:
+        logger.warning(f"Rejecting {len(post_ids)} posts, {e} ({scoring_scheduler.depth(lane)} waiting)")
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
 @app.post("/score")
-async def score_post(request: ScoreRequest, background_tasks: BackgroundTasks):
+async def score_post(request: ScoreRequest):
     """
     Score a single blog post
 
-    The scoring happens in a thread to avoid blocking the event loop.
-    Returns immediately with queued status.
+    Queued in the interactive lane, ahead of bulk rescoring; a scheduler
+    worker scores it without blocking the event loop (see score_post_task).
+    Returns immediately with queued status, or 429 when the lane is full.
     """
     logger.info(f"Received score request for post {request.post_id}")
 
-    # Run in thread pool to avoid blocking event loop with sync DB calls
-    background_tasks.add_task(score_post_task_sync, request.post_id)
+    result = await submit_for_scoring([request.post_id], "interactive", request.force)
 
     return {
         "message": f"Scoring post {request.post_id} in background",
         "post_id": request.post_id,
-        "status": "queued"
+        "status": "queued" if result["queued"] else "already_queued"
     }
 
-async def score_post_task(post_id: int):
-    """Background task to score a post (async version - deprecated, causes event loop blocking)"""
+async def score_post_task(post_id: int, force: bool = False):
+    """Score a post: every step awaits (pooled DB, async LLM), so the event loop stays free"""
     try:
         logger.info(f"Starting analysis for post {post_id}")
 
         # Get post
         post = await get_post(post_id)
 
-        # Analyze with LLM
-        scores = await analyze_with_llm(post)
+        # Analyze with LLM (or the score cache)
+        scores = await analyze_with_llm(post, force)
 
         # Store results
-        await store_scores(post_id, scores)
+        total = await store_scores(post_id, scores)
 
-        logger.info(f"Completed analysis for post {post_id}")
+        logger.info(f"Completed analysis for post {post_id}, score: {total}/100 (queued for storage)")
 
     except Exception as e:
-        logger.error(f"Error scoring post {post_id}: {e}")
+        logger.error(f"Error scoring post {post_id}: {e}", exc_info=True)
 
-def score_post_task_sync(post_id: int):
-    """Background task to score a post (synchronous version to avoid blocking event loop)"""
-    import asyncio
-    try:
-        logger.info(f"Starting analysis for post {post_id}")
+async def score_batch_task(jobs: Dict[int, bool]):
+    """
+    Score several bulk-lane posts (post id -> force), sharing prompts between short ones
 
-        # Get post - sync version
-        conn = get_db_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT id, title, category, content, author, created_at FROM blog_posts WHERE id = %s",
-                    (post_id,)
-                )
-                post = cur.fetchone()
-                if not post:
-                    logger.error(f"Post {post_id} not found")
-                    return
-                post = dict(post)
-        finally:
-            conn.close()
-
-        # Analyze with LLM - this is the slow part (Ollama)
-        if not llm:
-            # Demo mode
-            import random
-            scores = {
-                "technical_accuracy": random.randint(15, 25),
-                "clarity": random.randint(12, 20),
-                "completeness": random.randint(12, 20),
-                "code_quality": random.randint(8, 15),
-                "seo": random.randint(5, 10),
-                "engagement": random.randint(5, 10),
-                "suggestions": ["Add more code examples", "Improve the introduction", "Add a conclusion section"]
-            }
-        else:
-            # Real LLM analysis
-            prompt = SCORING_PROMPT.format(
+    Cache hits are stored straight away. The remaining posts are packed into
+    multi-post prompts under the provider's token budget. A post the batch
+    answer does not cover - the response did not parse, or its entry is
+    missing or incomplete - is scored again with its own prompt. Results are
+    cached under each post's single-post prompt, like per-post results.
+    """
+    if not LLM_ENABLED or len(jobs) == 1:
+        for post_id, force in jobs.items():
+            await score_post_task(post_id, force)
+        return
+
+    try:
+        logger.info(f"Starting batch analysis for posts {list(jobs)}")
+        posts = await get_posts(list(jobs))
+        for post_id in jobs.keys() - posts.keys():
+            logger.error(f"Error scoring post {post_id}: Post {post_id} not found")
+
+        similar = dict(zip(posts, await asyncio.gather(*(reference_posts(post) for post in posts.values()))))
+        prompts, cache_keys, sections = {}, {}, {}
+        for post_id, post in posts.items():
+            prompts[post_id] = scoring_prompt(post, similar[post_id])
+            cache_keys[post_id] = score_cache_key(prompts[post_id]) if SCORE_CACHE_ENABLED else None
+            if cache_keys[post_id]:
+                scores = await lookup_score_cache(cache_keys[post_id], jobs[post_id])
+                if scores:
+                    logger.info(f"Score cache hit for post {post_id}")
+                    total = await store_scores(post_id, scores)
+                    logger.info(f"Completed analysis for post {post_id}, score: {total}/100 (queued for storage)")
+                    continue
+            sections[post_id] = BATCH_POST_SECTION.format(
+                post_id=post_id,
                 title=post['title'],
                 category=post['category'],
                 author=post['author'],
                 content=post['content'][:2000],
-                similar_posts="No similar posts found."  # Simplified for now
+                similar_posts=similar[post_id]
             )
+    except Exception as e:
+        logger.error(f"Error scoring posts {list(jobs)}: {e}", exc_info=True)
+        return
 
+    for group in pack_batches(sections, LLM_BATCH_MAX_POSTS, LLM_BATCH_TOKEN_BUDGET):
+        results = {}
+        if len(group) > 1:
+            LLM_BATCH_SIZE.observe(len(group))
             try:
-                if LLM_PROVIDER == "ollama":
-                    response_text = llm.invoke(prompt)
-                    logger.info(f"Raw Ollama response (first 200 chars): {response_text[:200]}")
-                    
-                    import re
-                    first_brace = response_text.find('{')
-                    last_brace = response_text.rfind('}')
-                    
-                    if first_brace != -1 and last_brace != -1 and last_brace > first_brace:
-                        json_str = response_text[first_brace:last_brace + 1]
-                        json_str = json_str.replace('\\n', ' ').replace('\\r', ' ').replace('\\_', '_')
-                        json_str = re.sub(r'\\(?!["\\/bfnrtu])', r'\\\\', json_str)
-                        scores = json.loads(json_str)
-                    else:
-                        logger.error(f"No JSON found in Ollama response")
-                        return
-                else:
-                    response = llm.invoke(prompt)
-                    scores = json.loads(response.content)
-            except Exception as e:
-                logger.error(f"LLM analysis error: {e}")
-                return
-
-        # Store results - sync version
-        conn = get_db_connection()
-        try:
-            with conn.cursor() as cur:
-                total = (
-                    scores['technical_accuracy'] + scores['clarity'] + scores['completeness'] +
-                    scores['code_quality'] + scores['seo'] + scores['engagement']
+                response_text = await invoke_llm(
+                    BATCH_SCORING_PROMPT.format(posts="".join(sections[post_id] for post_id in group))
                 )
-
-                cur.execute(
-                    "UPDATE blog_posts SET ai_score = %s, last_scored_at = CURRENT_TIMESTAMP WHERE id = %s",
-                    (total, post_id)
-                )
-
-                cur.execute(
-                    """INSERT INTO post_analysis (
-                        post_id, technical_accuracy_score, clarity_score, completeness_score,
-                        code_quality_score, seo_score, engagement_score, total_score,
-                        suggestions, model_version
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-                    (
-                        post_id, scores['technical_accuracy'], scores['clarity'],
-                        scores['completeness'], scores['code_quality'], scores['seo'],
-                        scores['engagement'], total, json.dumps(scores.get('suggestions', [])),
-                        OLLAMA_MODEL if LLM_PROVIDER == "ollama" else "gpt-4-turbo-preview"
+                logger.info(f"Raw batch LLM response for posts {group} (first 200 chars): {response_text[:200]}")
+                results = parse_batch_scores(response_text, group)
+            except Exception as e:
+                LLM_BATCH_FALLBACKS.labels(reason="parse_error").inc(len(group))
+                logger.warning(f"Batch scoring of posts {group} failed, scoring them one by one: {e}")
+            else:
+                if len(results) < len(group):
+                    LLM_BATCH_FALLBACKS.labels(reason="missing").inc(len(group) - len(results))
+                    logger.warning(
+                        f"Batch response for posts {group} lacks {sorted(set(group) - results.keys())}, "
+                        "scoring them one by one"
                     )
-                )
 
-                conn.commit()
-                logger.info(f"Completed analysis for post {post_id}, score: {total}/100")
-        finally:
-            conn.close()
-
-    except Exception as e:
-        logger.error(f"Error scoring post {post_id}: {e}", exc_info=True)
+        for post_id in group:
+            try:
+                if post_id in results:
+                    scores = results[post_id]
+                    if cache_keys[post_id]:
+                        await cache_scores(cache_keys[post_id], scores)
+                else:
+                    scores = await score_with_llm(prompts[post_id], cache_keys[post_id])
+                total = await store_scores(post_id, scores)
+                logger.info(f"Completed analysis for post {post_id}, score: {total}/100 (queued for storage)")
+            except Exception as e:
+                logger.error(f"Error scoring post {post_id}: {e}", exc_info=True)
 
 @app.post("/score/batch")
-async def score_batch(request: BatchScoreRequest, background_tasks: BackgroundTasks):
-    """Score multiple posts"""
+async def score_batch(request: BatchScoreRequest):
+    """Score multiple posts (bulk lane - rejected as a whole with 429 if it does not fit)"""
     logger.info(f"Received batch score request for {len(request.post_ids)} posts")
+    if len(request.post_ids) > SCORING_BULK_QUEUE_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch of {len(request.post_ids)} posts exceeds the queue capacity ({SCORING_BULK_QUEUE_SIZE}), split it"
+        )
 
-    for post_id in request.post_ids:
-        background_tasks.add_task(score_post_task, post_id)
+    result = await submit_for_scoring(request.post_ids, "bulk", request.force)
 
     return {
-        "message": f"Scoring {len(request.post_ids)} posts in background",
+        "message": f"Scoring {len(result['queued'])} posts in background",
         "post_ids": request.post_ids,
+        "queued": result["queued"],
+        "already_queued": result["already_queued"],
         "status": "queued"
     }
 
 @app.get("/scores/{post_id}")
 async def get_scores(post_id: int):
     """Get all scores for a post"""
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                SELECT
-                    pa.*,
-                    bp.title,
-                    bp.category,
-                    bp.ai_score
-                FROM post_analysis pa
-                JOIN blog_posts bp ON pa.post_id = bp.id
-                WHERE pa.post_id = %s
-                ORDER BY pa.analyzed_at DESC
-                """,
-                (post_id,)
-            )
-            results = cur.fetchall()
+    async with db_pool.connection() as conn:
+        cur = await conn.execute(
+            """
+            SELECT
+                pa.*,
+                bp.title,
+                bp.category,
+                bp.ai_score
+            FROM post_analysis pa
+            JOIN blog_posts bp ON pa.post_id = bp.id
+            WHERE pa.post_id = %s
+            ORDER BY pa.analyzed_at DESC
+            """,
+            (post_id,)
+        )
+        results = await cur.fetchall()
 
-            if not results:
-                raise HTTPException(status_code=404, detail=f"No scores found for post {post_id}")
+    if not results:
+        raise HTTPException(status_code=404, detail=f"No scores found for post {post_id}")
 
-            return {
-                "post_id": post_id,
-                "title": results[0]['title'],
-                "category": results[0]['category'],
-                "current_score": results[0]['ai_score'],
-                "analysis_history": [dict(row) for row in results]
-            }
-    finally:
-        conn.close()
+    return {
+        "post_id": post_id,
+        "title": results[0]['title'],
+        "category": results[0]['category'],
+        "current_score": results[0]['ai_score'],
+        "analysis_history": results
+    }
 
 @app.get("/scores")
 async def get_all_scores(limit: int = 100):
     """Get all scored posts"""
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
+    async with db_pool.connection() as conn:
+        cur = await conn.execute(
+            """
+            SELECT
+                bp.id,
+                bp.title,
+                bp.category,
+                bp.author,
+                bp.ai_score,
+                bp.last_scored_at,
+                pa.technical_accuracy_score,
+                pa.clarity_score,
+                pa.completeness_score,
+                pa.code_quality_score,
+                pa.seo_score,
+                pa.engagement_score
+            FROM blog_posts bp
+            LEFT JOIN LATERAL (
+                SELECT * FROM post_analysis
+                WHERE post_id = bp.id
+                ORDER BY analyzed_at DESC
+                LIMIT 1
+            ) pa ON true
+            WHERE bp.ai_score IS NOT NULL
+            ORDER BY bp.ai_score DESC NULLS LAST, bp.id DESC
+            LIMIT %s
+            """,
+            (limit,)
+        )
+        return {"posts": await cur.fetchall()}
+
+# Vector index maintenance
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode()).hexdigest()
+
+def chunk_metadata(post: Dict, digest: str) -> Dict:
+    return {
+        'post_id': post['id'],
+        'title': post['title'],
+        'category': post['category'],
+        'score': post['ai_score'] or 0,
+        'content_hash': digest
+    }
+
+def vector_literal(vector: List[float]) -> str:
+    """A vector in pgvector's text format, cast with ::vector"""
+    return "[" + ",".join(map(str, vector)) + "]"
+
+class ChromaStore:
+    """
+    Chunks in the local Chroma directory (VECTOR_DB_PATH), one copy per replica
+
+    Title, category and score are kept in chunk metadata for the search
+    filters, so they are updated when the post changes. The sync state is a
+    file next to the index, so an empty index volume starts from zero.
+    """
+
+    name = "chroma"
+    metadata_fields = ('title', 'category', 'score')
+
+    def __init__(self, db, state_path: str):
+        self.db = db
+        self.state_path = state_path
+
+    @contextlib.asynccontextmanager
+    async def exclusive(self):
+        # Only this process writes its directory
+        yield True
+
+    async def load_state(self) -> Dict:
+        try:
+            with open(self.state_path) as state:
+                return json.load(state)
+        except FileNotFoundError:
+            return {"watermark": 0, "completed": False}
+
+    async def save_state(self, watermark: int, completed: bool):
+        # Written to a temporary file and renamed, so a crash never leaves a torn state file
+        temporary = self.state_path + ".tmp"
+        with open(temporary, "w") as state:
+            json.dump({"watermark": watermark, "completed": completed, "saved_at": datetime.utcnow().isoformat()}, state)
+        os.replace(temporary, self.state_path)
+
+    # Chroma calls are synchronous - keep them off the event loop
+    async def chunks(self, post_ids: List[int]) -> Dict[int, List]:
+        """(chunk id, metadata) of the indexed chunks of each post"""
+        existing = await asyncio.to_thread(
+            self.db.get, where={"post_id": {"$in": post_ids}}, include=["metadatas"]
+        )
+        chunks_by_post = collections.defaultdict(list)
+        for chunk_id, metadata in zip(existing["ids"], existing["metadatas"]):
+            chunks_by_post[metadata['post_id']].append((chunk_id, metadata))
+        return chunks_by_post
+
+    async def update_metadata(self, chunk_ids: List[str], metadatas: List[Dict]):
+        await asyncio.to_thread(self.db._collection.update, ids=chunk_ids, metadatas=metadatas)
+
+    async def delete_posts(self, post_ids: List[int]):
+        chunk_ids = (await asyncio.to_thread(self.db.get, where={"post_id": {"$in": post_ids}}, include=[]))["ids"]
+        if chunk_ids:
+            await asyncio.to_thread(self.db.delete, ids=chunk_ids)
+
+    async def clear(self):
+        chunk_ids = (await asyncio.to_thread(self.db.get, include=[]))["ids"]
+        if chunk_ids:
+            await asyncio.to_thread(self.db.delete, ids=chunk_ids)
+
+    async def upsert(self, chunk_ids: List[str], vectors: List[List[float]], metadatas: List[Dict], texts: List[str]):
+        await asyncio.to_thread(
+            self.db._collection.upsert, ids=chunk_ids, embeddings=vectors, metadatas=metadatas, documents=texts
+        )
+
+    async def persist(self):
+        await asyncio.to_thread(self.db.persist)
+
+    async def search(self, vector: List[float], k: int, exclude_post_id: Optional[int] = None,
+                     min_score: int = 0, category: Optional[str] = None) -> List[Dict]:
+        """Nearest chunks as {post_id, content, distance}, nearest first"""
+        conditions = []
+        if exclude_post_id is not None:
+            conditions.append({"post_id": {"$ne": exclude_post_id}})
+        if min_score:
+            conditions.append({"score": {"$gte": min_score}})
+        if category:
+            conditions.append({"category": category})
+        where = None if not conditions else conditions[0] if len(conditions) == 1 else {"$and": conditions}
+        results = await asyncio.to_thread(
+            self.db.similarity_search_by_vector_with_relevance_scores, vector, k=k, filter=where
+        )
+        return [
+            {"post_id": doc.metadata['post_id'], "content": doc.page_content, "distance": distance}
+            for doc, distance in results
+        ]
+
+class PgVectorStore:
+    """
+    Chunks in Postgres (post_embeddings, migration 0010), shared by every replica
+
+    Only the text and its embedding are stored; score and category filters
+    join blog_posts, so they always see the current values and nothing has
+    to be updated when a post is scored. Chunks of a deleted post go with it
+    (ON DELETE CASCADE). The sync state is a row in vector_index_state, and
+    a session advisory lock lets one replica at a time run the sync.
+    """
+
+    name = "pgvector"
+    metadata_fields = ()
+    SYNC_LOCK_ID = 7305562
+
+    def __init__(self, model: str, ef_search: int):
+        self.model = model
+        self.ef_search = ef_search
+
+    @contextlib.asynccontextmanager
+    async def exclusive(self):
+        async with db_pool.connection() as conn:
+            cur = await conn.execute("SELECT pg_try_advisory_lock(%s) AS acquired", (self.SYNC_LOCK_ID,))
+            acquired = (await cur.fetchone())['acquired']
+            await conn.commit()  # the lock is held by the session, not an open transaction
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    await conn.execute("SELECT pg_advisory_unlock(%s)", (self.SYNC_LOCK_ID,))
+
+    async def load_state(self) -> Dict:
+        async with db_pool.connection() as conn:
+            cur = await conn.execute(
+                "SELECT watermark, completed, saved_at FROM vector_index_state WHERE backend = %s", (self.name,)
+            )
+            row = await cur.fetchone()
+        return row or {"watermark": 0, "completed": False}
+
+    async def save_state(self, watermark: int, completed: bool):
+        async with db_pool.connection() as conn:
+            await conn.execute(
+                """
+                INSERT INTO vector_index_state (backend, watermark, completed) VALUES (%s, %s, %s)
+                ON CONFLICT (backend) DO UPDATE
+                SET watermark = EXCLUDED.watermark, completed = EXCLUDED.completed, saved_at = CURRENT_TIMESTAMP
+                """,
+                (self.name, watermark, completed)
+            )
+
+    async def chunks(self, post_ids: List[int]) -> Dict[int, List]:
+        async with db_pool.connection() as conn:
+            cur = await conn.execute(
+                "SELECT post_id, chunk, chunk_count, content_hash FROM post_embeddings WHERE post_id = ANY(%s)",
+                (post_ids,)
+            )
+            rows = await cur.fetchall()
+        chunks_by_post = collections.defaultdict(list)
+        for row in rows:
+            chunks_by_post[row['post_id']].append((f"{row['post_id']}-{row['chunk']}", row))
+        return chunks_by_post
+
+    async def update_metadata(self, chunk_ids: List[str], metadatas: List[Dict]):
+        pass  # no metadata is stored
+
+    async def delete_posts(self, post_ids: List[int]):
+        async with db_pool.connection() as conn:
+            await conn.execute("DELETE FROM post_embeddings WHERE post_id = ANY(%s)", (post_ids,))
+
+    async def clear(self):
+        async with db_pool.connection() as conn:
+            await conn.execute("TRUNCATE post_embeddings")
+
+    async def upsert(self, chunk_ids: List[str], vectors: List[List[float]], metadatas: List[Dict], texts: List[str]):
+        async with db_pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.executemany(
+                    """
+                    INSERT INTO post_embeddings (post_id, chunk, chunk_count, content, content_hash, model, embedding)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s::vector)
+                    ON CONFLICT (post_id, chunk) DO UPDATE
+                    SET chunk_count = EXCLUDED.chunk_count, content = EXCLUDED.content,
+                        content_hash = EXCLUDED.content_hash, model = EXCLUDED.model, embedding = EXCLUDED.embedding
+                    """,
+                    [
+                        (
+                            metadata['post_id'], metadata['chunk'], metadata['chunk_count'], text,
+                            metadata['content_hash'], self.model, vector_literal(vector)
+                        )
+                        for vector, metadata, text in zip(vectors, metadatas, texts)
+                    ]
+                )
+
+    async def persist(self):
+        pass  # committed with every write
+
+    async def check_dimensions(self, embeddings: Embeddings):
+        """Fail fast when post_embeddings cannot hold the vectors the embeddings model returns"""
+        async with db_pool.connection() as conn:
+            cur = await conn.execute(
+                """
+                SELECT a.atttypmod AS dimensions
+                FROM pg_attribute a
+                WHERE a.attrelid = to_regclass('post_embeddings') AND a.attname = 'embedding'
+                """
+            )
+            column = await cur.fetchone()
+        if column is None:
+            raise RuntimeError("VECTOR_BACKEND=pgvector needs the post_embeddings table (migration 0010 with pgvector)")
+
+        dimensions = len(await asyncio.to_thread(embeddings.embed_query, "dimensions"))
+        if column['dimensions'] != dimensions:
+            raise RuntimeError(
+                f"post_embeddings.embedding holds {column['dimensions']} dimensions but {self.model} returns "
+                f"{dimensions}; resize the column (see the AI agent README) or use a matching embeddings model"
+            )
+
+    async def search(self, vector: List[float], k: int, exclude_post_id: Optional[int] = None,
+                     min_score: int = 0, category: Optional[str] = None) -> List[Dict]:
+        """Nearest chunks as {post_id, content, distance}, nearest first"""
+        conditions, params = [], []
+        if exclude_post_id is not None:
+            conditions.append("e.post_id <> %s")
+            params.append(exclude_post_id)
+        if min_score:
+            conditions.append("bp.ai_score >= %s")
+            params.append(min_score)
+        if category:
+            conditions.append("bp.category = %s")
+            params.append(category)
+
+        async with db_pool.connection() as conn:
+            # Candidates the HNSW scan yields before the filters apply - selective filters need more
+            await conn.execute("SELECT set_config('hnsw.ef_search', %s, true)", (str(self.ef_search),))
+            cur = await conn.execute(
                 """
-                SELECT
-                    bp.id,
-                    bp.title,
-                    bp.category,
-                    bp.author,
-                    bp.ai_score,
-                    bp.last_scored_at,
-                    pa.technical_accuracy_score,
-                    pa.clarity_score,
-                    pa.completeness_score,
-                    pa.code_quality_score,
-                    pa.seo_score,
-                    pa.engagement_score
-                FROM blog_posts bp
-                LEFT JOIN LATERAL (
-                    SELECT * FROM post_analysis
-                    WHERE post_id = bp.id
-                    ORDER BY analyzed_at DESC
-                    LIMIT 1
-                ) pa ON true
-                WHERE bp.ai_score IS NOT NULL
-                ORDER BY bp.ai_score DESC
+                SELECT e.post_id, e.content, e.embedding <=> %s::vector AS distance
+                FROM post_embeddings e
+                JOIN blog_posts bp ON bp.id = e.post_id
+                """ + ("WHERE " + " AND ".join(conditions) if conditions else "") + """
+                ORDER BY distance
                 LIMIT %s
                 """,
-                (limit,)
+                [vector_literal(vector), *params, k]
             )
-            results = cur.fetchall()
-            return {"posts": [dict(row) for row in results]}
-    finally:
-        conn.close()
+            return await cur.fetchall()
 
-@app.post("/reindex")
-async def reindex_vector_db():
-    """Rebuild vector database from all posts"""
-    if not vector_db:
-        raise HTTPException(status_code=503, detail="Vector DB not available")
+class PostNeighbors:
+    """
+    Precomputed similar posts (post_neighbor_lists and post_neighbors)
+
+    A post's list holds its top-k neighbours with their distances and the
+    snippets used as prompt references, so retrieval is a primary-key
+    lookup. The list key covers the post's content and the retrieval
+    settings; a missing, stale or outdated list is searched and stored on
+    lookup (read-through). The vector index sync keeps other posts' lists
+    current: a list is marked stale when a post it shows changes, is
+    deleted or stops passing the filters, or when a changed post comes
+    closer than the list's k-th neighbour. That last check reuses the
+    changed post's own distances, so it is approximate; a full reindex
+    recomputes every list.
+    """
 
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT id, title, content, ai_score FROM blog_posts")
-            posts = cur.fetchall()
+    def __init__(self, k: int, page_size: int):
+        self.k = k
+        self.page_size = page_size
 
-        # Clear existing data
-        vector_db.delete_collection()
+    def list_key(self, post: Dict) -> str:
+        settings = (
+            VECTOR_BACKEND, getattr(embeddings, 'model', ''), self.k, SIMILAR_POSTS_EXCLUDE_SELF,
+            SIMILAR_POSTS_MIN_SCORE, post['category'] if SIMILAR_POSTS_SAME_CATEGORY else ''
+        )
+        return hashlib.sha256(f"{content_hash(post['content'])}\0{settings}".encode()).hexdigest()
+
+    @staticmethod
+    def eligible(post: Dict) -> bool:
+        """Whether the post can appear in other posts' lists"""
+        return (post['ai_score'] or 0) >= SIMILAR_POSTS_MIN_SCORE
+
+    async def get(self, post: Dict) -> List[Dict]:
+        """
+        The post's neighbours as {neighbor_id, distance, snippet}, nearest first
+
+        Empty while the tables are not there yet; any other failure (database,
+        embeddings API) is raised, so a post is not scored without its
+        reference posts and cached that way.
+        """
+        if not vector_store:
+            return []
+        try:
+            async with db_pool.connection() as conn:
+                cur = await conn.execute(
+                    """
+                    SELECT l.list_key, n.neighbor_id, n.distance, n.snippet
+                    FROM post_neighbor_lists l
+                    LEFT JOIN post_neighbors n ON n.post_id = l.post_id
+                    WHERE l.post_id = %s AND NOT l.stale
+                    ORDER BY n.rank
+                    """,
+                    (post['id'],)
+                )
+                rows = await cur.fetchall()
+            if rows and rows[0]['list_key'] == self.list_key(post):
+                POST_NEIGHBOR_LOOKUPS.labels(result="hit").inc()
+                # An empty list comes back as one row without a neighbour
+                return [
+                    {"neighbor_id": row['neighbor_id'], "distance": row['distance'], "snippet": row['snippet']}
+                    for row in rows if row['neighbor_id'] is not None
+                ]
+
+            POST_NEIGHBOR_LOOKUPS.labels(result="miss").inc()
+            return await self.compute(post)
+        except psycopg.errors.UndefinedTable as e:
+            # Migration 0011 (or, for pgvector, 0010) not applied yet - no reference posts until it is
+            logger.warning(f"Similar posts unavailable: {e}")
+            return []
+
+    async def compute(self, post: Dict) -> List[Dict]:
+        neighbors = await find_similar_posts(post, self.k)
+        await self.save(post['id'], self.list_key(post), neighbors)
+        return neighbors
+
+    async def save(self, post_id: int, list_key: str, neighbors: List[Dict]):
+        async with db_pool.connection() as conn:
+            await conn.execute(
+                """
+                INSERT INTO post_neighbor_lists (post_id, list_key, kth_distance, stale, computed_at)
+                VALUES (%s, %s, %s, false, CURRENT_TIMESTAMP)
+                ON CONFLICT (post_id) DO UPDATE
+                SET list_key = EXCLUDED.list_key, kth_distance = EXCLUDED.kth_distance,
+                    stale = false, computed_at = EXCLUDED.computed_at
+                """,
+                (post_id, list_key, neighbors[-1]['distance'] if len(neighbors) >= self.k else None)
+            )
+            await conn.execute("DELETE FROM post_neighbors WHERE post_id = %s", (post_id,))
+            if neighbors:
+                async with conn.cursor() as cur:
+                    await cur.executemany(
+                        "INSERT INTO post_neighbors (post_id, rank, neighbor_id, distance, snippet) VALUES (%s, %s, %s, %s, %s)",
+                        [
+                            (post_id, rank, neighbor['neighbor_id'], neighbor['distance'], neighbor['snippet'])
+                            for rank, neighbor in enumerate(neighbors)
+                        ]
+                    )
 
-        # Add posts to vector DB
-        text_splitter = RecursiveCharacterTextSplitter(
+    async def mark_stale(self, where: str, params):
+        async with db_pool.connection() as conn:
+            await conn.execute(f"UPDATE post_neighbor_lists SET stale = true WHERE NOT stale AND {where}", params)
+
+    async def refresh(self, content_changed: List[int], other_changed: List[int], deleted: List[int], full: bool):
+        """
+        Mark the lists a sync's changes affect as stale and recompute every
+        stale list. content_changed are the posts embedded again,
+        other_changed the posts whose score or metadata may have changed.
+        """
+        if full:
+            await self.mark_stale("true", ())
+        else:
+            # A post whose text changed has new neighbours, and so do the lists showing it or a deleted post
+            await self.mark_stale(
+                "(post_id = ANY(%s) OR post_id IN (SELECT post_id FROM post_neighbors WHERE neighbor_id = ANY(%s)))",
+                (content_changed, content_changed + deleted)
+            )
+            for start in range(0, len(content_changed) + len(other_changed), self.page_size):
+                page = (content_changed + other_changed)[start:start + self.page_size]
+                for post in (await get_posts(page)).values():
+                    await self._refresh_post(post, content_changed=post['id'] in content_changed)
+
+        while True:
+            async with db_pool.connection() as conn:
+                cur = await conn.execute(
+                    "SELECT post_id FROM post_neighbor_lists WHERE stale LIMIT %s", (self.page_size,)
+                )
+                stale = [row['post_id'] for row in await cur.fetchall()]
+            if not stale:
+                break
+            posts = await get_posts(stale)
+            for post in posts.values():
+                await self.compute(post)
+                POST_NEIGHBOR_REFRESHES.inc()
+            missing = [post_id for post_id in stale if post_id not in posts]
+            if missing:
+                async with db_pool.connection() as conn:
+                    await conn.execute("DELETE FROM post_neighbor_lists WHERE post_id = ANY(%s)", (missing,))
+
+    async def _refresh_post(self, post: Dict, content_changed: bool):
+        if not self.eligible(post):
+            # Dropped below the score filter - lists showing it need another neighbour
+            await self.mark_stale(
+                "post_id IN (SELECT post_id FROM post_neighbors WHERE neighbor_id = %s)", (post['id'],)
+            )
+            return
+        if SIMILAR_POSTS_SAME_CATEGORY:
+            # Moved to another category - lists of its old category need another neighbour
+            await self.mark_stale(
+                """
+                post_id IN (
+                    SELECT n.post_id
+                    FROM post_neighbors n
+                    JOIN blog_posts bp ON bp.id = n.post_id
+                    WHERE n.neighbor_id = %s AND bp.category <> %s
+                )
+                """,
+                (post['id'], post['category'])
+            )
+        if not (content_changed or SIMILAR_POSTS_MIN_SCORE or SIMILAR_POSTS_SAME_CATEGORY):
+            return  # nothing about it that other lists depend on has changed
+
+        # Lists it may enter now: posts near it whose k-th neighbour is farther away
+        query = await asyncio.to_thread(embeddings.embed_query, post['content'])
+        candidates = await nearest_posts(query, self.k * 2, exclude_post_id=post['id'])
+        if candidates:
+            await self.mark_stale(
+                """
+                post_id IN (
+                    SELECT l.post_id
+                    FROM post_neighbor_lists l
+                    JOIN blog_posts bp ON bp.id = l.post_id
+                    JOIN unnest(%s::integer[], %s::real[]) AS c(post_id, distance) ON c.post_id = l.post_id
+                    WHERE (l.kth_distance IS NULL OR c.distance < l.kth_distance)
+                      AND (NOT %s OR bp.category = %s)
+                )
+                """,
+                (
+                    [candidate['neighbor_id'] for candidate in candidates],
+                    [candidate['distance'] for candidate in candidates],
+                    SIMILAR_POSTS_SAME_CATEGORY,
+                    post['category']
+                )
+            )
+
+post_neighbors = PostNeighbors(POST_NEIGHBORS_K, VECTOR_SYNC_PAGE_SIZE)
+
+class VectorIndexBusy(Exception):
+    """Another sync holds the store (this replica or, for a shared store, another one)"""
+
+class VectorIndexer:
+    """
+    Keeps the vector store in step with blog_posts
+
+    Chunks have ids "<post_id>-<n>" and carry the hash of the content they
+    were split from and the number of chunks of the post. A sync reads the posts and tombstones whose change_seq
+    is past the watermark of the previous sync, up to the highest committed
+    one (scoring bumps change_seq too, so score events are picked up the same
+    way). Writers assign change_seq in commit order, so no change below that
+    maximum can still appear. A post whose content hash
+    changed is split and embedded again, one whose metadata changed (Chroma
+    only) gets new metadata, and deleted posts lose their chunks. A full
+    reindex clears the store and syncs from zero.
+
+    A sync is a pipeline of bounded queues, so memory stays constant however
+    large the corpus is: a server-side cursor reads `page_size` posts at a
+    time, each page is compared with the store and split, chunks are
+    embedded in batches of `batch_size` (across posts) by `concurrency`
+    parallel calls, and one writer upserts each embedded batch. The
+    watermark is saved in the store whenever every chunk of the oldest
+    pending pages is written, so an interrupted sync resumes where it
+    stopped - on the next start, or the next sync.
+    """
+
+    def __init__(self, store, interval: float, page_size: int, batch_size: int, concurrency: int):
+        self.store = store
+        self.interval = interval
+        self.page_size = page_size
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=200
         )
+        self.progress = {}  # the running (or last) sync in this process, for GET /reindex/progress
+        self._lock = None
+        self._checkpoint_lock = None
+        self._task = None
+        self._requested = None  # a sync started by POST /reindex
+
+    def start(self):
+        self._lock = asyncio.Lock()
+        self._checkpoint_lock = asyncio.Lock()
+        if self.interval > 0:
+            self._task = asyncio.get_running_loop().create_task(self._sync_periodically(), name="vector-index-sync")
+
+    async def stop(self):
+        tasks = [task for task in (self._task, self._requested) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = self._requested = None
+
+    @property
+    def running(self) -> bool:
+        return (self._lock is not None and self._lock.locked()) or (
+            self._requested is not None and not self._requested.done()
+        )
 
-        for post in posts:
-            chunks = text_splitter.split_text(post['content'])
-            vector_db.add_texts(
-                texts=chunks,
-                metadatas=[{
-                    'post_id': post['id'],
-                    'title': post['title'],
-                    'score': post.get('ai_score', 0)
-                }] * len(chunks)
+    async def start_sync(self, full: bool = False):
+        """
+        Run a sync in the background, returning once it holds the store
+
+        Raises VectorIndexBusy if a sync is already running, here or (for a
+        shared store) on another replica. Progress and errors of the sync are
+        reported by status().
+        """
+        if self.running:
+            raise VectorIndexBusy()
+        started = asyncio.get_running_loop().create_future()
+        self._requested = asyncio.get_running_loop().create_task(
+            self._run_requested(full, started), name="vector-index-reindex"
+        )
+        await asyncio.shield(started)  # the sync carries on if the request goes away
+
+    async def _run_requested(self, full: bool, started: asyncio.Future):
+        try:
+            await self.sync(full, started)
+        except Exception as e:
+            if not started.done():
+                started.set_exception(e)  # raised to the request that started it
+            else:
+                logger.error(f"Vector index {'rebuild' if full else 'sync'} failed: {e}", exc_info=True)
+
+    async def save_state(self, watermark: int, completed: bool):
+        await self.store.save_state(watermark, completed)
+        VECTOR_INDEX_WATERMARK.set(watermark)
+
+    async def status(self) -> Dict:
+        """Progress of the running (or last) sync, with throughput and a completion estimate"""
+        state = await self.store.load_state()
+        status = {
+            "backend": self.store.name,
+            "running": self.running,
+            "watermark": state["watermark"],
+            "completed": state["completed"],
+            **self.progress
+        }
+        if self.progress:
+            elapsed = (self.progress.get("finished") or time.monotonic()) - self.progress["started"]
+            status["elapsed_seconds"] = round(elapsed, 1)
+            status["chunks_per_second"] = round(self.progress["chunks_embedded"] / elapsed, 2) if elapsed > 0 else None
+            done = self.progress["posts_done"]
+            if self.running and done:
+                status["eta_seconds"] = round(elapsed / done * (self.progress["posts_total"] - done))
+            del status["started"], status["finished"]
+        return status
+
+    async def _sync_periodically(self):
+        # An interrupted sync (or an index never built) resumes right away
+        delay = 0 if not (await self.store.load_state())["completed"] else self.interval
+        while True:
+            await asyncio.sleep(delay)
+            delay = self.interval
+            try:
+                await self.sync()
+            except VectorIndexBusy:
+                logger.info("Vector index sync skipped, another sync is running")
+            except Exception as e:
+                logger.error(f"Vector index sync failed: {e}", exc_info=True)
+
+    async def sync(self, full: bool = False, started: Optional[asyncio.Future] = None) -> Dict:
+        """Bring the store up to date with blog_posts and return what was done"""
+        async with self._lock, self.store.exclusive() as acquired:
+            if not acquired:
+                raise VectorIndexBusy()
+            if full:
+                await self.store.clear()
+                # An interrupted rebuild must resume from zero, not from the old watermark
+                await self.save_state(0, completed=False)
+            watermark = (await self.store.load_state())["watermark"]
+
+            async with db_pool.connection() as conn:
+                # change_seq is assigned under CHANGE_SEQ_LOCK_ID, held until commit, so a change
+                # still being written commits a value above this one and is left for the next sync
+                cur = await conn.execute(
+                    """
+                    SELECT greatest(
+                        (SELECT max(change_seq) FROM blog_posts),
+                        (SELECT max(change_seq) FROM post_tombstones)
+                    ) AS change_seq
+                    """
+                )
+                target = (await cur.fetchone())['change_seq'] or 0
+                if target < watermark:
+                    logger.warning(
+                        f"Vector index watermark {watermark} is ahead of the database ({target}), syncing from zero"
+                    )
+                    watermark = 0
+                cur = await conn.execute(
+                    "SELECT post_id FROM post_tombstones WHERE change_seq > %s AND change_seq <= %s",
+                    (watermark, target)
+                )
+                deleted = [row['post_id'] for row in await cur.fetchall()]
+                cur = await conn.execute(
+                    "SELECT count(*) AS posts FROM blog_posts WHERE change_seq > %s AND change_seq <= %s",
+                    (watermark, target)
+                )
+                posts_total = (await cur.fetchone())['posts']
+
+            stats = collections.Counter()
+            self.progress = {
+                "mode": "full" if full else "incremental",
+                "started_at": datetime.utcnow().isoformat(),
+                "started": time.monotonic(),
+                "finished": None,
+                "from_watermark": watermark,
+                "target_watermark": target,
+                "posts_total": posts_total,
+                "posts_done": 0,
+                "chunks_embedded": 0,
+                "stats": stats,
+                "error": None
+            }
+            if started is not None and not started.done():
+                started.set_result(None)
+            try:
+                if deleted:
+                    await self.store.delete_posts(deleted)
+                    stats["deleted"] += len(deleted)
+                # A full rebuild recomputes every neighbour list, so the changed posts aren't needed
+                changes = None if full else {"content": [], "other": []}
+                await self._run_pipeline(watermark, target, stats, changes)
+                await self.store.persist()
+                await self.save_state(target, completed=True)
+            except Exception as e:
+                # A failing pipeline stage arrives wrapped by the TaskGroup
+                self.progress["error"] = "; ".join(map(str, e.exceptions if isinstance(e, ExceptionGroup) else [e]))
+                raise
+            finally:
+                self.progress["finished"] = time.monotonic()
+
+            for action, count in stats.items():
+                VECTOR_INDEX_POSTS.labels(action=action).inc(count)
+            logger.info(
+                f"Vector index ({self.store.name}) {'rebuilt' if full else 'synced'} to change_seq {target} "
+                f"in {self.progress['finished'] - self.progress['started']:.1f}s: {dict(stats) or 'no changes'}"
             )
 
-        vector_db.persist()
+            # The index is current either way - stale neighbour lists are recomputed on lookup or next sync
+            try:
+                await post_neighbors.refresh(
+                    changes["content"] if changes else [], changes["other"] if changes else [], deleted, full
+                )
+            except Exception as e:
+                logger.error(f"Refreshing similar posts failed: {e}", exc_info=True)
+            return {
+                "watermark": target,
+                "posts_embedded": stats["embedded"],
+                "posts_metadata_updated": stats["metadata"],
+                "posts_unchanged": stats["unchanged"],
+                "posts_deleted": stats["deleted"],
+                "chunks_embedded": self.progress["chunks_embedded"]
+            }
 
-        return {
-            "message": "Vector database reindexed",
-            "posts_indexed": len(posts)
-        }
+    async def _run_pipeline(self, watermark: int, target: int, stats: collections.Counter, changes: Optional[Dict]):
+        """Read -> compare and split -> embed (batched, concurrent) -> write, over bounded queues"""
+        pages = asyncio.Queue(maxsize=2)
+        batches = asyncio.Queue(maxsize=self.concurrency)
+        embedded = asyncio.Queue(maxsize=self.concurrency)
+        pending = collections.deque()  # pages in change_seq order until all their chunks are written
+
+        async def read():
+            async with db_pool.connection() as conn:
+                # Server-side cursor - rows arrive a page at a time, never the whole corpus
+                async with conn.cursor(name="vector_index_sync") as cur:
+                    await cur.execute(
+                        """
+                        SELECT bp.id, bp.title, bp.category, c.content, bp.ai_score, bp.change_seq
+                        FROM blog_posts bp
+                        JOIN blog_post_contents c ON c.post_id = bp.id
+                        WHERE bp.change_seq > %s AND bp.change_seq <= %s
+                        ORDER BY bp.change_seq
+                        """,
+                        (watermark, target)
+                    )
+                    while posts := await cur.fetchmany(self.page_size):
+                        await pages.put(posts)
+            await pages.put(None)
+
+        async def split():
+            batch = []
+            while (posts := await pages.get()) is not None:
+                chunks, page_stats = await self._plan(posts, changes)
+                stats.update(page_stats)
+                page = {"last_seq": posts[-1]['change_seq'], "posts": len(posts), "pending": len(chunks)}
+                pending.append(page)
+                await self._checkpoint(pending)  # a page with nothing to embed is done already
+                for chunk in chunks:
+                    batch.append((page, *chunk))
+                    if len(batch) >= self.batch_size:
+                        await batches.put(batch)
+                        batch = []
+            if batch:
+                await batches.put(batch)
+            for _ in range(self.concurrency):
+                await batches.put(None)
+
+        async def embed():
+            while (batch := await batches.get()) is not None:
+                started = time.monotonic()
+                vectors = await asyncio.to_thread(embeddings.embed_documents, [text for _, text, _, _ in batch])
+                EMBEDDING_BATCH_LATENCY.observe(time.monotonic() - started)
+                await embedded.put((batch, vectors))
+            await embedded.put(None)
+
+        async def write():
+            running = self.concurrency
+            while running:
+                item = await embedded.get()
+                if item is None:
+                    running -= 1
+                    continue
+                batch, vectors = item
+                # One writer, so the store sees a single stream of bulk upserts
+                await self.store.upsert(
+                    [chunk_id for _, _, _, chunk_id in batch],
+                    vectors,
+                    [metadata for _, _, metadata, _ in batch],
+                    [text for _, text, _, _ in batch]
+                )
+                for page, _, _, _ in batch:
+                    page["pending"] -= 1
+                self.progress["chunks_embedded"] += len(batch)
+                await self._checkpoint(pending)
+
+        # A failing stage cancels the others; the watermark stays at the last complete page
+        async with asyncio.TaskGroup() as stages:
+            stages.create_task(read())
+            stages.create_task(split())
+            for _ in range(self.concurrency):
+                stages.create_task(embed())
+            stages.create_task(write())
+
+    async def _checkpoint(self, pending: collections.deque):
+        """Move the watermark past the leading pages whose chunks are all written"""
+        async with self._checkpoint_lock:
+            watermark = None
+            while pending and pending[0]["pending"] == 0:
+                page = pending.popleft()
+                watermark = page["last_seq"]
+                self.progress["posts_done"] += page["posts"]
+            if watermark is not None:
+                await self.save_state(watermark, completed=False)
+
+    async def _plan(self, posts: List[Dict], changes: Optional[Dict] = None):
+        """
+        Compare a page of posts with the store
+
+        Metadata-only changes are applied here. Returns the chunks to embed as
+        (text, metadata, chunk id) - the old chunks of those posts are deleted -
+        and counts per action. Post ids are added to changes["content"] when
+        they are embedded again and to changes["other"] otherwise.
+        """
+        stats = collections.Counter()
+        existing = await self.store.chunks([post['id'] for post in posts])
+
+        changed_ids, to_split, updated_ids, updated_metadatas = [], [], [], []
+        for post in posts:
+            digest = content_hash(post['content'])
+            old_chunks = existing.get(post['id'], [])
+            metadata = chunk_metadata(post, digest)
+
+            # Complete and current - a sync interrupted mid-post can leave only some of its chunks
+            if old_chunks and all(
+                old.get('content_hash') == digest and old.get('chunk_count') == len(old_chunks) for _, old in old_chunks
+            ):
+                if any(old.get(field) != metadata[field] for _, old in old_chunks for field in self.store.metadata_fields):
+                    # Same text, so the embeddings still hold - only the metadata changes
+                    updated_ids += [chunk_id for chunk_id, _ in old_chunks]
+                    updated_metadatas += [{**old, **metadata} for _, old in old_chunks]
+                    stats["metadata"] += 1
+                else:
+                    stats["unchanged"] += 1
+                if changes is not None:
+                    changes["other"].append(post['id'])
+                continue
+
+            if old_chunks:
+                changed_ids.append(post['id'])
+            to_split.append((post, metadata))
+            stats["embedded"] += 1
+            if changes is not None:
+                changes["content"].append(post['id'])
+
+        if updated_ids:
+            await self.store.update_metadata(updated_ids, updated_metadatas)
+        if changed_ids:
+            await self.store.delete_posts(changed_ids)
+        return await asyncio.to_thread(self._split, to_split), stats
+
+    def _split(self, posts: List) -> List:
+        chunks = []
+        for post, metadata in posts:
+            pieces = self.text_splitter.split_text(post['content'])
+            for n, text in enumerate(pieces):
+                chunks.append((text, {**metadata, 'chunk': n, 'chunk_count': len(pieces)}, f"{post['id']}-{n}"))
+        return chunks
+
+if VECTOR_BACKEND == "pgvector" and embeddings:
+    vector_store = PgVectorStore(embeddings.model, PGVECTOR_EF_SEARCH)
+elif vector_db:
+    vector_store = ChromaStore(vector_db, VECTOR_INDEX_STATE_PATH)
+else:
+    vector_store = None
 
-    finally:
-        conn.close()
+vector_indexer = VectorIndexer(
+    vector_store, VECTOR_SYNC_INTERVAL, VECTOR_SYNC_PAGE_SIZE, EMBEDDING_BATCH_SIZE, EMBEDDING_CONCURRENCY
+)
+
+@app.post("/reindex", status_code=202)
+async def reindex_vector_db(mode: str = Query("full", pattern="^(full|incremental)$")):
+    """
+    Start updating the vector store from blog_posts
+
+    mode=full clears the index and embeds every post again; mode=incremental
+    only handles posts changed or deleted since the last sync, which also
+    runs in the background every VECTOR_SYNC_INTERVAL_SECONDS.
+    The sync runs in the background: 202 once it has started, 409 if a sync
+    is already running. Follow it with GET /reindex/progress.
+    """
+    if not vector_store:
+        raise HTTPException(status_code=503, detail="Vector DB not available")
+
+    try:
+        await vector_indexer.start_sync(full=mode == "full")
+    except VectorIndexBusy:
+        raise HTTPException(status_code=409, detail="A vector index sync is already running")
+
+    return {
+        "message": "Vector database reindex started" if mode == "full" else "Vector database sync started",
+        "mode": mode,
+        "backend": vector_store.name,
+        "progress": "/reindex/progress"
+    }
+
+@app.get("/reindex/progress")
+async def reindex_progress():
+    """Progress of the running (or last) vector index sync"""
+    if not vector_store:
+        raise HTTPException(status_code=503, detail="Vector DB not available")
+    return await vector_indexer.status()
+
+@app.get("/similar/{post_id}")
+async def similar_posts(post_id: int, limit: int = Query(POST_NEIGHBORS_K, gt=0, le=POST_NEIGHBORS_K)):
+    """Related posts for a post, nearest first, from its precomputed neighbour list"""
+    if not vector_store:
+        raise HTTPException(status_code=503, detail="Vector DB not available")
+
+    post = await get_post(post_id)
+    neighbors = (await post_neighbors.get(post))[:limit]
+    async with db_pool.connection() as conn:
+        cur = await conn.execute(
+            "SELECT id, title, category, author, ai_score FROM blog_posts WHERE id = ANY(%s)",
+            ([neighbor['neighbor_id'] for neighbor in neighbors],)
+        )
+        posts = {row['id']: row for row in await cur.fetchall()}
+
+    return {
+        "post_id": post_id,
+        # A neighbour deleted since the list was computed is left out until the next sync
+        "similar": [
+            {**posts[neighbor['neighbor_id']], "distance": round(neighbor['distance'], 4)}
+            for neighbor in neighbors if neighbor['neighbor_id'] in posts
+        ]
+    }
 
 if __name__ == "__main__":
     import uvicorn
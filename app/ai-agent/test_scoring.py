@@ -0,0 +1,589 @@
+"""
+Scoring tests for the AI agent
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+
+import pytest
+from fastapi import HTTPException
+
+import main
+from main import (
+    ScoreWriter, ScoringQueueFull, ScoringScheduler,
+    estimate_tokens, pack_batches, parse_batch_scores, parse_scores
+)
+from test_vector_index import insert_post
+
+
+def make_scheduler(workers=1, interactive=10, bulk=10, batch_size=1):
+    return ScoringScheduler(workers, {"interactive": interactive, "bulk": bulk}, batch_size=batch_size)
+
+
+@pytest.fixture(autouse=True)
+def scored(monkeypatch):
+    """Record what the scheduler workers hand over instead of scoring it"""
+    calls = []
+
+    async def fake_score_post(post_id, force=False):
+        calls.append(("single", [post_id]))
+
+    async def fake_score_batch(jobs):
+        calls.append(("batch", list(jobs)))
+
+    monkeypatch.setattr(main, "score_post_task", fake_score_post)
+    monkeypatch.setattr(main, "score_batch_task", fake_score_batch)
+    return calls
+
+
+def waiting(scheduler):
+    """Snapshot of the lanes, taken before the workers get to run"""
+    return {lane: dict(queue) for lane, queue in scheduler.lanes.items()}
+
+
+def drain(scheduler):
+    """Everything the workers would take, in order, as (lane, post ids)"""
+    taken = []
+    while (batch := scheduler._next()) is not None:
+        lane, items = batch
+        taken.append((lane, [post_id for post_id, _, _ in items]))
+    return taken
+
+
+class TestScoringScheduler:
+    """Test the two-lane scoring queue"""
+
+    def test_interactive_lane_served_first(self):
+        """Test interactive posts are taken before bulk ones, bulk posts in batches"""
+        scheduler = make_scheduler(batch_size=2)
+
+        async def scenario():
+            scheduler.start()
+            await scheduler.submit([1, 2, 3], "bulk")
+            await scheduler.submit([4], "interactive")
+            await scheduler.submit([5], "interactive")
+            return drain(scheduler)
+
+        assert asyncio.run(scenario()) == [
+            ("interactive", [4]),
+            ("interactive", [5]),
+            ("bulk", [1, 2]),
+            ("bulk", [3]),
+        ]
+
+    def test_workers_take_interactive_before_bulk(self, scored):
+        """Test a worker scores an interactive post queued after bulk work first"""
+        scheduler = make_scheduler(workers=1, batch_size=2)
+
+        async def scenario():
+            scheduler.start()
+            # Both submits complete before the worker gets to run
+            await scheduler.submit([1, 2, 3], "bulk")
+            await scheduler.submit([100], "interactive")
+            while sum(len(ids) for _, ids in scored) < 4:
+                await asyncio.sleep(0.01)
+            await scheduler.stop()
+
+        asyncio.run(scenario())
+        assert scored == [("single", [100]), ("batch", [1, 2]), ("single", [3])]
+
+    def test_waiting_posts_not_queued_twice(self):
+        """Test a post already waiting is reported as already queued"""
+        scheduler = make_scheduler()
+
+        async def scenario():
+            scheduler.start()
+            first = await scheduler.submit([1, 1, 2], "bulk")
+            second = await scheduler.submit([2, 3], "bulk")
+            await scheduler.submit([4], "interactive")
+            # Waiting in the interactive lane already covers a bulk request
+            third = await scheduler.submit([4], "bulk")
+            return first, second, third, waiting(scheduler)
+
+        first, second, third, lanes = asyncio.run(scenario())
+        assert first == {"queued": [1, 2], "already_queued": []}
+        assert second == {"queued": [3], "already_queued": [2]}
+        assert third == {"queued": [], "already_queued": [4]}
+        assert list(lanes["bulk"]) == [1, 2, 3]
+        assert list(lanes["interactive"]) == [4]
+
+    def test_interactive_request_promotes_bulk_post(self):
+        """Test an interactive request moves a waiting bulk post, keeping its enqueue time"""
+        scheduler = make_scheduler()
+
+        async def scenario():
+            scheduler.start()
+            await scheduler.submit([1, 2], "bulk")
+            enqueued_at = scheduler.lanes["bulk"][1][0]
+            result = await scheduler.submit([1], "interactive", force=True)
+            return enqueued_at, result, waiting(scheduler)
+
+        enqueued_at, result, lanes = asyncio.run(scenario())
+        assert result == {"queued": [1], "already_queued": []}
+        assert list(lanes["bulk"]) == [2]
+        assert lanes["interactive"][1] == (enqueued_at, True)
+
+    def test_force_merged_into_waiting_post(self):
+        """Test a forced request for a waiting post marks it forced"""
+        scheduler = make_scheduler()
+
+        async def scenario():
+            scheduler.start()
+            await scheduler.submit([1], "bulk")
+            return await scheduler.submit([1], "bulk", force=True), waiting(scheduler)
+
+        result, lanes = asyncio.run(scenario())
+        assert result == {"queued": [], "already_queued": [1]}
+        assert lanes["bulk"][1][1] is True
+
+    def test_full_lane_rejects_whole_batch(self):
+        """Test a batch that does not fit is rejected as a whole"""
+        scheduler = make_scheduler(workers=2, bulk=3)
+
+        async def scenario():
+            scheduler.start()
+            await scheduler.submit([1, 2], "bulk")
+            with pytest.raises(ScoringQueueFull) as exc_info:
+                await scheduler.submit([2, 3, 4], "bulk")
+            return exc_info.value, waiting(scheduler)
+
+        error, lanes = asyncio.run(scenario())
+        assert error.lane == "bulk"
+        # One post over capacity, 30s average over 2 workers
+        assert error.retry_after == 15
+        assert list(lanes["bulk"]) == [1, 2]
+
+    def test_retry_after(self):
+        """Test Retry-After covers the overflow and, for bulk, the interactive lane ahead of it"""
+        scheduler = make_scheduler(workers=2)
+        scheduler.lanes["interactive"].update({10: (0, False), 11: (0, False)})
+
+        assert scheduler.retry_after("interactive", 1) == 15
+        assert scheduler.retry_after("bulk", 1) == 45
+
+        scheduler.average_duration = 0.01
+        assert scheduler.retry_after("bulk", 1) == 1
+
+    def test_batch_endpoint_rejections(self, monkeypatch):
+        """Test /score/batch answers 429 with Retry-After when full, 413 when it can never fit"""
+        monkeypatch.setattr(main, "scoring_scheduler", make_scheduler(workers=1, bulk=3))
+        monkeypatch.setattr(main, "SCORING_BULK_QUEUE_SIZE", 3)
+
+        async def scenario():
+            main.scoring_scheduler.start()
+            await main.score_batch(main.BatchScoreRequest(post_ids=[1, 2]))
+            with pytest.raises(HTTPException) as full:
+                await main.score_batch(main.BatchScoreRequest(post_ids=[3, 4]))
+            with pytest.raises(HTTPException) as too_large:
+                await main.score_batch(main.BatchScoreRequest(post_ids=[5, 6, 7, 8]))
+            return full.value, too_large.value, waiting(main.scoring_scheduler)
+
+        full, too_large, lanes = asyncio.run(scenario())
+        assert full.status_code == 429
+        assert full.headers == {"Retry-After": "30"}
+        assert too_large.status_code == 413
+        assert list(lanes["bulk"]) == [1, 2]
+
+
+SCORES = {
+    "technical_accuracy": 20,
+    "clarity": 15,
+    "completeness": 15,
+    "code_quality": 10,
+    "seo": 8,
+    "engagement": 7,
+}
+
+POST = {"id": 1, "title": "Async Python", "category": "python", "author": "ana", "content": "Event loops."}
+
+
+class TestParseScores:
+    """Test reading scores from a single-post LLM response"""
+
+    def test_json_wrapped_in_text(self):
+        """Test the JSON object is found inside surrounding prose"""
+        response = "Here is my assessment:\n" + json.dumps({**SCORES, "suggestions": ["More examples"]}) + "\nThanks"
+        assert parse_scores(response) == {**SCORES, "suggestions": ["More examples"]}
+
+    def test_escaped_underscores(self):
+        """Test markdown-escaped keys (technical\\_accuracy) are read"""
+        response = json.dumps(SCORES).replace("_", "\\_")
+        assert parse_scores(response) == SCORES
+
+    def test_no_json(self):
+        """Test a response without a JSON object is rejected"""
+        with pytest.raises(ValueError, match="No JSON"):
+            parse_scores("I cannot score this post.")
+
+    def test_malformed_json(self):
+        """Test a response with broken JSON is rejected"""
+        with pytest.raises(ValueError, match="Invalid JSON"):
+            parse_scores('{"clarity": 15, "seo": }')
+
+    def test_missing_or_non_integer_scores(self):
+        """Test every score must be present and an integer"""
+        with pytest.raises(ValueError, match="code_quality"):
+            parse_scores(json.dumps({key: value for key, value in SCORES.items() if key != "code_quality"}))
+        with pytest.raises(ValueError, match="seo"):
+            parse_scores(json.dumps({**SCORES, "seo": "high"}))
+
+
+
+def batch_response(*entries):
+    return json.dumps({"results": list(entries)})
+
+
+class TestParseBatchScores:
+    """Test reading per-post scores from a multi-post LLM response"""
+
+    def test_all_posts_scored(self):
+        """Test each entry is matched to its post, whether the id is a number or a string"""
+        response = batch_response({"post_id": 1, **SCORES}, {"post_id": "2", **SCORES, "suggestions": []})
+        assert parse_batch_scores(response, [1, 2]) == {1: SCORES, 2: {**SCORES, "suggestions": []}}
+
+    def test_missing_post_left_out(self):
+        """Test a post without an entry is left out, to be scored on its own"""
+        assert parse_batch_scores(batch_response({"post_id": 1, **SCORES}), [1, 2]) == {1: SCORES}
+
+    def test_unknown_post_ignored(self):
+        """Test entries for posts not in the batch are ignored"""
+        response = batch_response({"post_id": 1, **SCORES}, {"post_id": 99, **SCORES})
+        assert parse_batch_scores(response, [1]) == {1: SCORES}
+
+    def test_incomplete_entry_dropped(self):
+        """Test an entry with missing scores or no post id is dropped, the rest kept"""
+        incomplete = {key: value for key, value in SCORES.items() if key != "seo"}
+        response = batch_response({"post_id": 1, **incomplete}, dict(SCORES), "oops", {"post_id": 2, **SCORES})
+        assert parse_batch_scores(response, [1, 2]) == {2: SCORES}
+
+    def test_no_results_array(self):
+        """Test a response without a results array is rejected"""
+        with pytest.raises(ValueError, match="results"):
+            parse_batch_scores(json.dumps({"post_id": 1, **SCORES}), [1])
+        with pytest.raises(ValueError, match="results"):
+            parse_batch_scores(json.dumps({"results": {"1": SCORES}}), [1])
+
+    def test_malformed_json(self):
+        """Test broken JSON is rejected"""
+        with pytest.raises(ValueError, match="Invalid JSON"):
+            parse_batch_scores('{"results": [{"post_id": 1, "clarity": }]}', [1])
+        with pytest.raises(ValueError, match="No JSON"):
+            parse_batch_scores("Sorry, too many posts.", [1])
+
+
+def section(tokens):
+    """A post section estimated at `tokens` tokens"""
+    return "x" * ((tokens - 1) * 4)
+
+
+class TestPackBatches:
+    """Test grouping posts into multi-post prompts"""
+
+    overhead = estimate_tokens(main.BATCH_SCORING_PROMPT.format(posts=""))
+
+    def cost(self, tokens):
+        """Budget a section takes: its text and its share of the answer"""
+        return tokens + main.BATCH_OUTPUT_TOKENS_PER_POST
+
+    def test_estimate_tokens(self):
+        """Test the estimate is about 4 characters per token, never zero"""
+        assert estimate_tokens("") == 1
+        assert estimate_tokens("x" * 400) == 101
+        assert estimate_tokens(section(50)) == 50
+
+    def test_no_posts(self):
+        """Test nothing to pack gives no groups"""
+        assert pack_batches({}, max_posts=4, token_budget=10000) == []
+
+    def test_shortest_posts_packed_together(self):
+        """Test posts are packed shortest first"""
+        sections = {1: section(300), 2: section(10), 3: section(200), 4: section(20)}
+        assert pack_batches(sections, max_posts=4, token_budget=100000) == [[2, 4, 3, 1]]
+
+    def test_max_posts_per_group(self):
+        """Test a group holds at most max_posts posts"""
+        sections = {post_id: section(10 + post_id) for post_id in range(1, 6)}
+        assert pack_batches(sections, max_posts=2, token_budget=100000) == [[1, 2], [3, 4], [5]]
+
+    def test_token_budget(self):
+        """Test a group stops growing when the next post would pass the budget"""
+        sections = {post_id: section(100) for post_id in range(1, 6)}
+        budget = self.overhead + 2 * self.cost(100)
+        groups = pack_batches(sections, max_posts=10, token_budget=budget)
+        assert groups == [[1, 2], [3, 4], [5]]
+
+        # One token short of a second post
+        groups = pack_batches(sections, max_posts=10, token_budget=budget - 1)
+        assert groups == [[1], [2], [3], [4], [5]]
+
+    def test_post_over_budget_alone(self):
+        """Test a post too long for the budget gets a group of its own"""
+        sections = {1: section(10), 2: section(5000), 3: section(20)}
+        budget = self.overhead + self.cost(10) + self.cost(20)
+        assert pack_batches(sections, max_posts=10, token_budget=budget) == [[1, 3], [2]]
+
+    def test_every_post_packed_once(self):
+        """Test each post lands in exactly one group"""
+        sections = {post_id: section(post_id * 37 % 500 + 1) for post_id in range(1, 41)}
+        groups = pack_batches(sections, max_posts=6, token_budget=2000)
+        packed = [post_id for group in groups for post_id in group]
+        assert sorted(packed) == list(sections)
+        for group in groups:
+            assert len(group) <= 6
+            if len(group) > 1:
+                assert self.overhead + sum(self.cost(estimate_tokens(sections[post_id])) for post_id in group) <= 2000
+
+
+class TestScoreCacheKey:
+    """Test the score cache key follows everything the prompt is built from"""
+
+    def cache_key_for(self, monkeypatch, post, reference_text):
+        """The cache key analyze_with_llm looks up for a post and its similar posts"""
+        looked_up = []
+
+        async def fake_reference_posts(post):
+            return reference_text
+
+        async def fake_lookup(cache_key, force):
+            looked_up.append(cache_key)
+            return SCORES
+
+        monkeypatch.setattr(main, "LLM_ENABLED", True)
+        monkeypatch.setattr(main, "SCORE_CACHE_ENABLED", True)
+        monkeypatch.setattr(main, "reference_posts", fake_reference_posts)
+        monkeypatch.setattr(main, "lookup_score_cache", fake_lookup)
+        assert asyncio.run(main.analyze_with_llm(post)) == SCORES
+        return looked_up[0]
+
+    def test_same_prompt_same_key(self, monkeypatch):
+        """Test the same post and similar posts map to the same key"""
+        assert self.cache_key_for(monkeypatch, POST, "Post A") == self.cache_key_for(monkeypatch, dict(POST), "Post A")
+
+    def test_similar_posts_change_key(self, monkeypatch):
+        """Test new similar posts in the prompt give a new key"""
+        assert self.cache_key_for(monkeypatch, POST, "Post A") != self.cache_key_for(monkeypatch, POST, "Post A\n\nPost B")
+
+    def test_post_content_changes_key(self, monkeypatch):
+        """Test an edited post gives a new key"""
+        edited = {**POST, "content": "Event loops and tasks."}
+        assert self.cache_key_for(monkeypatch, POST, "Post A") != self.cache_key_for(monkeypatch, edited, "Post A")
+
+    def test_model_changes_key(self, monkeypatch):
+        """Test the same prompt answered by another model gets its own key"""
+        before = self.cache_key_for(monkeypatch, POST, "Post A")
+        monkeypatch.setattr(main, "MODEL_VERSION", "another-model")
+        assert self.cache_key_for(monkeypatch, POST, "Post A") != before
+
+
+class FakeLLM:
+    """Answers each prompt with the next of `answers`, recording the prompts"""
+
+    def __init__(self):
+        self.answers = []
+        self.prompts = []
+
+    async def invoke(self, prompt):
+        self.prompts.append(prompt)
+        return json.dumps(self.answers.pop(0))
+
+
+class TestScoreCache:
+    """Test score cache lookups and writes against the database"""
+
+    @pytest.fixture(autouse=True)
+    def llm(self, monkeypatch):
+        """The LLM behind analyze_with_llm"""
+        llm = FakeLLM()
+
+        async def fake_reference_posts(post):
+            return "Post A"
+
+        monkeypatch.setattr(main, "LLM_ENABLED", True)
+        monkeypatch.setattr(main, "SCORE_CACHE_ENABLED", True)
+        monkeypatch.setattr(main, "invoke_llm", llm.invoke)
+        monkeypatch.setattr(main, "reference_posts", fake_reference_posts)
+        return llm
+
+    @staticmethod
+    def lookups(result):
+        return main.SCORE_CACHE_LOOKUPS.labels(result=result)._value.get()
+
+    def analyze(self, db_pool, *forces):
+        async def scenario():
+            async with db_pool:
+                return [await main.analyze_with_llm(POST, force) for force in forces]
+
+        return asyncio.run(scenario())
+
+    def test_miss_then_hit(self, db, db_pool, llm):
+        """Test the first analysis calls the LLM and caches it, the second is answered from the cache"""
+        llm.answers = [SCORES]
+        misses, hits = self.lookups("miss"), self.lookups("hit")
+
+        assert self.analyze(db_pool, False, False) == [SCORES, SCORES]
+        assert len(llm.prompts) == 1
+        assert (self.lookups("miss"), self.lookups("hit")) == (misses + 1, hits + 1)
+        row = db.execute("SELECT cache_key, model_version, scores, hit_count FROM score_cache").fetchone()
+        assert row == {
+            "cache_key": main.score_cache_key(llm.prompts[0]),
+            "model_version": main.MODEL_VERSION,
+            "scores": SCORES,
+            "hit_count": 1
+        }
+
+    def test_force_bypasses_and_replaces_entry(self, db, db_pool, llm):
+        """Test a forced analysis skips the lookup and its result replaces the cached one"""
+        rescored = {**SCORES, "clarity": 5}
+        llm.answers = [SCORES, rescored]
+        bypasses = self.lookups("bypass")
+
+        assert self.analyze(db_pool, False, True, False) == [SCORES, rescored, rescored]
+        assert len(llm.prompts) == 2
+        assert self.lookups("bypass") == bypasses + 1
+        rows = db.execute("SELECT scores, hit_count FROM score_cache").fetchall()
+        assert rows == [{"scores": rescored, "hit_count": 1}]
+
+    def test_cache_scores_upserts(self, db, db_pool):
+        """Test writing a key again replaces its scores instead of failing on the primary key"""
+        async def scenario():
+            async with db_pool:
+                await main.cache_scores("key", SCORES)
+                await main.cache_scores("key", {**SCORES, "seo": 1})
+                return await main.cached_scores("key"), await main.cached_scores("missing")
+
+        assert asyncio.run(scenario()) == ({**SCORES, "seo": 1}, None)
+        assert db.execute("SELECT count(*) AS n FROM score_cache").fetchone()["n"] == 1
+
+
+class FakePool:
+    """Stands in for db_pool: records the post ids of each flush, optionally failing the next ones"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.flushes = []
+
+    @contextlib.asynccontextmanager
+    async def connection(self):
+        queries = []
+
+        class Cursor:
+            def __init__(self, rows):
+                self.rows = rows
+
+            async def fetchall(self):
+                return self.rows
+
+        class Connection:
+            async def execute(self, query, params=None):
+                queries.append((query, params))
+                # Every post of the flush still exists
+                return Cursor([{"id": post_id} for post_id in params[0]] if "FOR UPDATE" in query else [])
+
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database unavailable")
+        yield Connection()
+        # The last statement stamps change_seq on the posts of the flush
+        self.flushes.append(queries[-1][1][0])
+
+
+class TestScoreWriter:
+    """Test the write-behind buffer for scores"""
+
+    def run(self, monkeypatch, writer, scenario, pool=None):
+        pool = pool or FakePool()
+        monkeypatch.setattr(main, "db_pool", pool)
+
+        async def main_task():
+            writer.start()
+            try:
+                await scenario(writer, pool)
+            finally:
+                await writer.stop()
+
+        asyncio.run(main_task())
+        return pool
+
+    def test_flush_when_full(self, monkeypatch):
+        """Test the add that fills the buffer writes it in one flush"""
+        async def scenario(writer, pool):
+            await writer.add(1, SCORES, 75)
+            await writer.add(2, SCORES, 75)
+            assert pool.flushes == []
+            await writer.add(3, SCORES, 75)
+            assert pool.flushes == [[1, 2, 3]]
+            assert writer.buffer == []
+
+        self.run(monkeypatch, ScoreWriter(max_size=3, interval=60), scenario)
+
+    def test_flush_after_interval(self, monkeypatch):
+        """Test scores below max_size are written once the interval has passed"""
+        async def scenario(writer, pool):
+            await writer.add(1, SCORES, 75)
+            await writer.add(2, SCORES, 75)
+            await asyncio.sleep(0.01)
+            assert pool.flushes == []
+            await asyncio.sleep(0.2)
+            assert pool.flushes == [[1, 2]]
+
+        self.run(monkeypatch, ScoreWriter(max_size=10, interval=0.05), scenario)
+
+    def test_latest_score_per_post(self, monkeypatch):
+        """Test a post scored twice in one flush keeps both history rows and is stamped once"""
+        async def scenario(writer, pool):
+            await writer.add(1, SCORES, 60)
+            await writer.add(1, SCORES, 75)
+
+        pool = self.run(monkeypatch, ScoreWriter(max_size=2, interval=60), scenario)
+        assert pool.flushes == [[1]]
+
+    def test_failed_flush_is_logged_and_writer_continues(self, monkeypatch, caplog):
+        """Test a failed write is counted and logged, and later scores are still written"""
+        failures = main.SCORE_FLUSH_FAILURES._value.get()
+
+        async def scenario(writer, pool):
+            with caplog.at_level(logging.ERROR, logger="main"):
+                await writer.add(1, SCORES, 75)
+                await writer.add(2, SCORES, 75)
+            assert pool.flushes == []
+            assert writer.buffer == []
+            await writer.add(3, SCORES, 75)
+            await writer.add(4, SCORES, 75)
+
+        pool = self.run(monkeypatch, ScoreWriter(max_size=2, interval=60), scenario, FakePool(failures=1))
+        assert pool.flushes == [[3, 4]]
+        assert main.SCORE_FLUSH_FAILURES._value.get() == failures + 1
+        assert "Failed to store scores for posts [1, 2]" in caplog.text
+
+    def test_stop_drains_buffer(self, monkeypatch):
+        """Test scores still waiting on shutdown are written"""
+        async def scenario(writer, pool):
+            await writer.add(1, SCORES, 75)
+            await writer.add(2, SCORES, 75)
+
+        pool = self.run(monkeypatch, ScoreWriter(max_size=10, interval=60), scenario)
+        assert pool.flushes == [[1, 2]]
+
+    def test_deleted_post_is_skipped(self, db, db_pool):
+        """Test a post deleted while its score waits in the buffer does not lose the other scores"""
+        kept = [insert_post(db, f"Post {n}", "content") for n in range(3)]
+        deleted = insert_post(db, "Deleted", "content")
+        change_seq = db.execute("SELECT max(change_seq) AS seq FROM blog_posts").fetchone()["seq"]
+
+        async def scenario():
+            async with db_pool:
+                writer = ScoreWriter(max_size=10, interval=60)
+                writer.start()
+                for post_id in [kept[0], deleted, *kept[1:]]:
+                    await writer.add(post_id, SCORES, 75)
+                db.execute("DELETE FROM blog_posts WHERE id = %s", (deleted,))
+                await writer.stop()
+
+        asyncio.run(scenario())
+        analysed = db.execute("SELECT post_id FROM post_analysis ORDER BY post_id").fetchall()
+        assert [row["post_id"] for row in analysed] == kept
+        posts = db.execute("SELECT ai_score, change_seq FROM blog_posts ORDER BY id").fetchall()
+        assert [row["ai_score"] for row in posts] == [75, 75, 75]
+        assert all(row["change_seq"] > change_seq for row in posts)
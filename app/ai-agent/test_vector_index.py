@@ -0,0 +1,637 @@
+"""
+Vector index tests for the AI agent
+"""
+
+import asyncio
+import collections
+import contextlib
+import threading
+import time
+
+import httpx
+import psycopg
+import pytest
+from langchain_core.embeddings import Embeddings
+
+import main
+from main import CachedEmbeddings, PgVectorStore, PostNeighbors, VectorIndexer, content_hash
+
+
+def insert_post(conn, title, content, category="python", ai_score=None):
+    """Insert a post stamped with the next change_seq and return its id"""
+    return conn.execute(
+        """
+        INSERT INTO blog_posts (title, content, category, author, ai_score, created_at, updated_at, change_seq)
+        VALUES (%s, %s, %s, 'tester', %s, now(), now(), nextval('blog_posts_change_seq'))
+        RETURNING id
+        """,
+        (title, content, category, ai_score)
+    ).fetchone()["id"]
+
+
+def edit_post(conn, post_id, content):
+    """Change a post's content the way the writers do: change_seq last, under the lock"""
+    conn.execute("UPDATE blog_post_contents SET content = %s WHERE post_id = %s", (content, post_id))
+    conn.execute("SELECT pg_advisory_xact_lock(%s)", (main.CHANGE_SEQ_LOCK_ID,))
+    conn.execute("UPDATE blog_posts SET change_seq = nextval('blog_posts_change_seq') WHERE id = %s", (post_id,))
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic vectors from the text, counting the texts embedded"""
+
+    def __init__(self, dimensions=8):
+        self.dimensions = dimensions
+        self.embedded = []
+        self.queries = []
+
+    def vector(self, text):
+        return [float((len(text) + i) % 7 + 1) for i in range(self.dimensions)]
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [self.vector(text) for text in texts]
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return self.vector(text)
+
+
+class TestCachedEmbeddings:
+    """Test the on-disk embedding cache"""
+
+    def cache(self, tmp_path, base=None, model="model-a", max_bytes=64 * 1024 * 1024):
+        return CachedEmbeddings(base or FakeEmbeddings(), model, str(tmp_path / "cache" / "embeddings.sqlite3"), max_bytes)
+
+    def lookups(self, result):
+        return main.EMBEDDING_CACHE_LOOKUPS.labels(result=result)._value.get()
+
+    def test_miss_then_hit(self, tmp_path):
+        """Test vectors are computed once and then read from the cache"""
+        base = FakeEmbeddings()
+        cache = self.cache(tmp_path, base)
+        hits, misses = self.lookups("hit"), self.lookups("miss")
+
+        first = cache.embed_documents(["alpha", "beta"])
+        second = cache.embed_documents(["beta", "alpha", "gamma"])
+
+        assert first == [base.vector("alpha"), base.vector("beta")]
+        assert second == [base.vector("beta"), base.vector("alpha"), base.vector("gamma")]
+        assert base.embedded == ["alpha", "beta", "gamma"]
+        assert self.lookups("hit") - hits == 2
+        assert self.lookups("miss") - misses == 3
+
+    def test_duplicates_embedded_once(self, tmp_path):
+        """Test a text repeated in one batch is embedded once"""
+        base = FakeEmbeddings()
+        assert self.cache(tmp_path, base).embed_documents(["alpha", "alpha"]) == [base.vector("alpha")] * 2
+        assert base.embedded == ["alpha"]
+
+    def test_whitespace_and_unicode_normalized(self, tmp_path):
+        """Test texts differing only in whitespace or Unicode composition share a vector"""
+        base = FakeEmbeddings()
+        cache = self.cache(tmp_path, base)
+        cache.embed_documents(["Hello  world\n", "caf\u00e9"])
+        cache.embed_documents([" Hello world", "cafe\u0301", "Hello, world"])
+        assert base.embedded == ["Hello  world\n", "caf\u00e9", "Hello, world"]
+
+    def test_models_kept_apart(self, tmp_path):
+        """Test the same text embedded by another model is a miss"""
+        base_a, base_b = FakeEmbeddings(), FakeEmbeddings()
+        self.cache(tmp_path, base_a, model="model-a").embed_documents(["alpha"])
+        self.cache(tmp_path, base_b, model="model-b").embed_documents(["alpha"])
+        self.cache(tmp_path, base_a, model="model-a").embed_documents(["alpha"])
+        assert base_a.embedded == ["alpha"]
+        assert base_b.embedded == ["alpha"]
+
+    def test_queries_and_documents_kept_apart(self, tmp_path):
+        """Test a query is not answered with a document vector of the same text"""
+        base = FakeEmbeddings()
+        cache = self.cache(tmp_path, base)
+        cache.embed_documents(["alpha"])
+        assert cache.embed_query("alpha") == base.vector("alpha")
+        assert cache.embed_query(" alpha ") == base.vector("alpha")
+        assert base.queries == ["alpha"]
+
+    def test_kept_across_restarts(self, tmp_path):
+        """Test a new process reads the vectors stored by the previous one"""
+        self.cache(tmp_path).embed_documents(["alpha"])
+        base = FakeEmbeddings()
+        assert self.cache(tmp_path, base).embed_documents(["alpha"]) == [base.vector("alpha")]
+        assert base.embedded == []
+
+    def test_least_recently_used_evicted(self, tmp_path):
+        """Test the cache stays under its size by dropping the vectors unused the longest"""
+        base = FakeEmbeddings(dimensions=256)
+        cache = self.cache(tmp_path, base, max_bytes=64 * 1024)
+        cache.embed_documents(["first"])
+        for n in range(100):
+            cache.embed_documents([f"text {n}"])
+            cache.embed_documents(["first"])  # kept in use
+
+        assert cache._live_bytes() <= 64 * 1024
+        base.embedded.clear()
+        cache.embed_documents(["first", "text 99", "text 0"])
+        assert base.embedded == ["text 0"]
+
+
+class MemoryStore:
+    """Vector store kept in a dict, with the interface of ChromaStore and PgVectorStore"""
+
+    name = "memory"
+    metadata_fields = ('title', 'category', 'score')
+
+    def __init__(self):
+        self.rows = {}  # chunk id -> (vector, metadata, text)
+        self.state = {"watermark": 0, "completed": False}
+
+    @contextlib.asynccontextmanager
+    async def exclusive(self):
+        yield True
+
+    async def load_state(self):
+        return dict(self.state)
+
+    async def save_state(self, watermark, completed):
+        self.state = {"watermark": watermark, "completed": completed}
+
+    async def chunks(self, post_ids):
+        chunks_by_post = collections.defaultdict(list)
+        for chunk_id, (_, metadata, _) in self.rows.items():
+            if metadata['post_id'] in post_ids:
+                chunks_by_post[metadata['post_id']].append((chunk_id, metadata))
+        return chunks_by_post
+
+    async def update_metadata(self, chunk_ids, metadatas):
+        for chunk_id, metadata in zip(chunk_ids, metadatas):
+            vector, _, text = self.rows[chunk_id]
+            self.rows[chunk_id] = (vector, metadata, text)
+
+    async def delete_posts(self, post_ids):
+        self.rows = {key: row for key, row in self.rows.items() if row[1]['post_id'] not in post_ids}
+
+    async def clear(self):
+        self.rows = {}
+
+    async def upsert(self, chunk_ids, vectors, metadatas, texts):
+        self.rows.update(zip(chunk_ids, zip(vectors, metadatas, texts)))
+
+    async def persist(self):
+        pass
+
+    def content_hashes(self):
+        return {metadata['post_id']: metadata['content_hash'] for _, metadata, _ in self.rows.values()}
+
+
+class FakeNeighbors:
+    async def refresh(self, content_changed, other_changed, deleted, full=False):
+        pass
+
+
+@pytest.fixture
+def indexer(monkeypatch):
+    monkeypatch.setattr(main, "embeddings", FakeEmbeddings())
+    monkeypatch.setattr(main, "post_neighbors", FakeNeighbors())
+    return VectorIndexer(MemoryStore(), interval=0, page_size=2, batch_size=4, concurrency=2)
+
+
+class TestVectorIndexSync:
+    """Test the change_seq watermark of the vector index sync"""
+
+    def test_sync_embeds_changed_posts_only(self, db, db_pool, indexer):
+        """Test a sync picks up new and edited posts past the watermark, and nothing else"""
+        first = insert_post(db, "First", "Alpha")
+        second = insert_post(db, "Second", "Beta")
+
+        async def scenario():
+            async with db_pool:
+                indexer.start()
+                initial = await indexer.sync()
+                with psycopg.connect(db_pool.conninfo) as conn:
+                    edit_post(conn, second, "Beta, edited")
+                return initial, await indexer.sync()
+
+        initial, edited = asyncio.run(scenario())
+        assert initial["posts_embedded"] == 2
+        assert edited["posts_embedded"] == 1
+        assert edited["watermark"] > initial["watermark"]
+        assert indexer.store.content_hashes() == {first: content_hash("Alpha"), second: content_hash("Beta, edited")}
+
+    def test_watermark_never_passes_a_change_still_committing(self, db, db_pool, indexer):
+        """Test a change committed after a later one is still synced"""
+        first = insert_post(db, "First", "Alpha")
+        second = insert_post(db, "Second", "Beta")
+
+        def later_writer():
+            with psycopg.connect(db_pool.conninfo) as conn:
+                edit_post(conn, second, "Beta, edited")
+
+        async def scenario():
+            async with db_pool:
+                indexer.start()
+                await indexer.sync()
+                writer = threading.Thread(target=later_writer)
+                with psycopg.connect(db_pool.conninfo) as slow:
+                    # Takes its change_seq first and commits last
+                    edit_post(slow, first, "Alpha, edited")
+                    writer.start()
+                    time.sleep(0.2)
+                    during = await indexer.sync()
+                await asyncio.to_thread(writer.join)
+                return during, await indexer.sync()
+
+        during, after = asyncio.run(scenario())
+        assert during["posts_embedded"] == 0
+        assert after["posts_embedded"] == 2
+        assert indexer.store.content_hashes() == {
+            first: content_hash("Alpha, edited"),
+            second: content_hash("Beta, edited")
+        }
+
+
+class FailingEmbeddings(FakeEmbeddings):
+    def embed_documents(self, texts):
+        raise RuntimeError("embeddings API unavailable")
+
+
+class TestReindexEndpoint:
+    """Test POST /reindex runs the sync in the background"""
+
+    @pytest.fixture(autouse=True)
+    def use_indexer(self, monkeypatch, indexer):
+        monkeypatch.setattr(main, "vector_store", indexer.store)
+        monkeypatch.setattr(main, "vector_indexer", indexer)
+
+    async def wait_for_sync(self, indexer):
+        while indexer.running:
+            await asyncio.sleep(0.01)
+
+    def run(self, db_pool, indexer, scenario):
+        async def main_task():
+            async with db_pool, httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=main.app), base_url="http://agent"
+            ) as client:
+                indexer.start()
+                try:
+                    return await scenario(client)
+                finally:
+                    await indexer.stop()
+
+        return asyncio.run(main_task())
+
+    def test_reindex_runs_in_background(self, db, db_pool, indexer):
+        """Test the request returns 202 while the sync runs, and a second one gets 409"""
+        for n in range(5):
+            insert_post(db, f"Post {n}", f"Content {n}")
+
+        async def scenario(client):
+            started = await client.post("/reindex", params={"mode": "full"})
+            running = indexer.running
+            again = await client.post("/reindex", params={"mode": "incremental"})
+            await self.wait_for_sync(indexer)
+            progress = await client.get("/reindex/progress")
+            later = await client.post("/reindex", params={"mode": "incremental"})
+            await self.wait_for_sync(indexer)
+            return started, running, again, progress, later
+
+        started, running, again, progress, later = self.run(db_pool, indexer, scenario)
+        assert started.status_code == 202
+        assert started.json()["mode"] == "full"
+        assert running
+        assert again.status_code == 409
+        assert progress.json()["running"] is False
+        assert progress.json()["completed"] is True
+        assert progress.json()["posts_done"] == 5
+        assert progress.json()["error"] is None
+        assert later.status_code == 202
+        assert len(indexer.store.content_hashes()) == 5
+
+    def test_sync_on_another_replica(self, db, db_pool, indexer, monkeypatch):
+        """Test 409 when another replica holds the shared store"""
+        @contextlib.asynccontextmanager
+        async def held_elsewhere():
+            yield False
+
+        monkeypatch.setattr(indexer.store, "exclusive", held_elsewhere)
+
+        async def scenario(client):
+            return await client.post("/reindex", params={"mode": "incremental"})
+
+        assert self.run(db_pool, indexer, scenario).status_code == 409
+        assert not indexer.running
+
+    def test_failed_sync_reported_in_progress(self, db, db_pool, indexer, monkeypatch):
+        """Test a sync failing after it started shows its error in the progress"""
+        insert_post(db, "Post", "Content")
+        monkeypatch.setattr(main, "embeddings", FailingEmbeddings())
+
+        async def scenario(client):
+            started = await client.post("/reindex", params={"mode": "incremental"})
+            await self.wait_for_sync(indexer)
+            return started, await client.get("/reindex/progress")
+
+        started, progress = self.run(db_pool, indexer, scenario)
+        assert started.status_code == 202
+        assert progress.json()["running"] is False
+        assert progress.json()["completed"] is False
+        assert progress.json()["error"] == "embeddings API unavailable"
+
+
+DIMENSIONS = 1536  # post_embeddings.embedding, migration 0010
+
+
+def vector(*leading):
+    """A 1536-dimension vector starting with the given values"""
+    return [*leading, *[0.0] * (DIMENSIONS - len(leading))]
+
+
+@pytest.fixture
+def pg_store(db):
+    if not db.execute("SELECT to_regclass('post_embeddings') AS oid").fetchone()["oid"]:
+        pytest.skip("pgvector is not installed on the test database")
+    return PgVectorStore("test-model", ef_search=100)
+
+
+class TestPgVectorStore:
+    """Test the pgvector store and the filters it applies inside the search"""
+
+    def posts(self, db):
+        """Four posts at increasing cosine distance from vector(1.0): 0, ~0.11, ~0.29 and 1"""
+        posts = {
+            "same": (insert_post(db, "Same", "A", category="python", ai_score=40), vector(1.0)),
+            "near": (insert_post(db, "Near", "B", category="devops", ai_score=90), vector(1.0, 0.5)),
+            "mid": (insert_post(db, "Mid", "C", category="python", ai_score=80), vector(1.0, 1.0)),
+            "far": (insert_post(db, "Far", "D", category="python", ai_score=None), vector(0.0, 1.0)),
+        }
+        return {name: post_id for name, (post_id, _) in posts.items()}, posts
+
+    def search(self, db_pool, store, db, rescored=None, **filters):
+        """Names and texts the search returns; `rescored` scores are set after the chunks are written"""
+        ids, posts = self.posts(db)
+        names = {post_id: name for name, post_id in ids.items()}
+
+        async def scenario():
+            async with db_pool:
+                await store.upsert(
+                    [f"{post_id}-0" for post_id, _ in posts.values()],
+                    [post_vector for _, post_vector in posts.values()],
+                    [
+                        {"post_id": post_id, "chunk": 0, "chunk_count": 1, "content_hash": "hash"}
+                        for post_id, _ in posts.values()
+                    ],
+                    [f"text of {name}" for name in posts]
+                )
+                for name, score in (rescored or {}).items():
+                    db.execute("UPDATE blog_posts SET ai_score = %s WHERE id = %s", (score, ids[name]))
+                if "exclude_post_id" in filters:
+                    filters["exclude_post_id"] = ids[filters["exclude_post_id"]]
+                return await store.search(vector(1.0), **filters)
+
+        return [(names[row["post_id"]], row["content"]) for row in asyncio.run(scenario())]
+
+    def test_nearest_first(self, db, db_pool, pg_store):
+        """Test chunks come back by cosine distance, limited to k"""
+        assert self.search(db_pool, pg_store, db, k=3) == [
+            ("same", "text of same"), ("near", "text of near"), ("mid", "text of mid")
+        ]
+
+    def test_exclude_post(self, db, db_pool, pg_store):
+        """Test the scored post itself is left out"""
+        assert [name for name, _ in self.search(db_pool, pg_store, db, k=2, exclude_post_id="same")] == ["near", "mid"]
+
+    def test_min_score(self, db, db_pool, pg_store):
+        """Test posts below the score, or not scored yet, are left out before the top k is taken"""
+        assert [name for name, _ in self.search(db_pool, pg_store, db, k=4, min_score=80)] == ["near", "mid"]
+
+    def test_category(self, db, db_pool, pg_store):
+        """Test only posts in the category are returned"""
+        assert [name for name, _ in self.search(db_pool, pg_store, db, k=4, category="devops")] == ["near"]
+
+    def test_filters_combined(self, db, db_pool, pg_store):
+        """Test every filter applies, and k counts only posts that pass them"""
+        found = self.search(db_pool, pg_store, db, k=1, exclude_post_id="same", min_score=50, category="python")
+        assert [name for name, _ in found] == ["mid"]
+
+    def test_score_read_at_query_time(self, db, db_pool, pg_store):
+        """Test the score filter sees a post scored after its chunks were written"""
+        found = self.search(db_pool, pg_store, db, rescored={"far": 95, "near": 60}, k=4, min_score=85)
+        assert [name for name, _ in found] == ["far"]
+
+    def test_check_dimensions(self, db, db_pool, pg_store):
+        """Test startup accepts an embeddings model of the column's size and rejects any other"""
+        async def scenario():
+            async with db_pool:
+                await pg_store.check_dimensions(FakeEmbeddings(dimensions=DIMENSIONS))
+                with pytest.raises(RuntimeError, match="holds 1536 dimensions but test-model returns 768"):
+                    await pg_store.check_dimensions(FakeEmbeddings(dimensions=768))
+
+        asyncio.run(scenario())
+
+    def test_sync_into_pgvector(self, db, db_pool, pg_store, monkeypatch):
+        """Test a sync writes chunks the search finds, and drops the chunks of a deleted post"""
+        monkeypatch.setattr(main, "embeddings", FakeEmbeddings(dimensions=DIMENSIONS))
+        monkeypatch.setattr(main, "post_neighbors", FakeNeighbors())
+        kept = insert_post(db, "Kept", "Some content")
+        deleted = insert_post(db, "Deleted", "Other content")
+        indexer = VectorIndexer(pg_store, interval=0, page_size=10, batch_size=4, concurrency=1)
+
+        async def scenario():
+            async with db_pool:
+                indexer.start()
+                await indexer.sync()
+                db.execute("DELETE FROM blog_posts WHERE id = %s", (deleted,))
+                db.execute(
+                    "INSERT INTO post_tombstones (post_id, change_seq, deleted_at) "
+                    "VALUES (%s, nextval('blog_posts_change_seq'), now())",
+                    (deleted,)
+                )
+                await indexer.sync()
+                return await pg_store.search(vector(1.0), k=5), await pg_store.load_state()
+
+        found, state = asyncio.run(scenario())
+        assert [row["post_id"] for row in found] == [kept]
+        assert state["completed"] is True
+
+
+def neighbor(post_id, distance):
+    return {"neighbor_id": post_id, "distance": distance, "snippet": f"snippet of {post_id}"}
+
+
+class TestPostNeighbors:
+    """Test the precomputed similar-post lists"""
+
+    @pytest.fixture
+    def neighbors(self, db, db_pool, monkeypatch):
+        """PostNeighbors (k=2) with the vector search replaced by `self.nearest`: post id -> neighbours"""
+        self.nearest = {}
+        self.searched = []
+
+        async def fake_find_similar_posts(post, k):
+            self.searched.append(post['id'])
+            return self.nearest.get(post['id'], [])[:k]
+
+        async def fake_nearest_posts(query, k, **filters):
+            return []
+
+        monkeypatch.setattr(main, "vector_store", MemoryStore())
+        monkeypatch.setattr(main, "embeddings", FakeEmbeddings())
+        monkeypatch.setattr(main, "find_similar_posts", fake_find_similar_posts)
+        monkeypatch.setattr(main, "nearest_posts", fake_nearest_posts)
+        return PostNeighbors(k=2, page_size=2)
+
+    def run(self, db_pool, scenario):
+        async def main_task():
+            async with db_pool:
+                return await scenario()
+
+        return asyncio.run(main_task())
+
+    def post(self, db, post_id):
+        return db.execute(
+            "SELECT bp.id, bp.title, bp.category, c.content, bp.author, bp.ai_score "
+            "FROM blog_posts bp JOIN blog_post_contents c ON c.post_id = bp.id WHERE bp.id = %s",
+            (post_id,)
+        ).fetchone()
+
+    def stored(self, db, post_id):
+        """(neighbour ids, k-th distance) saved for a post, or None"""
+        row = db.execute("SELECT kth_distance FROM post_neighbor_lists WHERE post_id = %s", (post_id,)).fetchone()
+        if row is None:
+            return None
+        ids = db.execute("SELECT neighbor_id FROM post_neighbors WHERE post_id = %s ORDER BY rank", (post_id,))
+        return [neighbor_row["neighbor_id"] for neighbor_row in ids], row["kth_distance"]
+
+    def test_computed_once_then_read(self, db, db_pool, neighbors):
+        """Test the first lookup searches and stores the list, the next one reads it"""
+        a, b, c = (insert_post(db, f"Post {n}", f"Content {n}") for n in range(3))
+        self.nearest = {a: [neighbor(b, 0.25), neighbor(c, 0.5)]}
+
+        async def scenario():
+            first = await neighbors.get(self.post(db, a))
+            second = await neighbors.get(self.post(db, a))
+            return first, second
+
+        first, second = self.run(db_pool, scenario)
+        assert first == second == [neighbor(b, 0.25), neighbor(c, 0.5)]
+        assert self.searched == [a]
+        assert self.stored(db, a) == ([b, c], 0.5)
+
+    def test_short_list_has_no_kth_distance(self, db, db_pool, neighbors):
+        """Test a list shorter than k stores no k-th distance, and an empty list is still a hit"""
+        a, b = insert_post(db, "A", "Alpha"), insert_post(db, "B", "Beta")
+        self.nearest = {a: [neighbor(b, 0.25)]}
+
+        async def scenario():
+            await neighbors.get(self.post(db, a))
+            await neighbors.get(self.post(db, b))
+            return await neighbors.get(self.post(db, b))
+
+        assert self.run(db_pool, scenario) == []
+        assert self.stored(db, a) == ([b], None)
+        assert self.stored(db, b) == ([], None)
+        assert self.searched == [a, b]
+
+    def test_recomputed_when_content_changes_or_stale(self, db, db_pool, neighbors):
+        """Test an edited post or a stale list is searched again"""
+        a, b = insert_post(db, "A", "Alpha"), insert_post(db, "B", "Beta")
+        self.nearest = {a: [neighbor(b, 0.25)]}
+
+        async def scenario():
+            await neighbors.get(self.post(db, a))
+            db.execute("UPDATE blog_post_contents SET content = 'Alpha, edited' WHERE post_id = %s", (a,))
+            await neighbors.get(self.post(db, a))
+            db.execute("UPDATE post_neighbor_lists SET stale = true WHERE post_id = %s", (a,))
+            await neighbors.get(self.post(db, a))
+            await neighbors.get(self.post(db, a))
+
+        self.run(db_pool, scenario)
+        assert self.searched == [a, a, a]
+
+    def test_search_failure_raised(self, db, db_pool, neighbors, monkeypatch):
+        """Test a failing search is raised instead of scoring without reference posts"""
+        a = insert_post(db, "A", "Alpha")
+
+        async def failing_search(post, k):
+            raise RuntimeError("embeddings API unavailable")
+
+        monkeypatch.setattr(main, "find_similar_posts", failing_search)
+        with pytest.raises(RuntimeError, match="embeddings API unavailable"):
+            self.run(db_pool, lambda: neighbors.get(self.post(db, a)))
+
+    def test_tables_not_created_yet(self, db, db_pool, neighbors):
+        """Test lookups return no neighbours while migration 0011 is not applied"""
+        a = insert_post(db, "A", "Alpha")
+        db.execute("ALTER TABLE post_neighbors RENAME TO post_neighbors_moved")
+        try:
+            assert self.run(db_pool, lambda: neighbors.get(self.post(db, a))) == []
+        finally:
+            db.execute("ALTER TABLE post_neighbors_moved RENAME TO post_neighbors")
+
+    def test_refresh_after_content_change(self, db, db_pool, neighbors):
+        """Test a sync recomputes the changed post's list and the lists showing it"""
+        a, b, c, d = (insert_post(db, f"Post {n}", f"Content {n}") for n in range(4))
+        self.nearest = {a: [neighbor(b, 0.1), neighbor(c, 0.2)], c: [neighbor(a, 0.2), neighbor(d, 0.3)],
+                        d: [neighbor(c, 0.3), neighbor(a, 0.4)]}
+
+        async def scenario():
+            for post_id in (a, c, d):
+                await neighbors.get(self.post(db, post_id))
+            self.searched.clear()
+            self.nearest[a] = [neighbor(c, 0.2), neighbor(d, 0.25)]
+            await neighbors.refresh([b], [], [], full=False)
+
+        self.run(db_pool, scenario)
+        # a showed b; c and d did not, so their lists are kept
+        assert self.searched == [a]
+        assert self.stored(db, a) == ([c, d], 0.25)
+
+    def test_refresh_when_a_changed_post_comes_closer(self, db, db_pool, neighbors, monkeypatch):
+        """Test lists whose k-th neighbour is farther than a changed post are recomputed"""
+        a, b, c, d = (insert_post(db, f"Post {n}", f"Content {n}") for n in range(4))
+        self.nearest = {a: [neighbor(c, 0.2), neighbor(d, 0.6)], c: [neighbor(a, 0.2), neighbor(d, 0.3)]}
+
+        async def nearest_to_b(query, k, **filters):
+            return [neighbor(a, 0.3), neighbor(c, 0.35)]
+
+        monkeypatch.setattr(main, "nearest_posts", nearest_to_b)
+
+        async def scenario():
+            for post_id in (a, c):
+                await neighbors.get(self.post(db, post_id))
+            self.searched.clear()
+            await neighbors.refresh([b], [], [], full=False)
+
+        self.run(db_pool, scenario)
+        # b (0.3) is closer to a than a's 2nd neighbour (0.6), not closer to c than 0.3;
+        # b has no list yet, it is computed on its first lookup
+        assert self.searched == [a]
+
+    def test_refresh_after_delete(self, db, db_pool, neighbors):
+        """Test lists showing a deleted post are recomputed"""
+        a, b, c = (insert_post(db, f"Post {n}", f"Content {n}") for n in range(3))
+        self.nearest = {a: [neighbor(b, 0.1)], c: [neighbor(a, 0.1)]}
+
+        async def scenario():
+            for post_id in (a, c):
+                await neighbors.get(self.post(db, post_id))
+            self.searched.clear()
+            db.execute("DELETE FROM blog_posts WHERE id = %s", (b,))
+            self.nearest[a] = [neighbor(c, 0.1)]
+            await neighbors.refresh([], [], [b], full=False)
+
+        self.run(db_pool, scenario)
+        assert self.searched == [a]
+        assert self.stored(db, a) == ([c], None)
+
+    def test_full_refresh_recomputes_every_list(self, db, db_pool, neighbors):
+        """Test a full reindex recomputes all stored lists, a page at a time"""
+        ids = [insert_post(db, f"Post {n}", f"Content {n}") for n in range(5)]
+
+        async def scenario():
+            for post_id in ids:
+                await neighbors.get(self.post(db, post_id))
+            self.searched.clear()
+            await neighbors.refresh([], [], [], full=True)
+
+        self.run(db_pool, scenario)
+        assert sorted(self.searched) == ids
+        assert db.execute("SELECT count(*) AS stale FROM post_neighbor_lists WHERE stale").fetchone()["stale"] == 0
@@ -0,0 +1,52 @@
+"""
+Render HTML, excerpts and reading times for posts written before pre-rendering
+Usage: DATABASE_URL=... python backfill_rendered.py [batch_size]
+"""
+
+import sys
+
+from main import SessionLocal, BlogPost, BlogPostContent, render_post_content, logger
+
+
+def backfill(batch_size: int = 200) -> int:
+    """Render posts without content_html in id order, committing per batch"""
+    rendered_total = 0
+    last_id = 0
+
+    while True:
+        db = SessionLocal()
+        try:
+            batch = (
+                db.query(BlogPost)
+                .join(BlogPost.body)
+                .filter(BlogPost.id > last_id, BlogPostContent.content_html.is_(None))
+                .order_by(BlogPost.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not batch:
+                return rendered_total
+
+            for post in batch:
+                rendered = render_post_content(post.content)
+                # Not an edit: keep updated_at (and with it the post's ETag) unchanged
+                db.query(BlogPost).filter(BlogPost.id == post.id).update({
+                    "excerpt": rendered["excerpt"],
+                    "reading_time_minutes": rendered["reading_time_minutes"],
+                    "updated_at": BlogPost.updated_at
+                }, synchronize_session=False)
+                db.query(BlogPostContent).filter(BlogPostContent.post_id == post.id).update(
+                    {"content_html": rendered["content_html"]}, synchronize_session=False
+                )
+            db.commit()
+
+            last_id = batch[-1].id
+            rendered_total += len(batch)
+            logger.info(f"Rendered {rendered_total} posts (up to id {last_id})")
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    total = backfill(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
+    logger.info(f"Backfill complete, {total} posts rendered")
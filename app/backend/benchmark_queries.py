@@ -0,0 +1,241 @@
+"""
+Time backend and AI agent query shapes at growing data sizes (PostgreSQL)
+Usage: DATABASE_URL=... python benchmark_queries.py [--sizes 10000,100000,1000000] [--runs 30] [--reset]
+
+For each size the database is grown with seed_data (appending, so sizes must
+increase), ANALYZEd, and every query shape below is run with random
+parameters. The report lists p50/p95 latency and buffer reads per size, and
+the scaling exponent between consecutive sizes: ~0 means the cost does not
+grow with the data, ~1 means it grows linearly. Point it at a scratch database.
+"""
+
+import argparse
+import json
+import math
+import random
+import statistics
+import time
+from datetime import datetime
+
+from main import engine, logger
+from seed_data import reset, seed_posts
+
+# Exponent above which a query's cost is reported as growing with the data
+BEND_EXPONENT = 0.3
+
+SUMMARY_COLUMNS = (
+    "bp.id, bp.title, bp.category, bp.author, bp.tags, bp.created_at, bp.updated_at, "
+    "bp.ai_score, bp.last_scored_at, bp.excerpt, bp.reading_time_minutes"
+)
+
+# name -> (SQL, parameter factory). Mirrors the statements issued by the endpoints
+# named in the comments; keep them in sync when those queries change.
+QUERY_SHAPES = {
+    # backend GET /api/posts
+    "posts_first_page": (
+        f"SELECT {SUMMARY_COLUMNS} FROM blog_posts bp ORDER BY bp.created_at DESC LIMIT 10",
+        lambda ctx: ()
+    ),
+    "posts_deep_page": (
+        f"SELECT {SUMMARY_COLUMNS} FROM blog_posts bp ORDER BY bp.created_at DESC LIMIT 10 OFFSET %s",
+        lambda ctx: (random.randrange(0, max(ctx["posts"] - 10, 1)),)
+    ),
+    "posts_category_page": (
+        f"SELECT {SUMMARY_COLUMNS} FROM blog_posts bp WHERE bp.category = %s "
+        "ORDER BY bp.created_at DESC LIMIT 10",
+        lambda ctx: (random.choice(ctx["categories"]),)
+    ),
+    "posts_score_page": (
+        f"SELECT {SUMMARY_COLUMNS} FROM blog_posts bp WHERE bp.category = %s "
+        "ORDER BY bp.ai_score DESC NULLS LAST, bp.id DESC LIMIT 10",
+        lambda ctx: (random.choice(ctx["categories"]),)
+    ),
+    "posts_full_view_bodies": (
+        "SELECT c.post_id, c.content FROM blog_post_contents c WHERE c.post_id IN "
+        "(SELECT bp.id FROM blog_posts bp ORDER BY bp.created_at DESC LIMIT 10)",
+        lambda ctx: ()
+    ),
+    "total_count_counter": (
+        "SELECT coalesce(sum(post_count), 0) FROM post_category_counts",
+        lambda ctx: ()
+    ),
+    "total_count_exact": (
+        "SELECT count(bp.id) FROM blog_posts bp WHERE bp.category = %s",
+        lambda ctx: (random.choice(ctx["categories"]),)
+    ),
+    # backend GET /api/posts/{id}
+    "post_by_id": (
+        f"SELECT {SUMMARY_COLUMNS}, c.content FROM blog_posts bp "
+        "LEFT JOIN blog_post_contents c ON c.post_id = bp.id WHERE bp.id = %s",
+        lambda ctx: (random.randint(1, ctx["max_id"]),)
+    ),
+    # backend GET /api/posts/changes
+    "changes_since": (
+        f"SELECT {SUMMARY_COLUMNS}, bp.change_seq FROM blog_posts bp WHERE bp.change_seq > %s "
+        "ORDER BY bp.change_seq LIMIT 501",
+        lambda ctx: (ctx["max_change_seq"] - 500,)
+    ),
+    # AI agent GET /scores (latest analysis per scored post)
+    "agent_scores_lateral": (
+        """
+        SELECT bp.id, bp.title, bp.category, bp.author, bp.ai_score, bp.last_scored_at,
+               pa.technical_accuracy_score, pa.clarity_score, pa.completeness_score,
+               pa.code_quality_score, pa.seo_score, pa.engagement_score
+        FROM blog_posts bp
+        LEFT JOIN LATERAL (
+            SELECT * FROM post_analysis
+            WHERE post_id = bp.id
+            ORDER BY analyzed_at DESC
+            LIMIT 1
+        ) pa ON true
+        WHERE bp.ai_score IS NOT NULL
+        ORDER BY bp.ai_score DESC NULLS LAST, bp.id DESC
+        LIMIT %s
+        """,
+        lambda ctx: (100,)
+    ),
+    # AI agent GET /scores/{post_id} (score history)
+    "agent_score_history": (
+        """
+        SELECT pa.*, bp.title, bp.category, bp.ai_score
+        FROM post_analysis pa
+        JOIN blog_posts bp ON pa.post_id = bp.id
+        WHERE pa.post_id = %s
+        ORDER BY pa.analyzed_at DESC
+        """,
+        lambda ctx: (random.randint(1, ctx["max_id"]),)
+    ),
+}
+
+
+def data_context(cur) -> dict:
+    """Current data size and value ranges the parameter factories draw from"""
+    cur.execute("SELECT count(*), coalesce(max(id), 0), coalesce(max(change_seq), 0) FROM blog_posts")
+    posts, max_id, max_change_seq = cur.fetchone()
+    cur.execute("SELECT count(*) FROM post_analysis")
+    analyses = cur.fetchone()[0]
+    cur.execute("SELECT category FROM post_category_counts WHERE post_count > 0")
+    categories = [row[0] for row in cur.fetchall()]
+    return {
+        "posts": posts, "analyses": analyses, "max_id": max_id,
+        "max_change_seq": max_change_seq, "categories": categories
+    }
+
+
+def plan_summary(cur, sql, params) -> dict:
+    """Top plan node and buffer usage from one EXPLAIN (ANALYZE, BUFFERS) run"""
+    cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, params)
+    plan = cur.fetchone()[0][0]["Plan"]
+    return {
+        "node": plan["Node Type"],
+        "shared_hit": plan.get("Shared Hit Blocks", 0),
+        "shared_read": plan.get("Shared Read Blocks", 0),
+    }
+
+
+def time_shapes(runs: int) -> dict:
+    """p50/p95 (ms) and plan summary per query shape at the current data size"""
+    results = {}
+    pooled = engine.raw_connection()
+    conn = pooled.driver_connection  # None once detached
+    pooled.detach()  # autocommit must not leak back into the pool
+    try:
+        conn.autocommit = True
+        cur = conn.cursor()
+        ctx = data_context(cur)
+        for name, (sql, params) in QUERY_SHAPES.items():
+            for _ in range(3):  # warm-up
+                cur.execute(sql, params(ctx))
+                cur.fetchall()
+
+            durations = []
+            for _ in range(runs):
+                started = time.perf_counter()
+                cur.execute(sql, params(ctx))
+                cur.fetchall()
+                durations.append((time.perf_counter() - started) * 1000)
+
+            durations.sort()
+            results[name] = {
+                "p50_ms": statistics.median(durations),
+                "p95_ms": durations[min(len(durations) - 1, math.ceil(0.95 * len(durations)) - 1)],
+                **plan_summary(cur, sql, params(ctx))
+            }
+    finally:
+        conn.close()
+    return {"posts": ctx["posts"], "analyses": ctx["analyses"], "shapes": results}
+
+
+def scaling_exponent(size_a, time_a, size_b, time_b) -> float:
+    """k in time ~ size^k between two measurements"""
+    if time_a <= 0 or size_a == size_b:
+        return 0.0
+    return math.log(time_b / time_a) / math.log(size_b / size_a)
+
+
+def write_report(measurements: list, path: str):
+    """Markdown scaling report (and the raw numbers next to it as JSON)"""
+    sizes = [m["posts"] for m in measurements]
+    lines = [
+        f"# Query scaling report ({datetime.utcnow():%Y-%m-%d %H:%M} UTC)",
+        "",
+        "Sizes: " + ", ".join(f"{m['posts']:,} posts / {m['analyses']:,} analyses" for m in measurements),
+        "",
+        "| Query | " + " | ".join(f"{size:,} p50 / p95 ms" for size in sizes)
+        + " | Exponent | Plan (largest) | Buffers (largest) |",
+        "|---" * (len(sizes) + 4) + "|",
+    ]
+
+    bends = []
+    for name in QUERY_SHAPES:
+        cells = [f"{m['shapes'][name]['p50_ms']:.2f} / {m['shapes'][name]['p95_ms']:.2f}" for m in measurements]
+        exponents = [
+            scaling_exponent(a["posts"], a["shapes"][name]["p50_ms"], b["posts"], b["shapes"][name]["p50_ms"])
+            for a, b in zip(measurements, measurements[1:])
+        ]
+        largest = measurements[-1]["shapes"][name]
+        lines.append(
+            f"| {name} | " + " | ".join(cells)
+            + f" | {', '.join(f'{k:.2f}' for k in exponents) or '-'}"
+            + f" | {largest['node']} | {largest['shared_hit'] + largest['shared_read']:,} |"
+        )
+        for (a, b), k in zip(zip(measurements, measurements[1:]), exponents):
+            if k > BEND_EXPONENT:
+                bends.append(f"- `{name}` grows with the data from {a['posts']:,} to {b['posts']:,} posts (k={k:.2f})")
+                break
+
+    lines += ["", "## Cost curves that bend", ""] + (bends or ["None - every query shape stays flat."])
+
+    with open(path, "w") as report:
+        report.write("\n".join(lines) + "\n")
+    with open(path.rsplit(".", 1)[0] + ".json", "w") as raw:
+        json.dump(measurements, raw, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="comma-separated post counts, increasing")
+    parser.add_argument("--analyses-per-post", type=float, default=10)
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--output", default="scaling_report.md")
+    parser.add_argument("--reset", action="store_true", help="truncate all post tables first")
+    args = parser.parse_args()
+
+    if args.reset:
+        reset()
+
+    measurements = []
+    for size in sorted(int(size) for size in args.sizes.split(",")):
+        with engine.connect() as conn:
+            current = conn.exec_driver_sql("SELECT count(*) FROM blog_posts").scalar()
+        if current < size:
+            seed_posts(size - current, args.analyses_per_post)
+        elif current > size:
+            logger.warning(f"Database already has {current} posts, skipping size {size} (use --reset)")
+            continue
+
+        logger.info(f"Timing query shapes at {size} posts")
+        measurements.append(time_shapes(args.runs))
+
+    write_report(measurements, args.output)
+    logger.info(f"Scaling report written to {args.output}")
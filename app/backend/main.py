@@ -3,26 +3,43 @@ Kubernetes Blog Platform - Backend API
 FastAPI application for managing blog posts about Kubernetes
 """
 
-from fastapi import FastAPI, HTTPException, Depends, Request, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, Request, BackgroundTasks, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, text
+from fastapi.routing import APIRoute
+from fastapi.responses import Response, StreamingResponse, PlainTextResponse
+from sqlalchemy import create_engine, Column, Integer, BigInteger, String, Text, DateTime, ForeignKey, Index, Sequence, event, text, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
-from pydantic import BaseModel
+from sqlalchemy.orm import sessionmaker, Session, relationship, joinedload, selectinload
+from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Optional, Union
 import os
 import signal
 import asyncio
 import logging
+import sys
 import json
+import hmac
+import weakref
+import threading
+import functools
+import contextvars
+import collections
+import traceback
+import math
+import html
 import httpx
+import markdown
+import nh3
 from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 import time
+from migrate import run_migrations
 
 # JSON Logging Configuration
 class JSONFormatter(logging.Formatter):
@@ -82,6 +99,35 @@ DATABASE_URL = os.getenv(
 AI_AGENT_URL = os.getenv("AI_AGENT_URL", "http://ai-agent:8000")
 AI_SCORING_ENABLED = os.getenv("AI_SCORING_ENABLED", "true").lower() == "true"
 
+# Server-Timing header on every response (otherwise only when the request sends X-Debug-Timing: 1)
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() == "true"
+
+# Debug endpoints (/debug/profile, /debug/tasks) - off by default, admin token required
+DEBUG_ENDPOINTS_ENABLED = os.getenv("DEBUG_ENDPOINTS_ENABLED", "false").lower() == "true"
+DEBUG_ADMIN_TOKEN = os.getenv("DEBUG_ADMIN_TOKEN", "")
+PROFILE_MAX_SECONDS = 60
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "10")) / 1000
+
+# Event loop lag monitor - logs the blocking stack when the loop stalls longer than the threshold
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "100")) / 1000
+LOOP_STALL_THRESHOLD = float(os.getenv("LOOP_STALL_THRESHOLD_MS", "250")) / 1000
+
+# Adaptive concurrency limit - AIMD on request latency, sheds load with 503 before the DB pool is exhausted
+CONCURRENCY_LIMIT_ENABLED = os.getenv("CONCURRENCY_LIMIT_ENABLED", "true").lower() == "true"
+CONCURRENCY_LIMIT_MIN = int(os.getenv("CONCURRENCY_LIMIT_MIN", "5"))
+CONCURRENCY_LIMIT_MAX = int(os.getenv("CONCURRENCY_LIMIT_MAX", "30"))  # pool_size + max_overflow
+CONCURRENCY_TARGET_LATENCY = float(os.getenv("CONCURRENCY_TARGET_LATENCY_MS", "250")) / 1000
+CONCURRENCY_QUEUE_SIZE = int(os.getenv("CONCURRENCY_QUEUE_SIZE", "50"))
+CONCURRENCY_QUEUE_TIMEOUT = float(os.getenv("CONCURRENCY_QUEUE_TIMEOUT_MS", "500")) / 1000
+CONCURRENCY_WRITE_RESERVE = float(os.getenv("CONCURRENCY_WRITE_RESERVE", "0.2"))  # share of the limit only writes may use
+
+# Per-client rate limits (slowapi) - disabled for load and soak tests driven from a single address
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+
+# Apply pending migrations/ on startup (PostgreSQL); disable when they run as a separate deploy step
+RUN_MIGRATIONS_ON_STARTUP = os.getenv("RUN_MIGRATIONS_ON_STARTUP", "true").lower() == "true"
+
 engine = create_engine(DATABASE_URL, pool_size=10, max_overflow=20, pool_pre_ping=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
@@ -106,8 +152,88 @@ POSTS_TOTAL = Gauge(
     'Total number of blog posts'
 )
 
+SSE_SUBSCRIBERS = Gauge(
+    'sse_subscribers',
+    'Connected server-sent event clients'
+)
+SSE_EVENTS_DROPPED = Counter(
+    'sse_events_dropped_total',
+    'Post events dropped because a client buffer was full'
+)
+
+REQUEST_PHASE_DURATION = Histogram(
+    'http_request_phase_duration_seconds',
+    'HTTP request duration by phase (db, app, parse, serialize, middleware)',
+    ['method', 'endpoint', 'phase']
+)
+
+CONCURRENCY_LIMIT = Gauge(
+    'concurrency_limit',
+    'Current adaptive concurrency limit'
+)
+CONCURRENCY_IN_FLIGHT = Gauge(
+    'concurrency_limit_in_flight',
+    'Requests currently admitted by the concurrency limiter'
+)
+CONCURRENCY_QUEUE_LENGTH = Gauge(
+    'concurrency_limit_queue_length',
+    'Requests waiting for a concurrency slot'
+)
+REQUESTS_SHED = Counter(
+    'http_requests_shed_total',
+    'Requests rejected by the concurrency limiter',
+    ['priority']
+)
+EVENT_LOOP_LAG = Histogram(
+    'event_loop_lag_seconds',
+    'Delay between when the event loop should have run a task and when it did',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+EVENT_LOOP_STALLS = Counter(
+    'event_loop_stalls_total',
+    'Event loop stalls longer than the stall threshold'
+)
+
 # Rate Limiter
-limiter = Limiter(key_func=get_remote_address)
+limiter = Limiter(key_func=get_remote_address, enabled=RATE_LIMIT_ENABLED)
+
+# Rendering of Markdown bodies, done once per write instead of once per view
+EXCERPT_LENGTH = 200
+WORDS_PER_MINUTE = 200
+MARKDOWN_EXTENSIONS = ["fenced_code", "tables", "sane_lists"]
+
+# Fields that feed the AI scoring prompt - only changes to these trigger a re-score
+SCORED_FIELDS = {"title", "content", "category", "author"}
+
+# Seconds a per-category leaderboard is served from memory (also dropped on any post event)
+TOP_POSTS_CACHE_TTL = int(os.getenv("TOP_POSTS_CACHE_TTL", "30"))
+
+# Served by /api/categories (also used by the data seeder)
+CATEGORIES = [
+    "Kubernetes Features",
+    "Security Best Practices",
+    "CI/CD Workflows",
+    "Helm and Package Management",
+    "Networking",
+    "Storage",
+    "Monitoring and Observability",
+    "GitOps"
+]
+
+# Upper bound on ids accepted by the multi-get endpoint
+MAX_BATCH_GET_IDS = int(os.getenv("MAX_BATCH_GET_IDS", "100"))
+
+# Page size cap for the delta-sync endpoint
+MAX_CHANGES_PAGE = 1000
+
+# Post change events (PostgreSQL LISTEN/NOTIFY channel shared with the AI agent)
+POST_EVENTS_CHANNEL = "post_events"
+
+# Transaction advisory lock taken before change_seq is assigned (the AI agent's score writer takes it too)
+CHANGE_SEQ_LOCK_ID = 7305563
+SSE_CLIENT_BUFFER = int(os.getenv("SSE_CLIENT_BUFFER", "100"))
+SSE_HEARTBEAT_SECONDS = 15
+SSE_DISCONNECT_CHECK_SECONDS = 1  # a closed stream releases its queue within this long
 
 # Graceful Shutdown State
 is_shutting_down = False
@@ -121,14 +247,81 @@ class BlogPost(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255), nullable=False)
-    content = Column(Text, nullable=False)
     category = Column(String(100), nullable=False)
     author = Column(String(100), nullable=False)
     tags = Column(String(255))
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     ai_score = Column(Integer, nullable=True)
     last_scored_at = Column(DateTime, nullable=True)
+    # Small derived fields shown by list views stay here; the rendered HTML lives with the body
+    excerpt = Column(String(EXCERPT_LENGTH + 10), nullable=True)
+    reading_time_minutes = Column(Integer, nullable=True)
+    # Bumped on every create/update/re-score (also by the AI agent), drives /api/posts/changes
+    change_seq = Column(BigInteger, nullable=True, index=True)
+
+    # Post body lives in blog_post_contents so list queries never read it
+    body = relationship(
+        "BlogPostContent",
+        uselist=False,
+        cascade="all, delete-orphan",
+        passive_deletes=True
+    )
+
+    @property
+    def content(self) -> Optional[str]:
+        return self.body.content if self.body is not None else None
+
+    @content.setter
+    def content(self, value: str):
+        if self.body is None:
+            self.body = BlogPostContent(content=value)
+        else:
+            self.body.content = value
+
+    def set_rendered(self, rendered: dict):
+        """Store the output of render_post_content alongside the body"""
+        self.body.content_html = rendered["content_html"]
+        self.excerpt = rendered["excerpt"]
+        self.reading_time_minutes = rendered["reading_time_minutes"]
+
+# Default listing filtered by category: WHERE category = ? ORDER BY created_at DESC
+Index("ix_blog_posts_category_created_at", BlogPost.category, BlogPost.created_at)
+
+# Score-ranked listing: ORDER BY ai_score DESC NULLS LAST, id DESC, optionally per category.
+# SQLite already sorts NULLs last in descending order and rejects NULLS LAST in index definitions.
+for _dialect, _score in (
+    ("postgresql", BlogPost.ai_score.desc().nullslast()),
+    ("sqlite", BlogPost.ai_score.desc()),
+):
+    Index("ix_blog_posts_category_score", BlogPost.category, _score, BlogPost.id.desc()).ddl_if(dialect=_dialect)
+    Index("ix_blog_posts_score", _score, BlogPost.id.desc()).ddl_if(dialect=_dialect)
+
+class BlogPostContent(Base):
+    """Cold, large per-post data kept out of the frequently scanned blog_posts table"""
+    __tablename__ = "blog_post_contents"
+
+    post_id = Column(Integer, ForeignKey("blog_posts.id", ondelete="CASCADE"), primary_key=True)
+    content = Column(Text, nullable=False)
+    content_html = Column(Text, nullable=True)  # sanitized render of content
+
+class PostTombstone(Base):
+    """Ids of deleted posts, so delta-sync clients can drop them from their copy"""
+    __tablename__ = "post_tombstones"
+
+    post_id = Column(Integer, primary_key=True)
+    change_seq = Column(BigInteger, nullable=False, index=True)
+    deleted_at = Column(DateTime, default=datetime.utcnow)
+
+# Shared by blog_posts.change_seq and post_tombstones.change_seq (PostgreSQL only)
+change_seq_sequence = Sequence("blog_posts_change_seq", metadata=Base.metadata)
+
+class PostCategoryCount(Base):
+    """Post count per category, maintained on every create/delete so list totals never need COUNT(*)"""
+    __tablename__ = "post_category_counts"
+
+    category = Column(String(100), primary_key=True)
+    post_count = Column(Integer, nullable=False, default=0)
 
 # Pydantic Models
 class BlogPostCreate(BaseModel):
@@ -138,10 +331,18 @@ class BlogPostCreate(BaseModel):
     author: str
     tags: Optional[str] = None
 
-class BlogPostResponse(BaseModel):
+class BlogPostUpdate(BaseModel):
+    """Partial update - only the fields sent by the client are applied"""
+    title: Optional[str] = None
+    content: Optional[str] = None
+    category: Optional[str] = None
+    author: Optional[str] = None
+    tags: Optional[str] = None
+
+class BlogPostSummary(BaseModel):
+    """List view of a post - everything except the body"""
     id: int
     title: str
-    content: str
     category: str
     author: str
     tags: Optional[str]
@@ -149,10 +350,119 @@ class BlogPostResponse(BaseModel):
     updated_at: datetime
     ai_score: Optional[int] = None
     last_scored_at: Optional[datetime] = None
+    excerpt: Optional[str] = None
+    reading_time_minutes: Optional[int] = None
 
     class Config:
         from_attributes = True
 
+class BlogPostResponse(BlogPostSummary):
+    content: str
+
+class BlogPostHTMLResponse(BlogPostSummary):
+    """Post with the pre-rendered, sanitized HTML body instead of the Markdown source"""
+    content_html: str
+
+class BatchGetRequest(BaseModel):
+    # Bounded on the raw list (duplicates included), so an oversized request is rejected during validation
+    ids: List[int] = Field(max_length=MAX_BATCH_GET_IDS)
+
+class BatchGetResponse(BaseModel):
+    posts: List[BlogPostResponse]
+    missing: List[int]
+
+class PostChangesResponse(BaseModel):
+    posts: List[Union[BlogPostResponse, BlogPostSummary]]
+    deleted: List[int]
+    cursor: int
+    has_more: bool
+
+# Request phase timing
+class RequestTimings:
+    """Per-request timestamps and accumulated DB time, shared through a context variable"""
+
+    def __init__(self):
+        self.db = 0.0
+        self.handler_start = None
+        self.handler_end = None
+        self.endpoint_start = None
+        self.endpoint_end = None
+
+    def phases(self, total: float) -> dict:
+        """Break the total request time into phases (seconds)"""
+        phases = {}
+        if self.handler_end is not None:
+            handler = self.handler_end - self.handler_start
+            phases["middleware"] = max(total - handler, 0.0)
+            if self.endpoint_end is not None:
+                endpoint = self.endpoint_end - self.endpoint_start
+                phases["parse"] = self.endpoint_start - self.handler_start
+                phases["app"] = max(endpoint - self.db, 0.0)
+                phases["serialize"] = self.handler_end - self.endpoint_end
+        phases["db"] = self.db
+        phases["total"] = total
+        return phases
+
+request_timings = contextvars.ContextVar("request_timings", default=None)
+
+# (request id, "METHOD /path") of the request being served, set by the logging middleware
+current_request = contextvars.ContextVar("current_request", default=None)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info["query_start"].pop()
+    timings = request_timings.get()
+    if timings is not None:
+        timings.db += time.perf_counter() - start
+
+class TimedRoute(APIRoute):
+    """APIRoute that records when the endpoint runs, separating parsing and serialization time"""
+
+    def get_route_handler(self):
+        endpoint = self.dependant.call
+
+        if asyncio.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def timed_endpoint(**kwargs):
+                timings = request_timings.get()
+                if timings is not None:
+                    timings.endpoint_start = time.perf_counter()
+                try:
+                    return await endpoint(**kwargs)
+                finally:
+                    if timings is not None:
+                        timings.endpoint_end = time.perf_counter()
+        else:
+            @functools.wraps(endpoint)
+            def timed_endpoint(**kwargs):
+                timings = request_timings.get()
+                if timings is not None:
+                    timings.endpoint_start = time.perf_counter()
+                try:
+                    return endpoint(**kwargs)
+                finally:
+                    if timings is not None:
+                        timings.endpoint_end = time.perf_counter()
+
+        self.dependant.call = timed_endpoint
+        handler = super().get_route_handler()
+
+        async def timed_handler(request: Request) -> Response:
+            timings = request_timings.get()
+            if timings is not None:
+                timings.handler_start = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                if timings is not None:
+                    timings.handler_end = time.perf_counter()
+
+        return timed_handler
+
 # FastAPI app
 app = FastAPI(
     title="K8s Blog Platform API",
@@ -160,6 +470,9 @@ app = FastAPI(
     version="1.3.0"
 )
 
+# Time endpoint execution separately from request parsing and response serialization
+app.router.route_class = TimedRoute
+
 # Rate limiter state
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
@@ -171,6 +484,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Total-Count-Accuracy"],
 )
 
 # Shutdown middleware - reject new requests during shutdown
@@ -197,6 +511,150 @@ async def shutdown_middleware(request: Request, call_next):
         async with request_lock:
             in_flight_requests -= 1
 
+# Adaptive concurrency limiting
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD concurrency limit driven by observed latency
+
+    The limit grows by 1/limit for every request that finishes under the target
+    latency and shrinks by 10% (at most once per target interval) when requests
+    are slow or fail. Requests over the limit wait briefly in a bounded queue and
+    are shed when it is full or the wait times out. Reads may only use the part
+    of the limit not reserved for writes, and queued writes are admitted first.
+    """
+
+    def __init__(
+        self,
+        min_limit: int,
+        max_limit: int,
+        target_latency: float,
+        queue_size: int,
+        queue_timeout: float,
+        write_reserve: float
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(max_limit)
+        self.target_latency = target_latency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.write_reserve = write_reserve
+        self.in_flight = 0
+        self.waiters = {"write": collections.deque(), "read": collections.deque()}
+        self._last_decrease = 0.0
+        CONCURRENCY_LIMIT.set(self.limit)
+
+    def _has_capacity(self, priority: str) -> bool:
+        if priority == "write":
+            return self.in_flight < int(self.limit)
+        return self.in_flight < max(int(self.limit * (1 - self.write_reserve)), 1)
+
+    def _queued(self) -> int:
+        return len(self.waiters["write"]) + len(self.waiters["read"])
+
+    async def acquire(self, priority: str) -> bool:
+        """Take a slot, waiting up to queue_timeout; False means the request should be shed"""
+        if self._has_capacity(priority) and not self.waiters[priority]:
+            self.in_flight += 1
+            CONCURRENCY_IN_FLIGHT.set(self.in_flight)
+            return True
+
+        if self._queued() >= self.queue_size:
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters[priority].append(waiter)
+        CONCURRENCY_QUEUE_LENGTH.set(self._queued())
+        try:
+            # The slot is handed over by release(), which already counts it as in flight
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            if waiter.done():
+                return True
+            waiter.cancel()
+            return False
+        except asyncio.CancelledError:
+            # Cancelled (client gone) after release() handed over a slot: give it back
+            if waiter.done() and not waiter.cancelled():
+                self.in_flight -= 1
+                self._admit_waiters()
+            else:
+                waiter.cancel()
+            raise
+        finally:
+            if waiter in self.waiters[priority]:
+                self.waiters[priority].remove(waiter)
+            CONCURRENCY_QUEUE_LENGTH.set(self._queued())
+
+    def release(self, latency: float, failed: bool = False):
+        self.in_flight -= 1
+
+        now = time.monotonic()
+        if failed or latency > self.target_latency:
+            if now - self._last_decrease > self.target_latency:
+                self.limit = max(self.limit * 0.9, self.min_limit)
+                self._last_decrease = now
+        else:
+            self.limit = min(self.limit + 1 / self.limit, self.max_limit)
+        CONCURRENCY_LIMIT.set(self.limit)
+        self._admit_waiters()
+
+    def _admit_waiters(self):
+        # Hand freed slots to queued requests, writes first
+        for priority in ("write", "read"):
+            queue = self.waiters[priority]
+            while queue and self._has_capacity(priority):
+                waiter = queue.popleft()
+                if not waiter.done():
+                    self.in_flight += 1
+                    waiter.set_result(True)
+
+        CONCURRENCY_IN_FLIGHT.set(self.in_flight)
+        CONCURRENCY_QUEUE_LENGTH.set(self._queued())
+
+concurrency_limiter = AdaptiveConcurrencyLimiter(
+    min_limit=CONCURRENCY_LIMIT_MIN,
+    max_limit=CONCURRENCY_LIMIT_MAX,
+    target_latency=CONCURRENCY_TARGET_LATENCY,
+    queue_size=CONCURRENCY_QUEUE_SIZE,
+    queue_timeout=CONCURRENCY_QUEUE_TIMEOUT,
+    write_reserve=CONCURRENCY_WRITE_RESERVE
+)
+
+# Concurrency limit middleware - probes, event streams and debug endpoints are never limited,
+# so an overloaded instance can still be diagnosed
+@app.middleware("http")
+async def concurrency_limit_middleware(request: Request, call_next):
+    if (
+        not CONCURRENCY_LIMIT_ENABLED
+        or request.url.path in ["/health", "/ready", "/metrics", "/api/events"]
+        or request.url.path.startswith("/debug/")
+    ):
+        return await call_next(request)
+
+    priority = "read" if request.method in ("GET", "HEAD", "OPTIONS") else "write"
+    if not await concurrency_limiter.acquire(priority):
+        REQUESTS_SHED.labels(priority=priority).inc()
+        logger.warning(
+            f"Shedding {priority} request, concurrency limit {int(concurrency_limiter.limit)} reached",
+            extra={"path": str(request.url.path), "http_method": request.method}
+        )
+        return Response(
+            content="Service overloaded, retry shortly",
+            status_code=503,
+            headers={"Retry-After": "1"}
+        )
+
+    start_time = time.monotonic()
+    failed = True
+    try:
+        response = await call_next(request)
+        failed = response.status_code >= 500
+        return response
+    finally:
+        concurrency_limiter.release(time.monotonic() - start_time, failed)
+
 # Logging middleware
 @app.middleware("http")
 async def logging_middleware(request: Request, call_next):
@@ -204,6 +662,7 @@ async def logging_middleware(request: Request, call_next):
 
     # Generate request ID
     request_id = f"{int(start_time * 1000)}"
+    current_request.set((request_id, f"{request.method} {request.url.path}"))
 
     # Log request
     logger.info(
@@ -252,6 +711,32 @@ async def metrics_middleware(request: Request, call_next):
 
     return response
 
+# Server-Timing middleware - outermost, so "middleware" covers the whole stack above the route
+@app.middleware("http")
+async def server_timing_middleware(request: Request, call_next):
+    timings = RequestTimings()
+    token = request_timings.set(timings)
+    start_time = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        request_timings.reset(token)
+
+    phases = timings.phases(time.perf_counter() - start_time)
+
+    route = request.scope.get("route")
+    endpoint = route.path if route is not None else request.url.path
+    for phase, seconds in phases.items():
+        if phase != "total":
+            REQUEST_PHASE_DURATION.labels(method=request.method, endpoint=endpoint, phase=phase).observe(seconds)
+
+    if SERVER_TIMING_ENABLED or request.headers.get("x-debug-timing") == "1":
+        response.headers["Server-Timing"] = ", ".join(
+            f"{phase};dur={seconds * 1000:.2f}" for phase, seconds in phases.items()
+        )
+
+    return response
+
 # Dependency
 def get_db():
     db = SessionLocal()
@@ -262,6 +747,239 @@ def get_db():
         DB_CONNECTIONS.dec()
         db.close()
 
+def post_etag(post: BlogPost) -> str:
+    """ETag for a post, derived from its last modification time"""
+    return f'"{post.updated_at.isoformat()}"'
+
+def if_match_satisfied(if_match: Optional[str], post: BlogPost) -> bool:
+    """Check an If-Match header (ETag list, '*' or a bare updated_at timestamp) against a post"""
+    if if_match is None:
+        return True
+    current = post_etag(post).strip('"')
+    for candidate in if_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate.strip('"') == current:
+            return True
+    return False
+
+# Markdown rendering
+def render_post_content(content: str) -> dict:
+    """Render Markdown to sanitized HTML, plus a plain-text excerpt and reading time"""
+    content_html = nh3.clean(markdown.markdown(content, extensions=MARKDOWN_EXTENSIONS))
+
+    text_only = " ".join(html.unescape(nh3.clean(content_html, tags=set())).split())
+    if len(text_only) > EXCERPT_LENGTH:
+        text_only = text_only[:EXCERPT_LENGTH].rsplit(" ", 1)[0] + "…"
+
+    return {
+        "content_html": content_html,
+        "excerpt": text_only,
+        "reading_time_minutes": max(1, math.ceil(len(content.split()) / WORDS_PER_MINUTE))
+    }
+
+async def to_html_response(post: BlogPost) -> BlogPostHTMLResponse:
+    """HTML view of a post; posts written before pre-rendering are rendered on the fly"""
+    content_html = post.body.content_html
+    if content_html is None:
+        content_html = (await asyncio.to_thread(render_post_content, post.content))["content_html"]
+    return BlogPostHTMLResponse(
+        **BlogPostSummary.model_validate(post).model_dump(),
+        content_html=content_html
+    )
+
+# Leaderboard cache: (category, limit) -> (expires_at, posts)
+top_posts_cache = {}
+
+# Post change events
+class PostEventBroker:
+    """
+    Fan out post change events to server-sent event subscribers
+
+    One LISTEN connection per process receives the NOTIFYs sent by the backend
+    and the AI agent; every subscriber gets a bounded queue, and a slow client
+    loses its oldest events instead of growing memory.
+    """
+
+    def __init__(self, buffer_size: int):
+        self.buffer_size = buffer_size
+        self.subscribers = set()
+        self._conn = None
+        self._fileno = None
+        self._loop = None
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.buffer_size)
+        self.subscribers.add(queue)
+        SSE_SUBSCRIBERS.set(len(self.subscribers))
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+        SSE_SUBSCRIBERS.set(len(self.subscribers))
+
+    def publish(self, event: Optional[dict]):
+        # Any change can reorder the leaderboard
+        top_posts_cache.clear()
+        for queue in list(self.subscribers):
+            if queue.full():
+                queue.get_nowait()
+                SSE_EVENTS_DROPPED.inc()
+            queue.put_nowait(event)
+
+    def start(self):
+        """Open the shared LISTEN connection (PostgreSQL only)"""
+        if engine.dialect.name != "postgresql":
+            return
+        self._loop = asyncio.get_running_loop()
+        try:
+            self._connect()
+        except Exception as e:
+            logger.error(f"Could not start post event listener: {str(e)}")
+            self._loop.call_later(5, self._reconnect)
+
+    def stop(self):
+        """Close the listener and end all open event streams"""
+        self._disconnect()
+        self._loop = None
+        self.publish(None)
+
+    def _connect(self):
+        # Detached from the pool: this connection lives for the whole process
+        pooled = engine.raw_connection()
+        conn = pooled.driver_connection  # None once detached
+        pooled.detach()
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {POST_EVENTS_CHANNEL}")
+        self._conn = conn
+        self._fileno = conn.fileno()
+        self._loop.add_reader(self._fileno, self._on_notify)
+        logger.info(f"Listening for post events on channel {POST_EVENTS_CHANNEL}")
+
+    def _disconnect(self):
+        if self._conn is None:
+            return
+        if self._loop is not None:
+            self._loop.remove_reader(self._fileno)
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
+
+    def _reconnect(self):
+        if self._loop is None:
+            return
+        try:
+            self._connect()
+        except Exception as e:
+            logger.error(f"Post event listener reconnect failed: {str(e)}")
+            self._loop.call_later(5, self._reconnect)
+
+    def _on_notify(self):
+        try:
+            self._conn.poll()
+        except Exception as e:
+            logger.error(f"Post event listener connection lost: {str(e)}")
+            self._disconnect()
+            self._loop.call_later(5, self._reconnect)
+            return
+
+        while self._conn.notifies:
+            notify = self._conn.notifies.pop(0)
+            try:
+                self.publish(json.loads(notify.payload))
+            except ValueError:
+                logger.warning(f"Ignoring malformed post event: {notify.payload[:200]}")
+
+post_event_broker = PostEventBroker(SSE_CLIENT_BUFFER)
+
+def emit_post_event(db: Session, event_type: str, post_id: int, **fields):
+    """
+    Announce a post change to event stream subscribers
+
+    On PostgreSQL this is a NOTIFY inside the current transaction, so it is
+    only delivered (to every backend replica) once the write commits.
+    """
+    event = {"type": event_type, "post_id": post_id, **fields}
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": POST_EVENTS_CHANNEL, "payload": json.dumps(event, default=str)}
+        )
+    else:
+        post_event_broker.publish(json.loads(json.dumps(event, default=str)))
+
+def adjust_category_count(db: Session, category: str, delta: int):
+    """Apply a post count change for a category in the current transaction"""
+    insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    db.execute(
+        insert(PostCategoryCount)
+        .values(category=category, post_count=delta)
+        .on_conflict_do_update(
+            index_elements=[PostCategoryCount.category],
+            set_={"post_count": PostCategoryCount.post_count + delta}
+        )
+    )
+
+def next_change_seq(db: Session) -> int:
+    """
+    Next value of the post change sequence, for a write about to commit
+
+    A sequence value is handed out when asked for, not when the transaction
+    commits, so on its own a later value could become visible before an
+    earlier one and a delta-sync cursor would move past the earlier change.
+    On PostgreSQL the value is therefore taken under a transaction advisory
+    lock that is held until commit: change_seq values become visible in
+    order. Call it last, right before commit and once every row the
+    transaction writes is already written, so writers only queue for the
+    commit itself and never wait for a row while holding the lock.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": CHANGE_SEQ_LOCK_ID})
+        return db.query(change_seq_sequence.next_value()).scalar()
+    # SQLite (development and tests) has no sequences and serializes writers anyway
+    return max(
+        db.query(func.max(BlogPost.change_seq)).scalar() or 0,
+        db.query(func.max(PostTombstone.change_seq)).scalar() or 0
+    ) + 1
+
+def recount_category_counts(db: Session) -> int:
+    """Rebuild post_category_counts from blog_posts (one full scan) and return the total"""
+    rows = db.query(BlogPost.category, func.count(BlogPost.id)).group_by(BlogPost.category).all()
+    db.query(PostCategoryCount).delete(synchronize_session=False)
+    db.add_all(PostCategoryCount(category=category, post_count=count) for category, count in rows)
+    db.commit()
+    return sum(count for _, count in rows)
+
+def total_post_count(db: Session, query, mode: str, category: Optional[str], score_filtered: bool):
+    """
+    Total number of posts a listing query matches, as (count, accuracy)
+
+    counter reads post_category_counts; estimate uses the planner's row
+    estimate for unfiltered PostgreSQL listings and the counters otherwise.
+    Score filters are not covered by the counters, so those listings are
+    always counted exactly (an index range scan on the score indexes).
+    """
+    if mode == "exact" or score_filtered:
+        return query.with_entities(func.count(BlogPost.id)).order_by(None).scalar(), "exact"
+
+    if mode == "estimate" and category is None and db.get_bind().dialect.name == "postgresql":
+        estimate = db.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'blog_posts'::regclass")
+        ).scalar()
+        if estimate is not None and estimate >= 0:  # -1 until the table is first analyzed
+            return estimate, "estimate"
+
+    counts = db.query(func.coalesce(func.sum(PostCategoryCount.post_count), 0))
+    if category:
+        counts = counts.filter(PostCategoryCount.category == category)
+    return counts.scalar(), "counter"
+
 # AI Scoring Functions
 async def trigger_ai_scoring(post_id: int):
     """
@@ -274,13 +992,17 @@ async def trigger_ai_scoring(post_id: int):
 
     max_retries = 3
     retry_delays = [2, 5, 10]  # Exponential backoff
+    # Lets the agent tag its logs (and loop stall reports) with the originating request
+    request = current_request.get()
+    headers = {"X-Request-ID": request[0]} if request else {}
     
     for attempt in range(max_retries):
         try:
             async with httpx.AsyncClient(timeout=90.0) as client:  # Increased timeout for Ollama LLM
                 response = await client.post(
                     f"{AI_AGENT_URL}/score",
-                    json={"post_id": post_id}
+                    json={"post_id": post_id},
+                    headers=headers
                 )
 
                 if response.status_code == 200:
@@ -326,21 +1048,41 @@ def handle_sigterm(signum, frame):
     global is_shutting_down
     logger.warning(f"Received signal {signum}, starting graceful shutdown", extra={"signal": signum})
     is_shutting_down = True
+    # Hand the signal on to the server (uvicorn installs its handlers before importing the app);
+    # without this it never stops serving, the shutdown event never runs and the pod is SIGKILLed
+    previous = previous_signal_handlers.get(signum)
+    if callable(previous):
+        previous(signum, frame)
 
 # Register signal handlers
-signal.signal(signal.SIGTERM, handle_sigterm)
-signal.signal(signal.SIGINT, handle_sigterm)
+previous_signal_handlers = {
+    sig: signal.signal(sig, handle_sigterm) for sig in (signal.SIGTERM, signal.SIGINT)
+}
 
 # Create tables and update metrics
 @app.on_event("startup")
 async def startup():
     logger.info("Application startup initiated")
-    Base.metadata.create_all(bind=engine)
+    # PostgreSQL schema is owned by migrations/; create_all only for SQLite (development and tests)
+    if engine.dialect.name == "postgresql":
+        if RUN_MIGRATIONS_ON_STARTUP:
+            await asyncio.to_thread(run_migrations, engine)
+    else:
+        Base.metadata.create_all(bind=engine)
     # Initialize post count metric
     db = SessionLocal()
     try:
-        count = db.query(BlogPost).count()
+        # Counters are seeded once with a full count; afterwards they are read instead
+        if db.query(PostCategoryCount).first() is None:
+            count = recount_category_counts(db)
+        else:
+            count = db.query(func.coalesce(func.sum(PostCategoryCount.post_count), 0)).scalar()
         POSTS_TOTAL.set(count)
+        post_event_broker.start()
+        if DEBUG_ENDPOINTS_ENABLED or LOOP_MONITOR_ENABLED:
+            asyncio.get_running_loop().set_task_factory(tracking_task_factory)
+        if LOOP_MONITOR_ENABLED:
+            loop_monitor.start()
         logger.info(f"Application started successfully", extra={"total_posts": count})
     except Exception as e:
         logger.error(f"Error during startup: {str(e)}", exc_info=True)
@@ -355,6 +1097,10 @@ async def shutdown():
     is_shutting_down = True
     logger.info("Graceful shutdown initiated")
 
+    # End event streams first - they would otherwise hold connections open
+    post_event_broker.stop()
+    loop_monitor.stop()
+
     # Wait for in-flight requests to complete (max 25 seconds, Kubernetes gives us 30)
     shutdown_timeout = 25
     elapsed = 0
@@ -416,6 +1162,173 @@ async def metrics():
     """Prometheus metrics endpoint"""
     return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
+# Event loop lag monitoring
+# Everything from here down to debug_tasks is duplicated verbatim between app/backend/main.py and
+# app/ai-agent/main.py: each service image is built from its own directory, so there is no shared
+# module both could import. Change the two copies together - the backend's
+# TestLoopLagMonitor::test_ai_agent_copy_matches fails when they differ.
+class LoopLagMonitor:
+    """
+    Measure event loop scheduling delay and report what blocks the loop
+
+    A task sleeps for `interval` in a loop and records how late it wakes up.
+    A watchdog thread checks the task's heartbeat; when the loop has not run
+    it for `threshold` past its due time, the loop thread's current stack (the
+    blocking code) is logged once per stall, with the request being served.
+    """
+
+    def __init__(self, interval: float, threshold: float):
+        self.interval = interval
+        self.threshold = threshold
+        self.heartbeat = time.monotonic()
+        self._loop = None
+        self._loop_thread_id = None
+        self._task = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = self._loop.create_task(self._measure())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _measure(self):
+        while True:
+            due = self._loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            EVENT_LOOP_LAG.observe(max(self._loop.time() - due, 0.0))
+            self.heartbeat = time.monotonic()
+
+    def _watch(self):
+        reported = None
+        while not self._stopped.wait(self.interval):
+            heartbeat = self.heartbeat
+            stalled_for = time.monotonic() - heartbeat - self.interval
+            if stalled_for >= self.threshold and heartbeat != reported:
+                reported = heartbeat
+                self.report_stall(stalled_for)
+
+    def report_stall(self, stalled_for: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else "(stack unavailable)\n"
+        task = asyncio.current_task(self._loop)
+        request_id, request = task_requests.get(task, (None, None)) if task is not None else (None, None)
+
+        EVENT_LOOP_STALLS.inc()
+        logger.warning(
+            f"Event loop blocked for {stalled_for * 1000:.0f}ms"
+            + (f" while serving {request} (request {request_id})" if request else "")
+            + f", blocking stack:\n{stack}",
+            extra={"request_id": request_id, "duration": round(stalled_for * 1000, 2)}
+        )
+
+loop_monitor = LoopLagMonitor(LOOP_MONITOR_INTERVAL, LOOP_STALL_THRESHOLD)
+
+# Debug endpoints
+def require_debug_access(x_admin_token: Optional[str] = Header(None)):
+    """Debug endpoints do not exist unless enabled, and always need the admin token"""
+    if not DEBUG_ENDPOINTS_ENABLED or not DEBUG_ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, DEBUG_ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+class StackSampler:
+    """
+    Statistical profiler - samples the stack of every thread at a fixed interval
+
+    Runs in its own thread, so the event loop keeps serving while it samples,
+    and the cost is one sys._current_frames() walk per interval.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.lock = threading.Lock()
+
+    def sample(self, seconds: float) -> collections.Counter:
+        own_thread = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks = collections.Counter()
+        deadline = time.monotonic() + seconds
+
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                frames.append(names.get(thread_id, str(thread_id)))
+                stacks[";".join(reversed(frames))] += 1
+            time.sleep(self.interval)
+
+        return stacks
+
+stack_sampler = StackSampler(PROFILE_SAMPLE_INTERVAL)
+
+# Creation time of tasks (debug endpoints) and the request each was created for
+# (loop monitor), recorded by the task factory installed when either is enabled
+task_created_at = weakref.WeakKeyDictionary()
+task_requests = weakref.WeakKeyDictionary()
+
+def tracking_task_factory(loop, coro, **kwargs):
+    task = asyncio.Task(coro, loop=loop, **kwargs)
+    if DEBUG_ENDPOINTS_ENABLED:
+        task_created_at[task] = time.monotonic()
+    context = kwargs.get("context")
+    request = context.get(current_request) if context is not None else current_request.get()
+    if request is not None:
+        task_requests[task] = request
+    return task
+
+@app.get("/debug/profile", dependencies=[Depends(require_debug_access)], include_in_schema=False)
+async def debug_profile(seconds: float = Query(10, gt=0, le=PROFILE_MAX_SECONDS)):
+    """
+    Sample all thread stacks for a time window
+
+    Returns collapsed stacks ("frame;frame;frame count" per line), ready for
+    flamegraph.pl or speedscope. Only one profile runs at a time.
+    """
+    if not stack_sampler.lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    try:
+        stacks = await asyncio.to_thread(stack_sampler.sample, seconds)
+    finally:
+        stack_sampler.lock.release()
+
+    return PlainTextResponse(
+        "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+    )
+
+@app.get("/debug/tasks", dependencies=[Depends(require_debug_access)], include_in_schema=False)
+async def debug_tasks(limit: int = Query(200, gt=0, le=5000)):
+    """List pending asyncio tasks, oldest first, with the point each one is waiting at"""
+    now = time.monotonic()
+    tasks = []
+    for task in asyncio.all_tasks():
+        created = task_created_at.get(task)
+        tasks.append({
+            "name": task.get_name(),
+            "coroutine": getattr(task.get_coro(), "__qualname__", repr(task.get_coro())),
+            "age_seconds": round(now - created, 3) if created is not None else None,
+            "stack": [
+                f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno} in {frame.f_code.co_name}"
+                for frame in task.get_stack(limit=20)
+            ]
+        })
+
+    tasks.sort(key=lambda t: t["age_seconds"] if t["age_seconds"] is not None else -1, reverse=True)
+    return {"total": len(tasks), "tasks": tasks[:limit]}
+
 # API Endpoints
 @app.get("/")
 async def root():
@@ -428,33 +1341,201 @@ async def root():
         "ready": "/ready"
     }
 
-@app.get("/api/posts", response_model=List[BlogPostResponse])
+@app.get("/api/posts", response_model=List[Union[BlogPostResponse, BlogPostHTMLResponse, BlogPostSummary]])
 @limiter.limit("100/minute")
 async def get_posts(
     request: Request,
+    response: Response,
     category: Optional[str] = None,
     skip: int = 0,
     limit: int = 10,
+    view: str = Query("summary", pattern="^(summary|full)$"),
+    format: str = Query("markdown", pattern="^(markdown|html)$"),
+    sort: str = Query("recent", pattern="^(recent|score)$"),
+    min_score: Optional[int] = Query(None, ge=0, le=100),
+    scored: Optional[bool] = None,
+    count: str = Query("counter", pattern="^(counter|estimate|exact|none)$"),
     db: Session = Depends(get_db)
 ):
-    """Get all blog posts with pagination and optional category filter"""
-    query = db.query(BlogPost).order_by(BlogPost.created_at.desc())
+    """
+    Get all blog posts with pagination and optional category and score filters
+
+    sort=score orders by AI score (unscored posts last); min_score and
+    scored=true|false filter on it. The default summary view leaves out the
+    post body; view=full includes it (as HTML with format=html) at the cost
+    of one extra query against blog_post_contents.
+
+    The total for pagination is returned in X-Total-Count. count= picks how it
+    is computed: counter (maintained per-category counts, default), estimate
+    (planner statistics, unfiltered listings only), exact (COUNT(*)) or none.
+    X-Total-Count-Accuracy reports the method actually used.
+    """
+    query = db.query(BlogPost)
 
     if category:
         query = query.filter(BlogPost.category == category)
 
+    if min_score is not None:
+        query = query.filter(BlogPost.ai_score >= min_score)
+
+    if scored is not None:
+        query = query.filter(BlogPost.ai_score.isnot(None) if scored else BlogPost.ai_score.is_(None))
+
+    if count != "none":
+        total, accuracy = total_post_count(
+            db, query, count, category, min_score is not None or scored is not None
+        )
+        response.headers["X-Total-Count"] = str(total)
+        response.headers["X-Total-Count-Accuracy"] = accuracy
+
+    if sort == "score":
+        query = query.order_by(BlogPost.ai_score.desc().nullslast(), BlogPost.id.desc())
+    else:
+        query = query.order_by(BlogPost.created_at.desc())
+
+    if view == "full":
+        query = query.options(selectinload(BlogPost.body))
+
     posts = query.offset(skip).limit(min(limit, 100)).all()
+
+    if view != "full":
+        return [BlogPostSummary.model_validate(post) for post in posts]
+    if format == "html":
+        return [await to_html_response(post) for post in posts]
+    return [BlogPostResponse.model_validate(post) for post in posts]
+
+@app.get("/api/posts/top", response_model=List[BlogPostSummary])
+@limiter.limit("100/minute")
+async def get_top_posts(
+    request: Request,
+    response: Response,
+    category: Optional[str] = None,
+    limit: int = Query(10, gt=0, le=50),
+    db: Session = Depends(get_db)
+):
+    """Highest AI-scored posts, overall or per category, served from a short-lived cache"""
+    key = (category, limit)
+    cached = top_posts_cache.get(key)
+    if cached is not None and cached[0] > time.monotonic():
+        posts = cached[1]
+    else:
+        query = db.query(BlogPost).filter(BlogPost.ai_score.isnot(None))
+        if category:
+            query = query.filter(BlogPost.category == category)
+        query = query.order_by(BlogPost.ai_score.desc().nullslast(), BlogPost.id.desc())
+
+        posts = [BlogPostSummary.model_validate(post).model_dump() for post in query.limit(limit).all()]
+        top_posts_cache[key] = (time.monotonic() + TOP_POSTS_CACHE_TTL, posts)
+
+    response.headers["Cache-Control"] = f"public, max-age={TOP_POSTS_CACHE_TTL}"
     return posts
 
-@app.get("/api/posts/{post_id}", response_model=BlogPostResponse)
-async def get_post(post_id: int, db: Session = Depends(get_db)):
-    """Get a specific blog post"""
-    post = db.query(BlogPost).filter(BlogPost.id == post_id).first()
+@app.get("/api/posts/changes", response_model=PostChangesResponse)
+@limiter.limit("100/minute")
+async def get_post_changes(
+    request: Request,
+    since: int = Query(0, ge=0),
+    limit: int = Query(500, gt=0, le=MAX_CHANGES_PAGE),
+    view: str = Query("summary", pattern="^(summary|full)$"),
+    db: Session = Depends(get_db)
+):
+    """
+    Posts created, updated or re-scored after a cursor, plus deleted post ids
+
+    Start with since=0 for a full copy, then pass the returned cursor on the
+    next call. Changes come in change sequence order; keep paging while
+    has_more is true. A post appears once, in its latest state, however many
+    times it changed since the cursor.
+    """
+    # change_seq values become visible in order (see next_change_seq), so
+    # every change up to the highest one seen here has committed. Reading only
+    # up to it keeps a change that commits between the posts and tombstone
+    # queries below from being passed over by the returned cursor.
+    horizon = max(
+        db.query(func.max(BlogPost.change_seq)).scalar() or 0,
+        db.query(func.max(PostTombstone.change_seq)).scalar() or 0
+    )
+
+    query = (
+        db.query(BlogPost)
+        .filter(BlogPost.change_seq > since, BlogPost.change_seq <= horizon)
+        .order_by(BlogPost.change_seq)
+        .limit(limit + 1)
+    )
+    if view == "full":
+        query = query.options(selectinload(BlogPost.body))
+
+    tombstones = (
+        db.query(PostTombstone)
+        .filter(PostTombstone.change_seq > since, PostTombstone.change_seq <= horizon)
+        .order_by(PostTombstone.change_seq)
+        .limit(limit + 1)
+        .all()
+    )
+
+    changes = sorted(
+        [(post.change_seq, post) for post in query.all()]
+        + [(tombstone.change_seq, tombstone) for tombstone in tombstones],
+        key=lambda change: change[0]
+    )
+    page = changes[:limit]
+    model = BlogPostResponse if view == "full" else BlogPostSummary
+
+    return {
+        "posts": [model.model_validate(item) for _, item in page if isinstance(item, BlogPost)],
+        "deleted": [item.post_id for _, item in page if isinstance(item, PostTombstone)],
+        "cursor": page[-1][0] if page else since,
+        "has_more": len(changes) > limit
+    }
+
+@app.post("/api/posts/batch-get", response_model=BatchGetResponse)
+@limiter.limit("100/minute")
+async def batch_get_posts(
+    request: Request,
+    batch: BatchGetRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Fetch many posts by id with a single query
+
+    Posts are returned in request order (duplicates collapsed); ids that do
+    not exist are listed in `missing`. At most MAX_BATCH_GET_IDS ids,
+    duplicates included, can be sent at once.
+    """
+    ids = list(dict.fromkeys(batch.ids))
+
+    found = {}
+    if ids:
+        found = {
+            post.id: post
+            for post in db.query(BlogPost)
+            .options(selectinload(BlogPost.body))
+            .filter(BlogPost.id.in_(ids))
+            .all()
+        }
+
+    return {
+        "posts": [found[post_id] for post_id in ids if post_id in found],
+        "missing": [post_id for post_id in ids if post_id not in found]
+    }
+
+@app.get("/api/posts/{post_id}", response_model=Union[BlogPostResponse, BlogPostHTMLResponse])
+async def get_post(
+    post_id: int,
+    response: Response,
+    format: str = Query("markdown", pattern="^(markdown|html)$"),
+    db: Session = Depends(get_db)
+):
+    """Get a specific blog post, with the Markdown source or (format=html) the pre-rendered HTML"""
+    post = db.query(BlogPost).options(joinedload(BlogPost.body)).filter(BlogPost.id == post_id).first()
     
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
-    return post
+    response.headers["ETag"] = post_etag(post)
+    if format == "html":
+        return await to_html_response(post)
+    return BlogPostResponse.model_validate(post)
 
 @app.post("/api/posts", response_model=BlogPostResponse, status_code=201)
 @limiter.limit("10/minute")
@@ -466,7 +1547,12 @@ async def create_post(
 ):
     """Create a new blog post and trigger AI scoring"""
     db_post = BlogPost(**post.dict())
+    db_post.set_rendered(await asyncio.to_thread(render_post_content, post.content))
     db.add(db_post)
+    db.flush()
+    adjust_category_count(db, db_post.category, 1)
+    emit_post_event(db, "created", db_post.id, title=db_post.title, category=db_post.category)
+    db_post.change_seq = next_change_seq(db)
     db.commit()
     db.refresh(db_post)
 
@@ -498,10 +1584,18 @@ async def update_post(
     if not db_post:
         raise HTTPException(status_code=404, detail="Post not found")
 
+    if post.category != db_post.category:
+        adjust_category_count(db, db_post.category, -1)
+        adjust_category_count(db, post.category, 1)
+
     for key, value in post.dict().items():
         setattr(db_post, key, value)
+    db_post.set_rendered(await asyncio.to_thread(render_post_content, post.content))
 
     db_post.updated_at = datetime.utcnow()
+    emit_post_event(db, "updated", db_post.id, updated_at=db_post.updated_at)
+    db.flush()
+    db_post.change_seq = next_change_seq(db)
     db.commit()
     db.refresh(db_post)
 
@@ -515,6 +1609,95 @@ async def update_post(
 
     return db_post
 
+@app.patch("/api/posts/{post_id}", response_model=BlogPostResponse)
+@limiter.limit("20/minute")
+async def patch_post(
+    request: Request,
+    post_id: int,
+    post: BlogPostUpdate,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    if_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Partially update a blog post
+
+    Only the fields present in the body are written, so the UPDATE touches just
+    the changed columns. Send If-Match with the post's ETag (or updated_at) to
+    reject the write with 412 if someone else modified the post in the meantime.
+    AI re-scoring is only triggered when a field used for scoring changed.
+    """
+    db_post = db.query(BlogPost).filter(BlogPost.id == post_id).first()
+
+    if not db_post:
+        raise HTTPException(status_code=404, detail="Post not found")
+
+    if not if_match_satisfied(if_match, db_post):
+        raise HTTPException(status_code=412, detail="Post was modified by another request")
+
+    changes = {
+        key: value
+        for key, value in post.dict(exclude_unset=True).items()
+        if value != getattr(db_post, key)
+    }
+
+    for key, value in changes.items():
+        if value is None and key != "tags":
+            raise HTTPException(status_code=422, detail=f"Field '{key}' cannot be null")
+
+    if not changes:
+        response.headers["ETag"] = post_etag(db_post)
+        return db_post
+
+    changed_fields = sorted(changes)
+    changes["updated_at"] = datetime.utcnow()
+
+    content = changes.pop("content", None)
+    if content is not None:
+        rendered = await asyncio.to_thread(render_post_content, content)
+        changes["excerpt"] = rendered["excerpt"]
+        changes["reading_time_minutes"] = rendered["reading_time_minutes"]
+
+    # Conditional UPDATE so a concurrent write between our read and this
+    # statement is detected instead of silently overwritten
+    query = db.query(BlogPost).filter(BlogPost.id == post_id)
+    if if_match is not None:
+        query = query.filter(BlogPost.updated_at == db_post.updated_at)
+
+    if query.update(changes, synchronize_session=False) == 0:
+        db.rollback()
+        raise HTTPException(status_code=412, detail="Post was modified by another request")
+
+    if content is not None:
+        db.query(BlogPostContent).filter(BlogPostContent.post_id == post_id).update(
+            {"content": content, "content_html": rendered["content_html"]}, synchronize_session=False
+        )
+
+    if "category" in changes:
+        adjust_category_count(db, db_post.category, -1)
+        adjust_category_count(db, changes["category"], 1)
+
+    emit_post_event(db, "updated", post_id, updated_at=changes["updated_at"], fields=changed_fields)
+    db.query(BlogPost).filter(BlogPost.id == post_id).update(
+        {"change_seq": next_change_seq(db)}, synchronize_session=False
+    )
+    db.commit()
+    db.refresh(db_post)
+
+    rescore = bool(SCORED_FIELDS.intersection(changed_fields))
+    if rescore:
+        background_tasks.add_task(trigger_ai_scoring, db_post.id)
+
+    logger.info(
+        f"Patched post {db_post.id} ({', '.join(changed_fields)})"
+        + (", AI re-scoring queued" if rescore else ""),
+        extra={"post_id": db_post.id, "changed_fields": changed_fields}
+    )
+
+    response.headers["ETag"] = post_etag(db_post)
+    return db_post
+
 @app.delete("/api/posts/{post_id}", status_code=204)
 @limiter.limit("10/minute")
 async def delete_post(request: Request, post_id: int, db: Session = Depends(get_db)):
@@ -524,7 +1707,13 @@ async def delete_post(request: Request, post_id: int, db: Session = Depends(get_
     if not db_post:
         raise HTTPException(status_code=404, detail="Post not found")
 
+    # Delete the body directly instead of loading it just to cascade
+    db.query(BlogPostContent).filter(BlogPostContent.post_id == post_id).delete(synchronize_session=False)
     db.delete(db_post)
+    adjust_category_count(db, db_post.category, -1)
+    emit_post_event(db, "deleted", post_id)
+    db.flush()
+    db.merge(PostTombstone(post_id=post_id, change_seq=next_change_seq(db), deleted_at=datetime.utcnow()))
     db.commit()
 
     # Update metrics
@@ -532,21 +1721,48 @@ async def delete_post(request: Request, post_id: int, db: Session = Depends(get_
 
     return None
 
+@app.get("/api/events")
+async def post_events(request: Request):
+    """
+    Server-sent events stream of post changes
+
+    Emits created/updated/deleted events from the backend and scored events
+    from the AI agent, so clients no longer need to poll for ai_score.
+    """
+    queue = post_event_broker.subscribe()
+
+    async def event_stream():
+        try:
+            yield f"retry: {SSE_HEARTBEAT_SECONDS * 1000}\n\n"
+            last_sent = time.monotonic()
+            while not is_shutting_down:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_DISCONNECT_CHECK_SECONDS)
+                except asyncio.TimeoutError:
+                    # A disconnect is only seen when asked for - check often, not just at the heartbeat
+                    if await request.is_disconnected():
+                        break
+                    if time.monotonic() - last_sent >= SSE_HEARTBEAT_SECONDS:
+                        last_sent = time.monotonic()
+                        yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    break
+                last_sent = time.monotonic()
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            post_event_broker.unsubscribe(queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/api/categories")
 async def get_categories():
     """Get available categories"""
-    return {
-        "categories": [
-            "Kubernetes Features",
-            "Security Best Practices",
-            "CI/CD Workflows",
-            "Helm and Package Management",
-            "Networking",
-            "Storage",
-            "Monitoring and Observability",
-            "GitOps"
-        ]
-    }
+    return {"categories": CATEGORIES}
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,169 @@
+"""
+Versioned schema migrations for PostgreSQL
+Applies migrations/NNNN_name.sql in order and records them in schema_migrations.
+Usage: DATABASE_URL=... python migrate.py [status]
+
+Each file runs in one transaction, unless its first line is
+"-- migrate: no-transaction" (CREATE INDEX CONCURRENTLY, batched backfills);
+those run statement by statement in autocommit mode and must be idempotent.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import sys
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+NO_TRANSACTION_MARKER = "-- migrate: no-transaction"
+
+# Held while migrating so replicas starting together apply each migration once
+MIGRATION_LOCK_ID = 7305561
+
+MIGRATION_FILE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+DOLLAR_QUOTE = re.compile(r"\$\w*\$")
+
+
+def load_migrations():
+    """(version, name, sql) for every migration file, in version order"""
+    migrations = []
+    for path in sorted(MIGRATIONS_DIR.iterdir()):
+        match = MIGRATION_FILE.match(path.name)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), path.read_text()))
+    return migrations
+
+
+def split_statements(sql: str):
+    """Split a SQL script on top-level semicolons (respects quotes, $$ bodies and comments)"""
+    statements = []
+    current = []
+    i = 0
+    while i < len(sql):
+        char = sql[i]
+        if sql.startswith("--", i):
+            end = sql.find("\n", i)
+            i = len(sql) if end == -1 else end
+            continue
+        if char == "'":
+            end = sql.find("'", i + 1)
+            while end != -1 and sql.startswith("''", end):
+                end = sql.find("'", end + 2)
+            end = len(sql) if end == -1 else end + 1
+            current.append(sql[i:end])
+            i = end
+            continue
+        quote = DOLLAR_QUOTE.match(sql, i) if char == "$" else None
+        if quote:
+            end = sql.find(quote.group(), quote.end())
+            end = len(sql) if end == -1 else end + len(quote.group())
+            current.append(sql[i:end])
+            i = end
+            continue
+        if char == ";":
+            statements.append("".join(current).strip())
+            current = []
+        else:
+            current.append(char)
+        i += 1
+    statements.append("".join(current).strip())
+    return [statement for statement in statements if statement]
+
+
+def checksum(sql: str) -> str:
+    return hashlib.sha256(sql.encode()).hexdigest()
+
+
+def applied_migrations(cursor) -> dict:
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            checksum VARCHAR(64) NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    cursor.execute("SELECT version, checksum FROM schema_migrations")
+    return dict(cursor.fetchall())
+
+
+def run_migrations(engine: Engine) -> list:
+    """Apply pending migrations and return the versions applied"""
+    applied_now = []
+    # Dedicated connection - autocommit is toggled per migration and must not leak into the pool
+    pooled = engine.raw_connection()
+    conn = pooled.driver_connection  # None once detached
+    pooled.detach()
+    try:
+        conn.autocommit = True
+        cursor = conn.cursor()
+        cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        try:
+            applied = applied_migrations(cursor)
+
+            for version, name, sql in load_migrations():
+                if version in applied:
+                    if applied[version] != checksum(sql):
+                        logger.warning(f"Migration {version:04d}_{name} changed after it was applied")
+                    continue
+
+                logger.info(f"Applying migration {version:04d}_{name}")
+                transactional = not sql.lstrip().startswith(NO_TRANSACTION_MARKER)
+                if transactional:
+                    conn.autocommit = False
+                try:
+                    for statement in split_statements(sql):
+                        cursor.execute(statement)
+                    cursor.execute(
+                        "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                        (version, name, checksum(sql))
+                    )
+                    if transactional:
+                        conn.commit()
+                except Exception:
+                    if transactional:
+                        conn.rollback()
+                    logger.error(f"Migration {version:04d}_{name} failed", exc_info=True)
+                    raise
+                finally:
+                    conn.autocommit = True
+
+                applied_now.append(version)
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+    finally:
+        conn.close()
+
+    return applied_now
+
+
+def migration_status(engine: Engine) -> list:
+    """(version, name, applied) for every migration file"""
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        applied = applied_migrations(cursor)
+        conn.commit()
+    finally:
+        conn.close()
+    return [(version, name, version in applied) for version, name, _ in load_migrations()]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    engine = create_engine(os.environ["DATABASE_URL"])
+
+    if len(sys.argv) > 1 and sys.argv[1] == "status":
+        for version, name, applied in migration_status(engine):
+            print(f"{version:04d}_{name}: {'applied' if applied else 'pending'}")
+    else:
+        versions = run_migrations(engine)
+        logger.info(f"Applied {len(versions)} migrations" if versions else "Schema is up to date")
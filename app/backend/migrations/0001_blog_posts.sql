@@ -0,0 +1,15 @@
+-- Migration 0001: blog_posts as originally created by Base.metadata.create_all
+-- A no-op on databases that already have the table.
+
+CREATE TABLE IF NOT EXISTS blog_posts (
+    id SERIAL PRIMARY KEY,
+    title VARCHAR(255) NOT NULL,
+    content TEXT NOT NULL,
+    category VARCHAR(100) NOT NULL,
+    author VARCHAR(100) NOT NULL,
+    tags VARCHAR(255),
+    created_at TIMESTAMP,
+    updated_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_blog_posts_id ON blog_posts (id);
@@ -1,5 +1,4 @@
--- Database Migration for AI Agent
--- Run this to add scoring columns and tables
+-- Migration 0002: AI scoring columns and tables (previously app/ai-agent/db_migration.sql)
 
 -- Add AI score columns to blog_posts table
 ALTER TABLE blog_posts
@@ -0,0 +1,92 @@
+-- migrate: no-transaction
+-- Migration 0003: move post bodies out of blog_posts
+-- Keeps blog_posts narrow (title, category, created_at, ai_score, ...) so list,
+-- sort and count queries stop dragging large TOASTed bodies through shared_buffers.
+--
+-- Safe to run while the old application version is serving traffic: creates
+-- blog_post_contents, dual-writes via trigger and backfills in batches (one
+-- commit per batch, hence no-transaction). Every step is skipped on databases
+-- whose blog_posts never had a content column.
+
+CREATE TABLE IF NOT EXISTS blog_post_contents (
+    post_id INTEGER PRIMARY KEY REFERENCES blog_posts(id) ON DELETE CASCADE,
+    content TEXT NOT NULL
+);
+
+-- Optional: lz4 TOAST compression for large bodies (PostgreSQL 14+ built with lz4)
+DO $$
+BEGIN
+    IF current_setting('server_version_num')::int >= 140000 THEN
+        ALTER TABLE blog_post_contents ALTER COLUMN content SET COMPRESSION lz4;
+    END IF;
+EXCEPTION WHEN feature_not_supported THEN
+    RAISE NOTICE 'lz4 not supported by this server, keeping default compression';
+END $$;
+
+CREATE OR REPLACE FUNCTION sync_blog_post_content() RETURNS trigger AS $$
+BEGIN
+    IF NEW.content IS NOT NULL THEN
+        INSERT INTO blog_post_contents (post_id, content)
+        VALUES (NEW.id, NEW.content)
+        ON CONFLICT (post_id) DO UPDATE SET content = EXCLUDED.content;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'blog_posts' AND column_name = 'content'
+    ) THEN
+        -- New application versions insert posts without a body in blog_posts
+        ALTER TABLE blog_posts ALTER COLUMN content DROP NOT NULL;
+
+        -- Dual-write: bodies written by the old application version are copied over
+        DROP TRIGGER IF EXISTS trg_sync_blog_post_content ON blog_posts;
+        CREATE TRIGGER trg_sync_blog_post_content
+            AFTER INSERT OR UPDATE OF content ON blog_posts
+            FOR EACH ROW EXECUTE FUNCTION sync_blog_post_content();
+    END IF;
+END $$;
+
+-- Backfill existing bodies in small batches (short locks, one commit per batch)
+DO $$
+DECLARE
+    last_id INTEGER := 0;
+    batch_max INTEGER;
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'blog_posts' AND column_name = 'content'
+    ) THEN
+        RETURN;
+    END IF;
+
+    LOOP
+        SELECT max(id) INTO batch_max
+        FROM (SELECT id FROM blog_posts WHERE id > last_id ORDER BY id LIMIT 5000) batch;
+
+        EXIT WHEN batch_max IS NULL;
+
+        EXECUTE
+            'INSERT INTO blog_post_contents (post_id, content)
+             SELECT id, content FROM blog_posts
+             WHERE id > $1 AND id <= $2 AND content IS NOT NULL
+             ON CONFLICT (post_id) DO NOTHING'
+        USING last_id, batch_max;
+
+        last_id := batch_max;
+        COMMIT;
+    END LOOP;
+END $$;
+
+COMMENT ON TABLE blog_post_contents IS 'Post bodies, split from blog_posts to keep list queries small';
+
+-- Contract step - once every backend and AI agent replica reads blog_post_contents,
+-- add these as a new migration:
+--
+-- DROP TRIGGER IF EXISTS trg_sync_blog_post_content ON blog_posts;
+-- DROP FUNCTION IF EXISTS sync_blog_post_content();
+-- ALTER TABLE blog_posts DROP COLUMN IF EXISTS content;
@@ -0,0 +1,14 @@
+-- Migration 0004: pre-rendered post bodies
+-- Adds the columns filled by create/update/patch when a post is written.
+-- Existing posts are rendered on the fly until backfilled with:
+--   python backfill_rendered.py
+
+ALTER TABLE blog_posts
+ADD COLUMN IF NOT EXISTS excerpt VARCHAR(210) DEFAULT NULL,
+ADD COLUMN IF NOT EXISTS reading_time_minutes INTEGER DEFAULT NULL;
+
+ALTER TABLE blog_post_contents
+ADD COLUMN IF NOT EXISTS content_html TEXT DEFAULT NULL;
+
+COMMENT ON COLUMN blog_posts.excerpt IS 'Plain-text excerpt rendered from the post body';
+COMMENT ON COLUMN blog_post_contents.content_html IS 'Sanitized HTML rendered from content';
@@ -0,0 +1,11 @@
+-- migrate: no-transaction
+-- Migration 0005: indexes for score-ranked listings (sort=score, /api/posts/top)
+--   ORDER BY ai_score DESC NULLS LAST, id DESC, optionally WHERE category = ...
+-- Built CONCURRENTLY so writes are not blocked; if a build fails, drop the
+-- INVALID index it leaves behind before re-running.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_blog_posts_category_score
+    ON blog_posts (category, ai_score DESC NULLS LAST, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_blog_posts_score
+    ON blog_posts (ai_score DESC NULLS LAST, id DESC);
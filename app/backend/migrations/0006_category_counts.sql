@@ -0,0 +1,16 @@
+-- Migration 0006: per-category post counts behind X-Total-Count
+-- Seeded from blog_posts once; afterwards the backend keeps them in sync on
+-- every create, delete and category change. Posts written by replicas still
+-- on the previous version during the rollout are not counted - call
+-- main.recount_category_counts() afterwards if exact counter totals matter.
+
+CREATE TABLE IF NOT EXISTS post_category_counts (
+    category VARCHAR(100) PRIMARY KEY,
+    post_count INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT INTO post_category_counts (category, post_count)
+SELECT category, count(*) FROM blog_posts GROUP BY category
+ON CONFLICT (category) DO NOTHING;
+
+COMMENT ON TABLE post_category_counts IS 'Maintained post counts per category, used instead of COUNT(*)';
@@ -0,0 +1,23 @@
+-- Migration 0007: change sequence for delta sync (GET /api/posts/changes)
+-- Must be applied before the AI agent version that bumps change_seq is rolled out.
+
+CREATE SEQUENCE IF NOT EXISTS blog_posts_change_seq;
+
+ALTER TABLE blog_posts
+ADD COLUMN IF NOT EXISTS change_seq BIGINT DEFAULT NULL;
+
+-- Existing posts get a sequence number so a since=0 sync returns them
+UPDATE blog_posts SET change_seq = nextval('blog_posts_change_seq') WHERE change_seq IS NULL;
+
+CREATE INDEX IF NOT EXISTS ix_blog_posts_change_seq ON blog_posts (change_seq);
+
+CREATE TABLE IF NOT EXISTS post_tombstones (
+    post_id INTEGER PRIMARY KEY,
+    change_seq BIGINT NOT NULL,
+    deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_post_tombstones_change_seq ON post_tombstones (change_seq);
+
+COMMENT ON COLUMN blog_posts.change_seq IS 'Position of the latest change to this post in blog_posts_change_seq';
+COMMENT ON TABLE post_tombstones IS 'Deleted post ids, returned by the delta-sync endpoint';
@@ -0,0 +1,14 @@
+-- migrate: no-transaction
+-- Migration 0008: indexes for the default post listing
+--   GET /api/posts               ORDER BY created_at DESC LIMIT n
+--   GET /api/posts?category=...  WHERE category = ... ORDER BY created_at DESC LIMIT n
+-- The composite index also serves category-only lookups (exact counts), so
+-- there is no separate index on category.
+-- Built CONCURRENTLY so writes are not blocked; if a build fails, drop the
+-- INVALID index it leaves behind before re-running.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_blog_posts_created_at
+    ON blog_posts (created_at);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_blog_posts_category_created_at
+    ON blog_posts (category, created_at);
@@ -0,0 +1,15 @@
+-- Migration 0009: AI agent score cache
+-- LLM results keyed by sha256(model version + exact prompt), so rescoring a
+-- post whose title, category, author and content have not changed reuses the
+-- previous result instead of calling the LLM again.
+
+CREATE TABLE IF NOT EXISTS score_cache (
+    cache_key VARCHAR(64) PRIMARY KEY,
+    model_version VARCHAR(100) NOT NULL,
+    scores JSONB NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    hit_count INTEGER NOT NULL DEFAULT 0,
+    last_hit_at TIMESTAMP DEFAULT NULL
+);
+
+COMMENT ON TABLE score_cache IS 'LLM scoring results by prompt hash and model version, read by the AI agent';
@@ -0,0 +1,50 @@
+-- Migration 0010: pgvector store for the AI agent's similar-post retrieval (VECTOR_BACKEND=pgvector)
+-- One row per post chunk with its embedding and an HNSW index for cosine
+-- distance, shared by every agent replica. Only created where the pgvector
+-- extension is installed on the server (e.g. the pgvector/pgvector images);
+-- without it this migration only adds the sync state table and the agent
+-- keeps using its local Chroma store. The same happens when the migration
+-- role may not create extensions. Run the DO block by hand once the
+-- extension can be installed.
+-- The vector size matches OpenAI's text-embedding-ada-002 (1536); another
+-- embedding model needs a new migration.
+
+CREATE TABLE IF NOT EXISTS vector_index_state (
+    backend VARCHAR(20) PRIMARY KEY,
+    watermark BIGINT NOT NULL,
+    completed BOOLEAN NOT NULL DEFAULT FALSE,
+    saved_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'vector') THEN
+        RAISE NOTICE 'pgvector is not installed, skipping post_embeddings';
+        RETURN;
+    END IF;
+
+    BEGIN
+        CREATE EXTENSION IF NOT EXISTS vector;
+    EXCEPTION WHEN insufficient_privilege THEN
+        RAISE NOTICE 'Not allowed to create the pgvector extension, skipping post_embeddings';
+        RETURN;
+    END;
+
+    CREATE TABLE IF NOT EXISTS post_embeddings (
+        post_id INTEGER NOT NULL REFERENCES blog_posts(id) ON DELETE CASCADE,
+        chunk INTEGER NOT NULL,
+        chunk_count INTEGER NOT NULL,
+        content TEXT NOT NULL,
+        content_hash VARCHAR(64) NOT NULL,
+        model VARCHAR(100) NOT NULL,
+        embedding vector(1536) NOT NULL,
+        PRIMARY KEY (post_id, chunk)
+    );
+
+    CREATE INDEX IF NOT EXISTS ix_post_embeddings_embedding
+        ON post_embeddings USING hnsw (embedding vector_cosine_ops);
+
+    COMMENT ON TABLE post_embeddings IS 'Post chunk embeddings for similar-post retrieval, written by the AI agent';
+END $$;
+
+COMMENT ON TABLE vector_index_state IS 'change_seq watermark of the AI agent''s shared vector index sync';
@@ -0,0 +1,31 @@
+-- Migration 0011: precomputed similar posts (AI agent prompt references, GET /similar/{post_id})
+-- One list per post with its top-k nearest posts that pass the agent's
+-- similar-post filters. list_key identifies the post content and settings
+-- the list was computed for; the agent's vector index sync marks lists stale
+-- when a post they show (or might now show) changes, and recomputes them.
+
+CREATE TABLE IF NOT EXISTS post_neighbor_lists (
+    post_id INTEGER PRIMARY KEY REFERENCES blog_posts(id) ON DELETE CASCADE,
+    list_key VARCHAR(64) NOT NULL,
+    kth_distance REAL DEFAULT NULL,
+    stale BOOLEAN NOT NULL DEFAULT FALSE,
+    computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS post_neighbors (
+    post_id INTEGER NOT NULL REFERENCES post_neighbor_lists(post_id) ON DELETE CASCADE,
+    rank SMALLINT NOT NULL,
+    neighbor_id INTEGER NOT NULL,
+    distance REAL NOT NULL,
+    snippet TEXT NOT NULL,
+    PRIMARY KEY (post_id, rank)
+);
+
+-- Lists that show a post, when it changes or is deleted
+CREATE INDEX IF NOT EXISTS ix_post_neighbors_neighbor_id ON post_neighbors (neighbor_id);
+
+-- Lists waiting to be recomputed
+CREATE INDEX IF NOT EXISTS ix_post_neighbor_lists_stale ON post_neighbor_lists (post_id) WHERE stale;
+
+COMMENT ON COLUMN post_neighbor_lists.kth_distance IS 'Distance of the last neighbour when the list is full; a closer post makes the list stale';
+COMMENT ON TABLE post_neighbors IS 'Top-k similar posts per post, maintained by the AI agent';
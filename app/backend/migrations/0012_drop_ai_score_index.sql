@@ -0,0 +1,8 @@
+-- migrate: no-transaction
+-- Migration 0012: drop idx_blog_posts_ai_score (0002)
+-- Every score query orders by ai_score DESC NULLS LAST, id DESC and is served
+-- by 0005's ix_blog_posts_score / ix_blog_posts_category_score; the older
+-- single-column index was only maintained on each score write.
+-- Dropped CONCURRENTLY so reads and writes on blog_posts are not blocked.
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_blog_posts_ai_score;
@@ -0,0 +1,274 @@
+"""
+Bulk-generate realistic posts and AI score histories for scale testing (PostgreSQL)
+Usage: DATABASE_URL=... python seed_data.py <posts> [--analyses-per-post N] [--seed N] [--reset]
+
+Rows are streamed with COPY in chunks, one transaction per chunk. Generation
+is deterministic per post id, so the same arguments always produce the same
+data. Point it at a scratch database - --reset truncates every post table.
+"""
+
+import argparse
+import io
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from main import engine, logger, CATEGORIES, CHANGE_SEQ_LOCK_ID, render_post_content
+from migrate import run_migrations
+
+AUTHORS = ["SHA", "Dana Levi", "Omer Katz", "Maya Cohen", "Noam Friedman", "Tal Mizrahi", "Ariel Ben-David"]
+TAGS = [
+    "kubernetes", "helm", "argocd", "gitops", "security", "rbac", "networking", "ingress",
+    "storage", "csi", "prometheus", "grafana", "logging", "keda", "karpenter", "terraform",
+    "vault", "postgres", "ci", "docker", "observability", "autoscaling", "service-mesh"
+]
+TOPICS = [
+    "rolling updates", "pod disruption budgets", "network policies", "persistent volumes",
+    "sealed secrets", "canary releases", "horizontal autoscaling", "admission webhooks",
+    "resource quotas", "liveness probes", "multi-tenant clusters", "image scanning",
+    "cost optimization", "disaster recovery", "zero-downtime migrations", "log pipelines"
+]
+TITLE_PATTERNS = [
+    "A practical guide to {topic}", "{topic}: lessons from production", "Getting started with {topic}",
+    "Debugging {topic} at scale", "Why we rethought {topic}", "{topic} in five steps"
+]
+SENTENCES = [
+    "In this post we walk through a setup that has held up in production for months.",
+    "The defaults work for small clusters but start to hurt once traffic grows.",
+    "Start by checking what the controller actually reconciles before changing anything.",
+    "Most incidents we traced back to this came from missing resource limits.",
+    "The manifest below is the minimal version; the Helm values add the knobs.",
+    "Measure first: the dashboards usually show the bottleneck long before users do.",
+    "We keep the configuration in Git and let ArgoCD apply it, so every change is reviewed.",
+    "This trades a little latency for a much simpler failure mode.",
+    "Roll it out to the dev environment first and watch the error budget for a day.",
+]
+CODE_BLOCK = "```yaml\napiVersion: apps/v1\nkind: Deployment\nspec:\n  replicas: 3\n```"
+MODEL_VERSIONS = ["gpt-4-turbo-preview", "llama3:8b", "gpt-4o-mini"]
+
+# (maximum) per sub-score, as enforced by the post_analysis CHECK constraints
+SCORE_PARTS = [
+    ("technical_accuracy_score", 25), ("clarity_score", 20), ("completeness_score", 20),
+    ("code_quality_score", 15), ("seo_score", 10), ("engagement_score", 10)
+]
+
+SCORED_FRACTION = 0.8
+BODY_VARIANTS = 500  # distinct bodies, rendered once each instead of once per post
+HISTORY_START = datetime(2021, 1, 1)
+HISTORY_DAYS = 4 * 365
+
+
+def copy_value(value) -> str:
+    """A value in COPY text format"""
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+class CopyStream(io.RawIOBase):
+    """File-like object over a generator of rows, read by COPY ... FROM STDIN"""
+
+    def __init__(self, rows):
+        self._rows = rows
+        self._buffer = b""
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._buffer += ("\t".join(copy_value(value) for value in row) + "\n").encode()
+        if size < 0:
+            size = len(self._buffer)
+        chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+
+def make_bodies(seed: int) -> list:
+    """Markdown bodies of varying length with their rendered HTML, excerpt and reading time"""
+    rng = random.Random(seed)
+    bodies = []
+    for _ in range(BODY_VARIANTS):
+        sections = []
+        # Long tail of lengths: most posts are a few hundred words, some run to thousands
+        for section in range(max(1, int(rng.lognormvariate(1.2, 0.7)))):
+            paragraphs = [
+                " ".join(rng.choice(SENTENCES) for _ in range(rng.randint(3, 8)))
+                for _ in range(rng.randint(1, 4))
+            ]
+            if rng.random() < 0.4:
+                paragraphs.append(CODE_BLOCK)
+            sections.append(f"## Part {section + 1}\n\n" + "\n\n".join(paragraphs))
+        content = "\n\n".join(sections)
+        bodies.append((content, render_post_content(content)))
+    return bodies
+
+
+def make_post(post_id: int, seed: int, analyses_per_post: float):
+    """Everything generated for one post: its row values and its score history"""
+    rng = random.Random(seed * 1_000_003 + post_id)
+
+    # More posts in recent months than in the early days
+    created_at = HISTORY_START + timedelta(days=HISTORY_DAYS * rng.random() ** 0.5, seconds=rng.randint(0, 86399))
+    topic = rng.choice(TOPICS)
+    post = {
+        "id": post_id,
+        "title": rng.choice(TITLE_PATTERNS).format(topic=topic).capitalize(),
+        "category": rng.choices(CATEGORIES, weights=range(len(CATEGORIES), 0, -1))[0],
+        "author": rng.choice(AUTHORS),
+        "tags": ",".join(rng.sample(TAGS, rng.randint(1, 5))),
+        "created_at": created_at,
+        "updated_at": created_at + timedelta(hours=rng.randint(0, 72)) if rng.random() < 0.3 else created_at,
+        "body": rng.randrange(BODY_VARIANTS),
+        "analyses": []
+    }
+
+    if rng.random() < SCORED_FRACTION:
+        quality = rng.uniform(0.3, 1.0)
+        analyzed_at = post["updated_at"]
+        runs = 1 + int(rng.expovariate(1 / max(analyses_per_post / SCORED_FRACTION - 1, 0.01)))
+        for _ in range(runs):
+            analyzed_at += timedelta(hours=rng.uniform(0.01, 24 * 30))
+            parts = {
+                name: max(0, min(maximum, round(maximum * (quality + rng.gauss(0, 0.1)))))
+                for name, maximum in SCORE_PARTS
+            }
+            post["analyses"].append((parts, analyzed_at, rng.choice(MODEL_VERSIONS)))
+    return post
+
+
+def post_rows(posts, bodies):
+    for post in posts:
+        rendered = bodies[post["body"]][1]
+        latest = post["analyses"][-1] if post["analyses"] else None
+        yield (
+            post["id"], post["title"], post["category"], post["author"], post["tags"],
+            post["created_at"], post["updated_at"],
+            sum(latest[0].values()) if latest else None,
+            latest[1] if latest else None,
+            rendered["excerpt"], rendered["reading_time_minutes"]
+        )
+
+
+def content_rows(posts, bodies):
+    for post in posts:
+        content, rendered = bodies[post["body"]]
+        yield post["id"], content, rendered["content_html"]
+
+
+def analysis_rows(posts):
+    for post in posts:
+        for parts, analyzed_at, model_version in post["analyses"]:
+            suggestions = json.dumps(["Add a diagram of the setup", "Link to the upstream docs"])
+            yield (
+                post["id"], *parts.values(), sum(parts.values()), suggestions, analyzed_at, model_version
+            )
+
+
+def reset():
+    """Remove every post, score history, tombstone and counter"""
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "TRUNCATE blog_posts, blog_post_contents, post_analysis, post_tombstones, post_category_counts "
+            "RESTART IDENTITY CASCADE"
+        )
+
+
+def seed_posts(count: int, analyses_per_post: float = 10, seed: int = 42, chunk_size: int = 50000) -> int:
+    """Append `count` posts (with bodies and score histories) and return the number of analyses written"""
+    run_migrations(engine)
+    bodies = make_bodies(seed)
+    analyses_total = 0
+    started = time.monotonic()
+
+    pooled = engine.raw_connection()
+    conn = pooled.driver_connection  # None once detached
+    pooled.detach()  # autocommit is switched on for ANALYZE, keep it out of the pool
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT coalesce(max(id), 0) FROM blog_posts")
+        first_id = cur.fetchone()[0] + 1
+
+        for chunk_start in range(first_id, first_id + count, chunk_size):
+            chunk_end = min(chunk_start + chunk_size, first_id + count)
+            posts = [make_post(post_id, seed, analyses_per_post) for post_id in range(chunk_start, chunk_end)]
+
+            # change_seq stays NULL during the COPYs - stamping it takes the change_seq lock,
+            # which would hold up every writer for the whole chunk
+            cur.copy_expert(
+                "COPY blog_posts (id, title, category, author, tags, created_at, updated_at, ai_score, "
+                "last_scored_at, excerpt, reading_time_minutes) FROM STDIN",
+                CopyStream(post_rows(posts, bodies))
+            )
+            cur.copy_expert(
+                "COPY blog_post_contents (post_id, content, content_html) FROM STDIN",
+                CopyStream(content_rows(posts, bodies))
+            )
+            cur.copy_expert(
+                "COPY post_analysis (post_id, " + ", ".join(name for name, _ in SCORE_PARTS)
+                + ", total_score, suggestions, analyzed_at, model_version) FROM STDIN",
+                CopyStream(analysis_rows(posts))
+            )
+
+            # Then reserve a block of change sequence numbers for the chunk, last and under
+            # the lock until commit, so delta-sync cursors never pass the posts being loaded
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (CHANGE_SEQ_LOCK_ID,))
+            cur.execute(
+                "SELECT setval('blog_posts_change_seq', nextval('blog_posts_change_seq') + %s)",
+                (len(posts),)
+            )
+            change_seq_start = cur.fetchone()[0] - len(posts) + 1
+            cur.execute(
+                "UPDATE blog_posts SET change_seq = %s + (id - %s) WHERE id >= %s AND id < %s",
+                (change_seq_start, chunk_start, chunk_start, chunk_end)
+            )
+            conn.commit()
+
+            analyses_total += sum(len(post["analyses"]) for post in posts)
+            logger.info(
+                f"Seeded posts {chunk_start}-{chunk_end - 1} "
+                f"({analyses_total} analyses, {time.monotonic() - started:.0f}s)"
+            )
+
+        cur.execute("SELECT setval(pg_get_serial_sequence('blog_posts', 'id'), (SELECT max(id) FROM blog_posts))")
+        cur.execute(
+            """
+            INSERT INTO post_category_counts (category, post_count)
+            SELECT category, count(*) FROM blog_posts GROUP BY category
+            ON CONFLICT (category) DO UPDATE SET post_count = EXCLUDED.post_count
+            """
+        )
+        conn.commit()
+
+        # Fresh planner statistics, as autovacuum would eventually produce
+        conn.autocommit = True
+        cur.execute("ANALYZE blog_posts, blog_post_contents, post_analysis, post_category_counts")
+    finally:
+        conn.close()
+
+    return analyses_total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("posts", type=int, help="number of posts to add")
+    parser.add_argument("--analyses-per-post", type=float, default=10, help="average score history length")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--reset", action="store_true", help="truncate all post tables first")
+    args = parser.parse_args()
+
+    if args.reset:
+        reset()
+    analyses = seed_posts(args.posts, args.analyses_per_post, args.seed, args.chunk_size)
+    logger.info(f"Seeding complete: {args.posts} posts, {analyses} analyses")
@@ -0,0 +1,297 @@
+"""
+Graceful shutdown soak test - SIGTERM the backend under load and count what is lost
+Usage: python shutdown_soak.py [--iterations 20] [--workers 20] [--warmup 3] [--database-url URL]
+
+Each iteration starts the backend with uvicorn (as the Dockerfile does), drives
+mixed read/write traffic at it, sends SIGTERM mid-flight and keeps the traffic
+going until the process exits - clients keep sending while a pod is being
+removed from its Service endpoints. A stub AI agent records the scoring calls
+made by the backend's background tasks. Per iteration it reports:
+  - dropped: requests in flight at SIGTERM that failed (connection error or 5xx)
+  - responses by status before and after SIGTERM, and connection errors after it
+  - drain duration (SIGTERM to exit), exit code, and whether it had to be SIGKILLed
+  - lost scoring tasks: posts created (201) whose scoring call never reached the agent
+  - whether the database pool was closed (the shutdown log line)
+Iterations repeat to shake out races; the exit code is 1 if any iteration
+dropped requests, lost scoring tasks, was killed or left the pool open.
+Uses a throwaway SQLite database unless --database-url is given.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# operation -> share of the traffic
+TRAFFIC_MIX = {
+    "list": 45,
+    "list_full": 10,
+    "get": 20,
+    "create": 15,
+    "patch": 10,
+}
+
+POOL_CLOSED_MESSAGE = "Database connections closed"
+STARTUP_TIMEOUT = 30
+
+
+@dataclass
+class Outcome:
+    """One request as the client saw it"""
+    op: str
+    started: float
+    finished: float
+    status: Optional[int] = None
+    error: Optional[str] = None
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None or self.status >= 500
+
+
+class StubAgent:
+    """Stand-in for the AI agent's POST /score that records which posts were sent"""
+
+    def __init__(self, latency: float):
+        self.scored = set()
+        lock = threading.Lock()
+        scored = self.scored
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                time.sleep(latency)
+                with lock:
+                    scored.add(body["post_id"])
+                payload = json.dumps({"status": "scoring", "post_id": body["post_id"]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_backend(port: int, env: dict, log_file, uvicorn_args: list) -> subprocess.Popen:
+    """Run main:app under uvicorn and wait until /health answers"""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), *uvicorn_args],
+        cwd=BACKEND_DIR, env=env, stdout=log_file, stderr=subprocess.STDOUT
+    )
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Backend exited during startup with code {process.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"Backend did not become healthy within {STARTUP_TIMEOUT}s")
+
+
+async def send(client: httpx.AsyncClient, op: str, rng: random.Random, post_ids: list) -> httpx.Response:
+    post_id = rng.choice(post_ids) if post_ids else 1
+    if op == "list":
+        return await client.get("/api/posts", params={"limit": 10})
+    if op == "list_full":
+        return await client.get("/api/posts", params={"limit": 50, "view": "full", "format": "html"})
+    if op == "get":
+        return await client.get(f"/api/posts/{post_id}")
+    if op == "create":
+        return await client.post("/api/posts", json={
+            "title": f"Soak post {rng.randrange(10 ** 6)}",
+            "content": "## Draining\n\n" + "Requests in flight must finish before the pool closes. " * 20,
+            "category": "Kubernetes Features",
+            "author": "soak",
+            "tags": "shutdown,soak"
+        })
+    return await client.patch(f"/api/posts/{post_id}", json={"title": f"Soak post {rng.randrange(10 ** 6)}"})
+
+
+async def worker(client, rng, state):
+    ops, weights = list(TRAFFIC_MIX), list(TRAFFIC_MIX.values())
+    while not state["stop"]:
+        op = rng.choices(ops, weights)[0]
+        outcome = Outcome(op=op, started=time.monotonic(), finished=0)
+        try:
+            response = await send(client, op, rng, state["post_ids"])
+            outcome.status = response.status_code
+            if op == "create" and response.status_code == 201:
+                post_id = response.json()["id"]
+                state["post_ids"].append(post_id)
+                state["created"].add(post_id)
+        except httpx.HTTPError as e:
+            outcome.error = type(e).__name__
+        outcome.finished = time.monotonic()
+        state["outcomes"].append(outcome)
+        if outcome.error and state["sigterm_at"]:
+            await asyncio.sleep(0.05)  # the port is closing, don't spin on refused connections
+
+
+async def run_iteration(args, port: int, agent: StubAgent, env: dict, log_path: str, rng: random.Random) -> dict:
+    with open(log_path, "w") as log_file:
+        process = start_backend(port, env, log_file, args.uvicorn_args)
+
+    state = {"stop": False, "sigterm_at": None, "post_ids": [], "created": set(), "outcomes": []}
+    agent.scored.clear()
+    limits = httpx.Limits(max_connections=args.workers, max_keepalive_connections=args.workers)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=args.grace_period) as client:
+        workers = [asyncio.create_task(worker(client, random.Random(rng.random()), state)) for _ in range(args.workers)]
+
+        # SIGTERM at a random point, so it lands in different phases of requests across iterations
+        await asyncio.sleep(args.warmup + rng.random())
+        state["sigterm_at"] = time.monotonic()
+        process.send_signal(signal.SIGTERM)
+
+        killed = False
+        while process.poll() is None:
+            if time.monotonic() - state["sigterm_at"] > args.grace_period:
+                process.kill()  # what the kubelet does when terminationGracePeriodSeconds runs out
+                killed = True
+                process.wait()
+                break
+            await asyncio.sleep(0.01)
+        exited_at = time.monotonic()
+
+        await asyncio.sleep(args.settle)
+        state["stop"] = True
+        await asyncio.gather(*workers)
+
+    with open(log_path) as log_file:
+        log = log_file.read()
+
+    sigterm_at = state["sigterm_at"]
+    outcomes = state["outcomes"]
+    in_flight = [o for o in outcomes if o.started < sigterm_at <= o.finished]
+    after = [o for o in outcomes if o.started >= sigterm_at]
+    lost = state["created"] - agent.scored
+
+    return {
+        "requests": len(outcomes),
+        "before": dict(Counter(o.status for o in outcomes if o.finished < sigterm_at)),
+        "in_flight_at_sigterm": len(in_flight),
+        "dropped": sum(o.failed for o in in_flight),
+        "dropped_by_op": dict(Counter(o.op for o in in_flight if o.failed)),
+        "dropped_by_reason": dict(Counter(o.error or o.status for o in in_flight if o.failed)),
+        "after_statuses": dict(Counter(o.status for o in after if o.status is not None)),
+        "after_errors": dict(Counter(o.error for o in after if o.error)),
+        "drain_seconds": round(exited_at - sigterm_at, 3),
+        "exit_code": process.returncode,
+        "killed": killed,
+        "created": len(state["created"]),
+        "lost_scoring_tasks": len(lost),
+        "lost_post_ids": sorted(lost)[:20],
+        "pool_closed": POOL_CLOSED_MESSAGE in log,
+        "log": log_path,
+    }
+
+
+def problems(result: dict) -> list:
+    found = []
+    if result["dropped"]:
+        found.append(f"{result['dropped']} dropped {result['dropped_by_op']} {result['dropped_by_reason']}")
+    if result["lost_scoring_tasks"]:
+        found.append(f"{result['lost_scoring_tasks']} lost scoring tasks")
+    if result["killed"]:
+        found.append("SIGKILLed after the grace period")
+    if not result["pool_closed"]:
+        found.append("pool not closed")
+    return found
+
+
+async def soak(args) -> list:
+    log_dir = tempfile.mkdtemp(prefix="shutdown-soak-")
+    database_url = args.database_url or f"sqlite:///{os.path.join(log_dir, 'soak.db')}"
+    agent = StubAgent(args.agent_latency)
+    env = {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        "AI_AGENT_URL": agent.url,
+        "AI_SCORING_ENABLED": "true",
+        "RATE_LIMIT_ENABLED": "false",
+    }
+    rng = random.Random(args.seed)
+
+    results = []
+    try:
+        for iteration in range(1, args.iterations + 1):
+            log_path = os.path.join(log_dir, f"backend-{iteration:03d}.log")
+            result = await run_iteration(args, free_port(), agent, env, log_path, rng)
+            results.append(result)
+            found = problems(result)
+            print(
+                f"[{iteration}/{args.iterations}] {result['requests']} requests, "
+                f"{result['in_flight_at_sigterm']} in flight at SIGTERM, drain {result['drain_seconds']:.2f}s, "
+                f"after SIGTERM {result['after_statuses'] or '-'} {result['after_errors'] or ''} "
+                f"-> {'; '.join(found) if found else 'clean'}",
+                flush=True
+            )
+    finally:
+        agent.close()
+
+    drains = sorted(result["drain_seconds"] for result in results)
+    print(
+        f"\n{len(results)} iterations: "
+        f"{sum(r['dropped'] for r in results)} dropped of {sum(r['in_flight_at_sigterm'] for r in results)} in flight, "
+        f"{sum(r['lost_scoring_tasks'] for r in results)} of {sum(r['created'] for r in results)} scoring tasks lost, "
+        f"{sum(r['killed'] for r in results)} killed, {sum(not r['pool_closed'] for r in results)} with the pool left open, "
+        f"drain {drains[0]:.2f}-{drains[-1]:.2f}s (median {drains[len(drains) // 2]:.2f}s). Logs in {log_dir}"
+    )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=20, help="concurrent client connections")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds of load before SIGTERM")
+    parser.add_argument("--grace-period", type=float, default=60, help="SIGKILL after this many seconds (terminationGracePeriodSeconds)")
+    parser.add_argument("--settle", type=float, default=0.5, help="seconds of load kept up after the process exits")
+    parser.add_argument("--agent-latency", type=float, default=0.5, help="seconds the stub agent takes per /score call")
+    parser.add_argument("--database-url", help="default: a throwaway SQLite file")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json-output", help="write per-iteration results here")
+    parser.add_argument("uvicorn_args", nargs=argparse.REMAINDER, help="extra uvicorn flags after --, e.g. -- --timeout-graceful-shutdown 25")
+    args = parser.parse_args()
+    args.uvicorn_args = [arg for arg in args.uvicorn_args if arg != "--"]
+
+    results = asyncio.run(soak(args))
+    if args.json_output:
+        with open(args.json_output, "w") as output:
+            json.dump(results, output, indent=2)
+    sys.exit(1 if any(problems(result) for result in results) else 0)
@@ -2,8 +2,16 @@
 API endpoint tests for blog platform
 """
 
+import ast
+import asyncio
+import os
+import signal
+import threading
+import time
+
 import pytest
 from fastapi import status
+from sqlalchemy.orm import sessionmaker
 
 
 class TestHealthEndpoints:
@@ -32,6 +40,130 @@ class TestHealthEndpoints:
         assert "http_request_duration_seconds" in response.text
 
 
+class TestServerTiming:
+    """Test the per-request Server-Timing breakdown"""
+
+    def test_server_timing_on_debug_header(self, client, sample_post_data):
+        """Test that X-Debug-Timing returns the phase breakdown"""
+        client.post("/api/posts", json=sample_post_data)
+
+        response = client.get("/api/posts", headers={"X-Debug-Timing": "1"})
+        assert response.status_code == status.HTTP_200_OK
+        phases = {
+            entry.split(";")[0].strip(): float(entry.split("dur=")[1])
+            for entry in response.headers["Server-Timing"].split(",")
+        }
+        assert {"db", "app", "parse", "serialize", "middleware", "total"} <= phases.keys()
+        assert phases["db"] > 0
+        assert phases["total"] >= phases["db"]
+
+    def test_no_server_timing_by_default(self, client):
+        """Test that the header is off unless requested"""
+        response = client.get("/api/categories")
+        assert "Server-Timing" not in response.headers
+
+    def test_phase_metrics_exported(self, client):
+        """Test that per-phase histograms are exposed to Prometheus"""
+        client.get("/api/categories")
+        response = client.get("/metrics")
+        assert 'http_request_phase_duration_seconds_count{endpoint="/api/categories"' in response.text
+
+
+class TestLoopLagMonitor:
+    """Test event loop lag measurement and stall reports"""
+
+    def test_lag_histogram_exported(self, client):
+        """Test that loop lag is recorded once the app is running"""
+        time.sleep(0.3)
+        response = client.get("/metrics")
+        count = next(
+            float(line.split()[-1]) for line in response.text.splitlines()
+            if line.startswith("event_loop_lag_seconds_count")
+        )
+        assert count > 0
+
+    def test_stall_logs_blocking_stack_and_request(self, caplog):
+        """Test that a blocking call is reported with its stack and the request it served"""
+        from main import LoopLagMonitor, current_request, tracking_task_factory
+
+        async def blocking_handler():
+            time.sleep(0.3)
+
+        async def serve():
+            asyncio.get_running_loop().set_task_factory(tracking_task_factory)
+            monitor = LoopLagMonitor(interval=0.01, threshold=0.05)
+            monitor.start()
+            current_request.set(("42", "GET /api/slow"))
+            await asyncio.create_task(blocking_handler())
+            monitor.stop()
+
+        with caplog.at_level("WARNING", logger="main"):
+            asyncio.run(serve())
+
+        stalls = [record.getMessage() for record in caplog.records if "Event loop blocked" in record.getMessage()]
+        assert len(stalls) == 1
+        assert "GET /api/slow (request 42)" in stalls[0]
+        assert "in blocking_handler" in stalls[0]
+
+    def test_ai_agent_copy_matches(self):
+        """Test that the AI agent's copy of the monitor and debug endpoints is the same code"""
+        def shared_section(path):
+            with open(path) as f:
+                source = f.read()
+            end = next(node.end_lineno for node in ast.parse(source).body if getattr(node, "name", None) == "debug_tasks")
+            lines = source.splitlines()
+            return lines[lines.index("# Event loop lag monitoring"):end]
+
+        backend_dir = os.path.dirname(os.path.abspath(__file__))
+        assert shared_section(os.path.join(backend_dir, "main.py")) == shared_section(
+            os.path.join(backend_dir, os.pardir, "ai-agent", "main.py")
+        )
+
+
+class TestDebugEndpoints:
+    """Test the gated profiling and task dump endpoints"""
+
+    @pytest.fixture
+    def debug_enabled(self, monkeypatch):
+        import main
+        monkeypatch.setattr(main, "DEBUG_ENDPOINTS_ENABLED", True)
+        monkeypatch.setattr(main, "DEBUG_ADMIN_TOKEN", "secret")
+
+    def test_debug_disabled_by_default(self, client):
+        """Test that debug endpoints are hidden unless enabled"""
+        response = client.get("/debug/tasks", headers={"X-Admin-Token": "secret"})
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_debug_requires_token(self, client, debug_enabled):
+        """Test that the admin token is required"""
+        assert client.get("/debug/tasks").status_code == status.HTTP_403_FORBIDDEN
+        response = client.get("/debug/tasks", headers={"X-Admin-Token": "wrong"})
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_profile_returns_collapsed_stacks(self, client, debug_enabled):
+        """Test that the sampling profiler returns flamegraph-ready lines"""
+        response = client.get("/debug/profile?seconds=0.2", headers={"X-Admin-Token": "secret"})
+        assert response.status_code == status.HTTP_200_OK
+        lines = response.text.strip().splitlines()
+        assert lines
+        stack, count = lines[0].rsplit(" ", 1)
+        assert ";" in stack
+        assert int(count) > 0
+
+    def test_profile_window_is_bounded(self, client, debug_enabled):
+        """Test that overly long profiles are rejected"""
+        response = client.get("/debug/profile?seconds=600", headers={"X-Admin-Token": "secret"})
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_tasks_dump(self, client, debug_enabled):
+        """Test that pending asyncio tasks are listed"""
+        response = client.get("/debug/tasks", headers={"X-Admin-Token": "secret"})
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["total"] >= 1
+        assert {"name", "coroutine", "age_seconds", "stack"} <= data["tasks"][0].keys()
+
+
 class TestRootEndpoint:
     """Test root endpoint"""
 
@@ -167,6 +299,437 @@ class TestBlogPostCRUD:
         assert response.json()["detail"] == "Post not found"
 
 
+class TestPostViews:
+    """Test summary and full list views"""
+
+    def test_list_summary_omits_content(self, client, sample_post_data):
+        """Test that the default list view leaves out the post body"""
+        client.post("/api/posts", json=sample_post_data)
+
+        posts = client.get("/api/posts").json()
+        assert posts[0]["title"] == sample_post_data["title"]
+        assert "content" not in posts[0]
+
+    def test_list_full_includes_content(self, client, sample_post_data):
+        """Test that view=full includes the post body"""
+        client.post("/api/posts", json=sample_post_data)
+
+        posts = client.get("/api/posts?view=full").json()
+        assert posts[0]["content"] == sample_post_data["content"]
+
+    def test_invalid_view(self, client):
+        """Test that unknown views are rejected"""
+        response = client.get("/api/posts?view=everything")
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+class TestTotalCount:
+    """Test pagination totals on list responses"""
+
+    def test_counter_total(self, client, multiple_posts_data):
+        """Test that the maintained counters report the total and per-category counts"""
+        for post_data in multiple_posts_data:
+            client.post("/api/posts", json=post_data)
+
+        response = client.get("/api/posts?limit=1")
+        assert len(response.json()) == 1
+        assert response.headers["X-Total-Count"] == "3"
+        assert response.headers["X-Total-Count-Accuracy"] == "counter"
+
+        response = client.get("/api/posts?category=CI%2FCD+Workflows")
+        assert response.headers["X-Total-Count"] == "1"
+
+    def test_counter_follows_updates_and_deletes(self, client, multiple_posts_data):
+        """Test that category changes and deletes keep the counters in sync"""
+        ids = [client.post("/api/posts", json=post_data).json()["id"] for post_data in multiple_posts_data]
+
+        client.patch(f"/api/posts/{ids[0]}", json={"category": "CI/CD Workflows"})
+        client.delete(f"/api/posts/{ids[1]}")
+
+        for mode in ("counter", "exact"):
+            response = client.get(f"/api/posts?category=CI%2FCD+Workflows&count={mode}")
+            assert response.headers["X-Total-Count"] == "1"
+        assert client.get("/api/posts").headers["X-Total-Count"] == "2"
+
+    def test_score_filters_counted_exactly(self, client, db_session, multiple_posts_data):
+        """Test that filters the counters do not cover fall back to an exact count"""
+        from main import BlogPost
+
+        ids = [client.post("/api/posts", json=post_data).json()["id"] for post_data in multiple_posts_data]
+        db_session.query(BlogPost).filter(BlogPost.id == ids[0]).update({"ai_score": 90})
+        db_session.commit()
+
+        response = client.get("/api/posts?min_score=50")
+        assert response.headers["X-Total-Count"] == "1"
+        assert response.headers["X-Total-Count-Accuracy"] == "exact"
+
+    def test_estimate_falls_back_to_counter(self, client, sample_post_data):
+        """Test that estimate mode uses the counters where no planner statistics exist"""
+        client.post("/api/posts", json=sample_post_data)
+
+        response = client.get("/api/posts?count=estimate")
+        assert response.headers["X-Total-Count"] == "1"
+        assert response.headers["X-Total-Count-Accuracy"] == "counter"
+
+    def test_count_none(self, client):
+        """Test that count=none skips the total"""
+        response = client.get("/api/posts?count=none")
+        assert response.status_code == status.HTTP_200_OK
+        assert "X-Total-Count" not in response.headers
+
+
+class TestScoreRanking:
+    """Test sorting and filtering by AI score and the leaderboard"""
+
+    @pytest.fixture
+    def scored_posts(self, client, db_session, multiple_posts_data):
+        """Create posts scored 70, unscored and 90 (in creation order)"""
+        from main import BlogPost
+
+        ids = [client.post("/api/posts", json=data).json()["id"] for data in multiple_posts_data]
+        for post_id, score in zip(ids, [70, None, 90]):
+            db_session.query(BlogPost).filter(BlogPost.id == post_id).update({"ai_score": score})
+        db_session.commit()
+        return ids
+
+    def test_sort_by_score(self, client, scored_posts):
+        """Test that sort=score ranks by score with unscored posts last"""
+        posts = client.get("/api/posts?sort=score").json()
+        assert [post["ai_score"] for post in posts] == [90, 70, None]
+
+    def test_min_score_filter(self, client, scored_posts):
+        """Test filtering by minimum score"""
+        posts = client.get("/api/posts?min_score=80").json()
+        assert [post["id"] for post in posts] == [scored_posts[2]]
+
+    def test_scored_filter(self, client, scored_posts):
+        """Test filtering on whether a post has been scored"""
+        assert [p["id"] for p in client.get("/api/posts?scored=false").json()] == [scored_posts[1]]
+        assert len(client.get("/api/posts?scored=true").json()) == 2
+
+    def test_top_posts(self, client, scored_posts):
+        """Test the leaderboard, overall and per category"""
+        response = client.get("/api/posts/top")
+        assert response.status_code == status.HTTP_200_OK
+        assert [post["ai_score"] for post in response.json()] == [90, 70]
+
+        posts = client.get("/api/posts/top?category=Security+Best+Practices").json()
+        assert [post["id"] for post in posts] == [scored_posts[0]]
+
+    def test_top_posts_cache_invalidated_by_events(self, client, db_session, scored_posts):
+        """Test that post events drop cached leaderboards"""
+        from main import BlogPost, post_event_broker
+
+        assert len(client.get("/api/posts/top").json()) == 2
+
+        db_session.query(BlogPost).filter(BlogPost.id == scored_posts[1]).update({"ai_score": 50})
+        db_session.commit()
+        assert len(client.get("/api/posts/top").json()) == 2
+
+        post_event_broker.publish({"type": "scored", "post_id": scored_posts[1], "ai_score": 50})
+        assert len(client.get("/api/posts/top").json()) == 3
+
+
+class TestRenderedContent:
+    """Test Markdown pre-rendering on write"""
+
+    markdown_post = {
+        "title": "Rendering",
+        "content": "# Pods\n\nA **pod** runs containers.<script>alert(1)</script>\n\n```yaml\nkind: Pod\n```",
+        "category": "Kubernetes Features",
+        "author": "SHA"
+    }
+
+    def test_html_format_is_sanitized(self, client):
+        """Test that format=html returns rendered, sanitized HTML"""
+        post_id = client.post("/api/posts", json=self.markdown_post).json()["id"]
+
+        data = client.get(f"/api/posts/{post_id}?format=html").json()
+        assert "<h1>Pods</h1>" in data["content_html"]
+        assert "<strong>pod</strong>" in data["content_html"]
+        assert "<script>" not in data["content_html"]
+        assert "content" not in data
+
+    def test_excerpt_and_reading_time_in_list(self, client):
+        """Test that list summaries carry a plain-text excerpt and reading time"""
+        client.post("/api/posts", json=self.markdown_post)
+
+        post = client.get("/api/posts").json()[0]
+        assert post["excerpt"].startswith("Pods A pod runs containers.")
+        assert "**" not in post["excerpt"]
+        assert post["reading_time_minutes"] == 1
+
+    def test_long_excerpt_is_truncated(self, client):
+        """Test that excerpts are cut at a word boundary"""
+        long_post = {**self.markdown_post, "content": "word " * 1000}
+        post = client.post("/api/posts", json=long_post).json()
+        assert len(post["excerpt"]) <= 201
+        assert post["excerpt"].endswith("…")
+        assert post["reading_time_minutes"] == 5
+
+    def test_patch_content_rerenders(self, client, monkeypatch):
+        """Test that changing the body refreshes the rendered variants"""
+        import main
+
+        async def fake_trigger(post_id):
+            pass
+
+        monkeypatch.setattr(main, "trigger_ai_scoring", fake_trigger)
+        post_id = client.post("/api/posts", json=self.markdown_post).json()["id"]
+
+        client.patch(f"/api/posts/{post_id}", json={"content": "*Services* expose pods"})
+        data = client.get(f"/api/posts/{post_id}?format=html").json()
+        assert "<em>Services</em>" in data["content_html"]
+        assert data["excerpt"] == "Services expose pods"
+
+
+class TestBatchGet:
+    """Test fetching many posts by id in one call"""
+
+    def test_batch_get_preserves_order(self, client, multiple_posts_data):
+        """Test that posts come back in request order with missing ids reported"""
+        ids = [client.post("/api/posts", json=data).json()["id"] for data in multiple_posts_data]
+
+        requested = [ids[2], 9999, ids[0], ids[2]]
+        response = client.post("/api/posts/batch-get", json={"ids": requested})
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert [post["id"] for post in data["posts"]] == [ids[2], ids[0]]
+        assert data["missing"] == [9999]
+
+    def test_batch_get_empty(self, client):
+        """Test an empty id list"""
+        response = client.post("/api/posts/batch-get", json={"ids": []})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == {"posts": [], "missing": []}
+
+    def test_batch_get_too_many_ids(self, client):
+        """Test that the number of ids is bounded"""
+        response = client.post("/api/posts/batch-get", json={"ids": list(range(1, 1000))})
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_batch_get_duplicates_count_toward_limit(self, client):
+        """Test that the limit applies to the raw list, before duplicates are collapsed"""
+        response = client.post("/api/posts/batch-get", json={"ids": [1] * 1000})
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+class TestPostChanges:
+    """Test the delta-sync endpoint"""
+
+    def test_initial_sync_returns_everything(self, client, multiple_posts_data):
+        """Test that since=0 returns all posts in change order"""
+        ids = [client.post("/api/posts", json=post_data).json()["id"] for post_data in multiple_posts_data]
+
+        response = client.get("/api/posts/changes")
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert [post["id"] for post in data["posts"]] == ids
+        assert data["deleted"] == []
+        assert data["has_more"] is False
+        assert "content" not in data["posts"][0]
+
+    def test_only_changes_after_cursor(self, client, multiple_posts_data):
+        """Test that updates and deletes after the cursor are returned, and nothing else"""
+        ids = [client.post("/api/posts", json=post_data).json()["id"] for post_data in multiple_posts_data]
+        cursor = client.get("/api/posts/changes").json()["cursor"]
+
+        client.patch(f"/api/posts/{ids[0]}", json={"title": "Renamed"})
+        client.delete(f"/api/posts/{ids[1]}")
+
+        data = client.get(f"/api/posts/changes?since={cursor}").json()
+        assert [post["title"] for post in data["posts"]] == ["Renamed"]
+        assert data["deleted"] == [ids[1]]
+        assert data["cursor"] > cursor
+
+        assert client.get(f"/api/posts/changes?since={data['cursor']}").json() == {
+            "posts": [], "deleted": [], "cursor": data["cursor"], "has_more": False
+        }
+
+    def test_paging(self, client, multiple_posts_data):
+        """Test that limit pages through changes with has_more"""
+        for post_data in multiple_posts_data:
+            client.post("/api/posts", json=post_data)
+
+        first = client.get("/api/posts/changes?limit=2").json()
+        assert len(first["posts"]) == 2
+        assert first["has_more"] is True
+
+        second = client.get(f"/api/posts/changes?limit=2&since={first['cursor']}&view=full").json()
+        assert len(second["posts"]) == 1
+        assert second["has_more"] is False
+        assert second["posts"][0]["content"] == multiple_posts_data[2]["content"]
+
+    def test_cursor_does_not_pass_a_change_still_committing(self, client, db_session, multiple_posts_data):
+        """Test that a change whose sequence value was taken first but that commits last is not skipped"""
+        if db_session.get_bind().dialect.name != "postgresql":
+            pytest.skip("concurrent writers need PostgreSQL (set TEST_DATABASE_URL)")
+        import main
+
+        ids = [client.post("/api/posts", json=post_data).json()["id"] for post_data in multiple_posts_data[:2]]
+        cursor = client.get("/api/posts/changes").json()["cursor"]
+        writers = sessionmaker(bind=db_session.get_bind())
+        slow, fast = writers(), writers()
+
+        def write(session, post_id, title):
+            posts = session.query(main.BlogPost).filter(main.BlogPost.id == post_id)
+            posts.update({"title": title}, synchronize_session=False)
+            posts.update({"change_seq": main.next_change_seq(session)}, synchronize_session=False)
+
+        def write_fast():
+            write(fast, ids[1], "Fast")
+            fast.commit()
+
+        try:
+            # The slow writer takes its sequence value first and commits last
+            write(slow, ids[0], "Slow")
+            fast_writer = threading.Thread(target=write_fast)
+            fast_writer.start()
+            fast_writer.join(timeout=0.5)
+
+            # A client polling in between must not be handed a cursor past the slow change
+            seen = client.get(f"/api/posts/changes?since={cursor}").json()
+            slow.commit()
+            fast_writer.join(timeout=5)
+            assert not fast_writer.is_alive()
+            rest = client.get(f"/api/posts/changes?since={seen['cursor']}").json()
+        finally:
+            slow.close()
+            fast.close()
+
+        assert [post["title"] for post in seen["posts"] + rest["posts"]] == ["Slow", "Fast"]
+
+
+class TestPatchPost:
+    """Test partial updates via PATCH"""
+
+    @pytest.fixture
+    def scoring_calls(self, monkeypatch):
+        """Record AI scoring triggers instead of calling the AI agent"""
+        import main
+        calls = []
+
+        async def fake_trigger(post_id):
+            calls.append(post_id)
+
+        monkeypatch.setattr(main, "trigger_ai_scoring", fake_trigger)
+        return calls
+
+    def test_patch_updates_only_sent_fields(self, client, sample_post_data, scoring_calls):
+        """Test that fields missing from the body are left untouched"""
+        post_id = client.post("/api/posts", json=sample_post_data).json()["id"]
+
+        response = client.patch(f"/api/posts/{post_id}", json={"title": "Patched title"})
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["title"] == "Patched title"
+        assert data["content"] == sample_post_data["content"]
+        assert data["tags"] == sample_post_data["tags"]
+        assert "ETag" in response.headers
+
+    def test_patch_metadata_does_not_rescore(self, client, sample_post_data, scoring_calls):
+        """Test that changing only tags skips AI re-scoring"""
+        post_id = client.post("/api/posts", json=sample_post_data).json()["id"]
+        scoring_calls.clear()
+
+        response = client.patch(f"/api/posts/{post_id}", json={"tags": "kubernetes"})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["tags"] == "kubernetes"
+        assert scoring_calls == []
+
+        response = client.patch(f"/api/posts/{post_id}", json={"content": "New body"})
+        assert response.json()["content"] == "New body"
+        assert scoring_calls == [post_id]
+
+    def test_patch_if_match(self, client, sample_post_data, scoring_calls):
+        """Test optimistic concurrency with If-Match"""
+        post_id = client.post("/api/posts", json=sample_post_data).json()["id"]
+        etag = client.get(f"/api/posts/{post_id}").headers["ETag"]
+
+        response = client.patch(
+            f"/api/posts/{post_id}", json={"title": "First"}, headers={"If-Match": etag}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["ETag"] != etag
+
+        # The old ETag is now stale
+        response = client.patch(
+            f"/api/posts/{post_id}", json={"title": "Second"}, headers={"If-Match": etag}
+        )
+        assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+        assert client.get(f"/api/posts/{post_id}").json()["title"] == "First"
+
+    def test_patch_null_required_field(self, client, sample_post_data, scoring_calls):
+        """Test that required fields cannot be nulled out"""
+        post_id = client.post("/api/posts", json=sample_post_data).json()["id"]
+
+        response = client.patch(f"/api/posts/{post_id}", json={"title": None})
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_patch_nonexistent_post(self, client):
+        """Test patching a post that doesn't exist"""
+        response = client.patch("/api/posts/9999", json={"title": "Nope"})
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+class TestPostEvents:
+    """Test post change events published for the SSE stream"""
+
+    def test_writes_publish_events(self, client, sample_post_data, monkeypatch):
+        """Test that create, patch and delete reach event subscribers"""
+        import main
+
+        async def fake_trigger(post_id):
+            pass
+
+        monkeypatch.setattr(main, "trigger_ai_scoring", fake_trigger)
+        queue = main.post_event_broker.subscribe()
+        try:
+            post_id = client.post("/api/posts", json=sample_post_data).json()["id"]
+            client.patch(f"/api/posts/{post_id}", json={"tags": "k8s"})
+            client.delete(f"/api/posts/{post_id}")
+
+            events = [queue.get_nowait() for _ in range(queue.qsize())]
+        finally:
+            main.post_event_broker.unsubscribe(queue)
+
+        assert [event["type"] for event in events] == ["created", "updated", "deleted"]
+        assert all(event["post_id"] == post_id for event in events)
+        assert events[1]["fields"] == ["tags"]
+
+    def test_slow_subscriber_buffer_is_bounded(self):
+        """Test that a full client buffer drops its oldest events"""
+        from main import PostEventBroker
+
+        broker = PostEventBroker(buffer_size=2)
+        queue = broker.subscribe()
+        for post_id in range(5):
+            broker.publish({"type": "updated", "post_id": post_id})
+
+        assert queue.qsize() == 2
+        assert [queue.get_nowait()["post_id"] for _ in range(2)] == [3, 4]
+
+    def test_disconnect_releases_subscriber_before_heartbeat(self, monkeypatch):
+        """Test that a closed stream unsubscribes without waiting for the next heartbeat"""
+        import main
+
+        monkeypatch.setattr(main, "is_shutting_down", False)
+        monkeypatch.setattr(main, "SSE_DISCONNECT_CHECK_SECONDS", 0.01)
+
+        class DisconnectedRequest:
+            async def is_disconnected(self):
+                return True
+
+        async def consume():
+            response = await main.post_events(DisconnectedRequest())
+            assert len(main.post_event_broker.subscribers) == 1
+            return [chunk async for chunk in response.body_iterator]
+
+        chunks = asyncio.run(asyncio.wait_for(consume(), timeout=main.SSE_HEARTBEAT_SECONDS / 3))
+        assert chunks == [f"retry: {main.SSE_HEARTBEAT_SECONDS * 1000}\n\n"]
+        assert not main.post_event_broker.subscribers
+
+
 class TestCategories:
     """Test categories endpoint"""
 
@@ -203,6 +766,116 @@ class TestValidation:
         assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
 
 
+class TestConcurrencyLimiting:
+    """Test adaptive concurrency limiting and load shedding"""
+
+    @staticmethod
+    def make_limiter(**overrides):
+        from main import AdaptiveConcurrencyLimiter
+
+        settings = dict(
+            min_limit=2, max_limit=10, target_latency=0.1,
+            queue_size=0, queue_timeout=0.05, write_reserve=0.2
+        )
+        settings.update(overrides)
+        return AdaptiveConcurrencyLimiter(**settings)
+
+    def test_reads_leave_headroom_for_writes(self):
+        """Test that reads cannot use the share reserved for writes"""
+        limiter = self.make_limiter()
+
+        async def scenario():
+            reads = [await limiter.acquire("read") for _ in range(10)]
+            writes = [await limiter.acquire("write") for _ in range(3)]
+            return reads, writes
+
+        reads, writes = asyncio.run(scenario())
+        assert reads.count(True) == 8
+        assert writes == [True, True, False]
+
+    def test_limit_adapts_to_latency(self):
+        """Test additive increase on fast requests and multiplicative decrease on slow ones"""
+        limiter = self.make_limiter()
+        limiter.limit = 5.0
+
+        limiter.in_flight = 1
+        limiter.release(latency=0.01)
+        assert limiter.limit == pytest.approx(5.2)
+
+        limiter.in_flight = 1
+        limiter.release(latency=1.0)
+        assert limiter.limit == pytest.approx(4.68)
+
+        limiter.limit = 2.0
+        limiter.in_flight = 1
+        limiter.release(latency=0.01, failed=True)
+        assert limiter.limit >= 2
+
+    def test_queued_request_gets_released_slot(self):
+        """Test that a queued request is admitted when a slot frees up"""
+        limiter = self.make_limiter(max_limit=1, min_limit=1, queue_size=5, queue_timeout=1.0, write_reserve=0)
+
+        async def scenario():
+            assert await limiter.acquire("read")
+            waiting = asyncio.ensure_future(limiter.acquire("read"))
+            await asyncio.sleep(0)
+            limiter.release(latency=0.01)
+            return await waiting
+
+        assert asyncio.run(scenario()) is True
+        assert limiter.in_flight == 1
+
+    def test_cancelled_waiter_returns_handed_over_slot(self):
+        """Test that a request cancelled after being handed a slot gives it back to the next in line"""
+        limiter = self.make_limiter(max_limit=1, min_limit=1, queue_size=5, queue_timeout=1.0, write_reserve=0)
+
+        async def scenario():
+            assert await limiter.acquire("read")
+            first = asyncio.ensure_future(limiter.acquire("read"))
+            second = asyncio.ensure_future(limiter.acquire("read"))
+            await asyncio.sleep(0)
+            # The first waiter is cancelled and handed the slot before it gets to run again
+            first.cancel()
+            limiter.release(latency=0.01)
+            with pytest.raises(asyncio.CancelledError):
+                await first
+            return await second
+
+        assert asyncio.run(scenario()) is True
+        assert limiter.in_flight == 1
+        assert limiter._queued() == 0
+
+    def test_overload_returns_503(self, client, monkeypatch):
+        """Test that shed requests get 503 with Retry-After while probes still pass"""
+        import main
+
+        limiter = self.make_limiter()
+        limiter.in_flight = 100
+        monkeypatch.setattr(main, "concurrency_limiter", limiter)
+
+        response = client.get("/api/posts")
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.headers["Retry-After"] == "1"
+        assert client.get("/health").status_code == status.HTTP_200_OK
+        assert client.get("/debug/tasks").status_code != status.HTTP_503_SERVICE_UNAVAILABLE
+
+
+class TestGracefulShutdown:
+    """Test SIGTERM handling"""
+
+    def test_sigterm_is_handed_to_server(self, monkeypatch):
+        """Test that SIGTERM marks the app as shutting down and still reaches the server's handler"""
+        import main
+
+        received = []
+        monkeypatch.setattr(main, "is_shutting_down", False)
+        monkeypatch.setitem(main.previous_signal_handlers, signal.SIGTERM, lambda signum, frame: received.append(signum))
+
+        main.handle_sigterm(signal.SIGTERM, None)
+        assert main.is_shutting_down
+        assert received == [signal.SIGTERM]
+
+
 class TestRateLimiting:
     """Test rate limiting functionality"""
 
@@ -0,0 +1,168 @@
+"""
+Query plan regression tests
+
+Each read endpoint is driven against a seeded database while the SQL it runs
+is captured; every statement is then EXPLAINed and the test fails if the plan
+falls back to a full table scan or an explicit sort (a missing or unusable
+index). Runs against SQLite by default; with TEST_DATABASE_URL pointing at
+PostgreSQL the planner is run with enable_seqscan and enable_sort off, so any
+Seq Scan or Sort left in the plan has no index alternative.
+"""
+
+import re
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+import main
+from main import BlogPost, PostTombstone, recount_category_counts
+from migrate import load_migrations, split_statements
+
+# Scanning these is the right plan - a handful of rows at most
+SMALL_TABLES = {"post_category_counts"}
+
+SQLITE_FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)$")
+SQLITE_SORT = re.compile(r"USE TEMP B-TREE FOR (?:ORDER|GROUP) BY")
+POSTGRES_FULL_SCAN = re.compile(r"Seq Scan on (\w+)")
+POSTGRES_SORT = re.compile(r"(?:^|->\s+)(?:Incremental )?Sort\b")
+
+CATEGORIES = ["Kubernetes Features", "Security Best Practices", "CI/CD Workflows"]
+
+ENDPOINTS = [
+    ("GET", "/api/posts"),
+    ("GET", "/api/posts?category=Security+Best+Practices"),
+    ("GET", "/api/posts?category=Security+Best+Practices&count=exact"),
+    ("GET", "/api/posts?view=full&format=html"),
+    ("GET", "/api/posts?sort=score"),
+    ("GET", "/api/posts?sort=score&category=Security+Best+Practices"),
+    ("GET", "/api/posts?sort=score&min_score=50"),
+    ("GET", "/api/posts?sort=score&scored=false"),
+    ("GET", "/api/posts/top"),
+    ("GET", "/api/posts/top?category=Security+Best+Practices"),
+    ("GET", "/api/posts/changes?since=40"),
+    ("GET", "/api/posts/changes?since=40&view=full"),
+    ("GET", "/api/posts/7"),
+    ("GET", "/api/posts/7?format=html"),
+    ("POST", "/api/posts/batch-get"),
+]
+
+
+@pytest.fixture
+def seeded_posts(db_session):
+    """60 posts over three categories, two thirds of them scored, plus tombstones"""
+    start = datetime(2024, 1, 1)
+    for i in range(60):
+        post = BlogPost(
+            title=f"Post {i}",
+            category=CATEGORIES[i % len(CATEGORIES)],
+            author="SHA",
+            tags="kubernetes",
+            created_at=start + timedelta(hours=i),
+            updated_at=start + timedelta(hours=i),
+            ai_score=(i * 7) % 100 if i % 3 else None,
+            change_seq=i + 1
+        )
+        post.content = f"# Post {i}\n\nBody of post {i}."
+        db_session.add(post)
+    for post_id in range(100, 105):
+        db_session.add(PostTombstone(post_id=post_id, change_seq=60 + post_id))
+    db_session.commit()
+    recount_category_counts(db_session)
+    main.top_posts_cache.clear()
+
+
+@pytest.fixture
+def captured_sql(db_session):
+    """Read statements executed while the test runs, as (statement, parameters)"""
+    statements = []
+    engine = db_session.get_bind()
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    yield statements
+    event.remove(engine, "before_cursor_execute", capture)
+
+
+def plan_problems(db_session, statement, parameters):
+    """Full scans of non-trivial tables and explicit sorts in a statement's plan"""
+    conn = db_session.connection()
+    problems = []
+
+    if conn.dialect.name == "postgresql":
+        conn.exec_driver_sql("SET enable_seqscan = off")
+        conn.exec_driver_sql("SET enable_sort = off")
+        try:
+            plan = [row[0] for row in conn.exec_driver_sql("EXPLAIN " + statement, parameters)]
+        finally:
+            conn.exec_driver_sql("RESET enable_seqscan")
+            conn.exec_driver_sql("RESET enable_sort")
+        for line in plan:
+            scan = POSTGRES_FULL_SCAN.search(line)
+            if (scan and scan.group(1) not in SMALL_TABLES) or POSTGRES_SORT.search(line.strip()):
+                problems.append(line.strip())
+    else:
+        for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters):
+            detail = row[-1]
+            scan = SQLITE_FULL_SCAN.match(detail)
+            if (scan and scan.group(1) not in SMALL_TABLES) or SQLITE_SORT.search(detail):
+                problems.append(detail)
+
+    return problems
+
+
+class TestQueryPlans:
+    """Test that every endpoint query is served by an index"""
+
+    @pytest.mark.parametrize("method, url", ENDPOINTS)
+    def test_endpoint_queries_use_indexes(self, client, db_session, seeded_posts, captured_sql, method, url):
+        """Test that no query behind the endpoint scans or sorts a whole table"""
+        if method == "POST":
+            response = client.post(url, json={"ids": [3, 9, 27, 999]})
+        else:
+            response = client.get(url)
+        assert response.status_code == 200
+        assert captured_sql, "endpoint ran no queries"
+
+        failures = {
+            statement: problems
+            for statement, parameters in captured_sql
+            if (problems := plan_problems(db_session, statement, parameters))
+        }
+        assert not failures, f"{method} {url} has unindexed query plans: {failures}"
+
+
+class TestMigrations:
+    """Test that migrations/ creates the schema the models describe"""
+
+    def test_versions_are_unique_and_ordered(self):
+        """Test migration file numbering"""
+        versions = [version for version, _, _ in load_migrations()]
+        assert versions == sorted(set(versions))
+        assert versions[0] == 1
+
+    def test_models_match_migrations(self):
+        """Test that every table and index the models declare is created by a migration"""
+        migrations_sql = "\n".join(sql for _, _, sql in load_migrations())
+
+        for table in main.Base.metadata.sorted_tables:
+            assert re.search(rf"CREATE TABLE IF NOT EXISTS {table.name}\b", migrations_sql), table.name
+            for index in table.indexes:
+                assert re.search(rf"CREATE INDEX (?:CONCURRENTLY )?IF NOT EXISTS {index.name}\b", migrations_sql), index.name
+
+    def test_split_statements(self):
+        """Test that scripts are split on top-level semicolons only"""
+        sql = """
+            -- comment; with a semicolon
+            CREATE TABLE t (note TEXT DEFAULT 'a;b');
+            DO $$ BEGIN PERFORM 1; PERFORM 2; END $$;
+            SELECT 'it''s; fine'
+        """
+        assert split_statements(sql) == [
+            "CREATE TABLE t (note TEXT DEFAULT 'a;b')",
+            "DO $$ BEGIN PERFORM 1; PERFORM 2; END $$",
+            "SELECT 'it''s; fine'",
+        ]
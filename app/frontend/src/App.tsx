@@ -5,7 +5,10 @@ import './App.css'
 interface BlogPost {
   id: number
   title: string
-  content: string
+  content?: string  // only present on single-post and view=full responses
+  content_html?: string  // pre-rendered, sanitized body (format=html)
+  excerpt?: string | null
+  reading_time_minutes?: number | null
   category: string
   author: string
   tags: string | null
@@ -36,6 +39,7 @@ const categories = [
 
 function App() {
   const [posts, setPosts] = useState<BlogPost[]>([])
+  const [totalPosts, setTotalPosts] = useState<number | null>(null)
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState<string | null>(null)
   const [showForm, setShowForm] = useState(false)
@@ -53,10 +57,29 @@ function App() {
     fetchPosts()
   }, [])
 
+  // Live updates pushed by the backend instead of polling for AI scores
+  useEffect(() => {
+    const events = new EventSource('/api/events')
+
+    events.addEventListener('scored', (e) => {
+      const { post_id, ai_score } = JSON.parse((e as MessageEvent).data)
+      const scoredAt = new Date().toISOString()
+      setPosts((current) =>
+        current.map((post) =>
+          post.id === post_id ? { ...post, ai_score, last_scored_at: scoredAt } : post
+        )
+      )
+    })
+
+    return () => events.close()
+  }, [])
+
   const fetchPosts = async () => {
     try {
       const response = await axios.get('/api/posts')
       setPosts(response.data)
+      const total = response.headers['x-total-count']
+      setTotalPosts(total !== undefined ? Number(total) : null)
       setLoading(false)
     } catch (err) {
       setError('Failed to fetch blog posts')
@@ -94,11 +117,34 @@ function App() {
     }
   }
 
-  const handleEdit = (post: BlogPost) => {
+  const fetchFullPost = async (post: BlogPost): Promise<BlogPost> => {
+    if (post.content !== undefined) return post
+    const response = await axios.get(`/api/posts/${post.id}`)
+    return response.data
+  }
+
+  const handleSelect = async (summary: BlogPost) => {
+    try {
+      // Rendered once on the server when the post was written
+      const response = await axios.get(`/api/posts/${summary.id}?format=html`)
+      setSelectedPost(response.data)
+    } catch (err) {
+      alert('Failed to load post')
+    }
+  }
+
+  const handleEdit = async (summary: BlogPost) => {
+    let post: BlogPost
+    try {
+      post = await fetchFullPost(summary)
+    } catch (err) {
+      alert('Failed to load post')
+      return
+    }
     setEditingPost(post)
     setFormData({
       title: post.title,
-      content: post.content,
+      content: post.content || '',
       category: post.category,
       author: post.author,
       tags: post.tags || ''
@@ -297,13 +343,20 @@ function App() {
                     <span>By {selectedPost.author}</span>
                     <span>•</span>
                     <span>{new Date(selectedPost.created_at).toLocaleDateString()}</span>
+                    {selectedPost.reading_time_minutes && (
+                      <>
+                        <span>•</span>
+                        <span>{selectedPost.reading_time_minutes} min read</span>
+                      </>
+                    )}
                   </div>
                 </div>
                 <button className="btn-close" onClick={() => setSelectedPost(null)}>✕</button>
               </div>
-              <div className="post-content">
-                {selectedPost.content}
-              </div>
+              <div
+                className="post-content"
+                dangerouslySetInnerHTML={{ __html: selectedPost.content_html || '' }}
+              />
               {selectedPost.tags && (
                 <div className="post-tags">
                   {selectedPost.tags.split(',').map((tag, idx) => (
@@ -334,7 +387,7 @@ function App() {
             </div>
           ) : (
             posts.map((post) => (
-              <article key={post.id} className="post-card" onClick={() => setSelectedPost(post)}>
+              <article key={post.id} className="post-card" onClick={() => handleSelect(post)}>
                 <div className="post-category">{post.category}</div>
                 {getScoreBadge(post.ai_score)}
                 <h2 className="post-title">{post.title}</h2>
@@ -349,9 +402,9 @@ function App() {
                     </>
                   )}
                 </div>
-                <p className="post-excerpt">
-                  {post.content.substring(0, 150)}...
-                </p>
+                {post.excerpt && (
+                  <p className="post-excerpt">{post.excerpt}</p>
+                )}
                 {post.tags && (
                   <div className="post-tags">
                     {post.tags.split(',').map((tag, idx) => (
@@ -384,7 +437,7 @@ function App() {
       <footer className="footer">
         <div className="container">
           <p>
-            Built with ❤️ using ArgoCD, Helm, and Kubernetes | GitOps-powered deployment | {posts.length} posts
+            Built with ❤️ using ArgoCD, Helm, and Kubernetes | GitOps-powered deployment | {totalPosts ?? posts.length} posts
           </p>
           <div className="service-links">
             <h3>📊 Platform Services</h3>